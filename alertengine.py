@@ -0,0 +1,81 @@
+"""
+This module holds the AlertEngine, which decides when a transaction should warn the
+user, tell them a budget is exceeded, or lock a budget.
+"""
+
+from enum import Enum
+
+PERCENT = 100
+
+
+class Alert(Enum):
+    """
+    Enum for the thresholds a budget's spending can cross.
+    """
+    WARNING = "warning"
+    EXCEEDED = "exceeded"
+    LOCK = "lock"
+
+
+class AlertEngine:
+    """
+    Class that holds the warning, exceeded and lock thresholds of each budget of an
+    account in cents, worked out once from the budget limits and the user type's
+    warning percentage and lock limit. A transaction is then checked by comparing the
+    amount spent before and after it with the thresholds, and an alert is only raised
+    by the transaction that crosses a threshold.
+
+    The thresholds are rounded down to whole cents, which does not change any check:
+    an amount in whole cents is over a threshold exactly when it is over the
+    threshold rounded down.
+    """
+
+    def __init__(self, limits, percentage_warning, lock_limit, is_lockable):
+        """
+        Initialize an AlertEngine for budgets with the given limits.
+        :param limits: the limit of each budget in cents, as a list of ints
+        :param percentage_warning: the percentage of a limit spent that triggers a warning, an int
+        :param lock_limit: the percentage of a limit spent that locks the budget, an int
+        :param is_lockable: whether budgets can be locked, a boolean
+        """
+        self._settings = (percentage_warning, lock_limit, is_lockable)
+        self._thresholds = []
+        self._lowest = []
+        for limit in limits:
+            thresholds = ((Alert.EXCEEDED, limit), (Alert.WARNING, limit * percentage_warning // PERCENT))
+            if is_lockable:
+                thresholds += ((Alert.LOCK, limit * lock_limit // PERCENT),)
+            self._thresholds.append(thresholds)
+            self._lowest.append(min(threshold for _, threshold in thresholds))
+
+    @classmethod
+    def for_user(cls, user, budgets):
+        """
+        Create an AlertEngine for a user's budgets.
+        :param user: a User
+        :param budgets: a list of Budgets
+        :return: an AlertEngine
+        """
+        return cls([budget.limit_cents for budget in budgets], user.percentage_warning, user.lock_limit, user.is_lockable)
+
+    def is_for(self, user):
+        """
+        Return whether the thresholds were worked out for this user's type.
+        :param user: a User
+        :return: a boolean
+        """
+        return self._settings == (user.percentage_warning, user.lock_limit, user.is_lockable)
+
+    def check(self, budget_index, spent_before, spent_after):
+        """
+        Return the alerts raised by spending that went from spent_before to spent_after.
+        An alert is raised when the amount spent goes over its threshold.
+        :param budget_index: an int
+        :param spent_before: the amount spent before the transaction, in cents
+        :param spent_after: the amount spent after the transaction, in cents
+        :return: a tuple of Alerts
+        """
+        if spent_after <= self._lowest[budget_index]:
+            return ()
+        return tuple(alert for alert, threshold in self._thresholds[budget_index]
+                     if spent_before <= threshold < spent_after)
@@ -0,0 +1,239 @@
+"""
+This module holds the SpendingAnalytics class, which computes spending statistics
+for bank accounts with numpy.
+
+The transactions of every budget of an account are copied into three numpy arrays:
+amounts in cents, timestamps as epoch microseconds, and the index of the budget each
+one belongs to. Every statistic is computed from these arrays with vectorized
+operations, without creating a Transaction for each row, and sums are taken in whole
+cents before they are converted to dollars. numpy is required for this module.
+"""
+
+import numpy
+
+from money import CENTS_PER_DOLLAR
+from transactionstore import TransactionStore, to_epoch_micros
+
+PERIODS = ("day", "week", "month")
+PERCENT = 100
+# 1970-01-01 was a Thursday, so day number + 3 is a multiple of 7 on every Monday.
+_MONDAY_OFFSET = 3
+_DAYS_PER_WEEK = 7
+
+
+def _store_columns(store):
+    """
+    Copy the amounts in cents and the timestamps of a store of transactions into numpy
+    arrays. TransactionStore columns are copied directly; other stores are read
+    transaction by transaction.
+    :param store: a store of transactions
+    :return: a (cents, timestamps) tuple of numpy arrays
+    """
+    if isinstance(store, TransactionStore):
+        # copy, so the store's arrays are not left exporting a buffer and can still grow
+        return (numpy.frombuffer(store.amounts, dtype=numpy.int64).copy(),
+                numpy.frombuffer(store.timestamps, dtype=numpy.int64).copy())
+    cents = numpy.fromiter((transaction.cents for transaction in store), dtype=numpy.int64, count=len(store))
+    timestamps = numpy.fromiter((to_epoch_micros(transaction.timestamp) for transaction in store),
+                                dtype=numpy.int64, count=len(store))
+    return cents, timestamps
+
+
+class SpendingAnalytics:
+    """
+    Class that holds a snapshot of an account's transactions as numpy arrays and
+    computes spending statistics from it.
+    """
+
+    def __init__(self, bank):
+        """
+        Initialize a SpendingAnalytics with a snapshot of a bank account's transactions,
+        taken while holding the account lock.
+        :param bank: a BankAccount
+        """
+        with bank.lock:
+            columns = [_store_columns(budget.transactions) for budget in bank.budgets]
+            self._names = [budget.name for budget in bank.budgets]
+            self._limits = numpy.array([budget.limit_cents for budget in bank.budgets]) / CENTS_PER_DOLLAR
+
+        self._cents = numpy.concatenate([cents for cents, _ in columns])
+        self._timestamps = numpy.concatenate([timestamps for _, timestamps in columns])
+        self._categories = numpy.repeat(numpy.arange(len(columns)), [len(cents) for cents, _ in columns])
+
+    @property
+    def cents(self):
+        """
+        Return the amount of every transaction, in cents.
+        :return: a numpy array of ints
+        """
+        return self._cents
+
+    @property
+    def amounts(self):
+        """
+        Return the amount of every transaction, in dollars.
+        :return: a numpy array of floats
+        """
+        return self._cents / CENTS_PER_DOLLAR
+
+    @property
+    def timestamps(self):
+        """
+        Return the time of every transaction as epoch microseconds.
+        :return: a numpy array of ints
+        """
+        return self._timestamps
+
+    @property
+    def categories(self):
+        """
+        Return the index of the budget of every transaction.
+        :return: a numpy array of ints
+        """
+        return self._categories
+
+    @property
+    def category_names(self):
+        """
+        Return the budget names, indexed by category code.
+        :return: a list of strings
+        """
+        return self._names
+
+    def _select(self, category):
+        """
+        Return the amounts in cents and the timestamps of one budget, or of every budget.
+        :param category: a budget index, or None for every budget
+        :return: a (cents, timestamps) tuple of numpy arrays
+        """
+        if category is None:
+            return self._cents, self._timestamps
+        mask = self._categories == category
+        return self._cents[mask], self._timestamps[mask]
+
+    @staticmethod
+    def _period_numbers(timestamps, period):
+        """
+        Return the period each timestamp falls in, as a number that counts periods
+        from the epoch: days, weeks starting on Monday, or calendar months.
+        :param timestamps: a numpy array of epoch microseconds
+        :param period: "day", "week" or "month"
+        :return: a numpy array of ints
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Period must be one of {', '.join(PERIODS)}.")
+        times = timestamps.astype("datetime64[us]")
+        if period == "month":
+            return times.astype("datetime64[M]").astype(numpy.int64)
+        days = times.astype("datetime64[D]").astype(numpy.int64)
+        if period == "week":
+            return (days + _MONDAY_OFFSET) // _DAYS_PER_WEEK
+        return days
+
+    @staticmethod
+    def _period_starts(first, last, period):
+        """
+        Return the first day of every period from one period number to another.
+        :param first: an int
+        :param last: an int
+        :param period: "day", "week" or "month"
+        :return: a numpy array of datetime64 days
+        """
+        numbers = numpy.arange(first, last + 1)
+        if period == "month":
+            return numbers.astype("datetime64[M]").astype("datetime64[D]")
+        if period == "week":
+            return (numbers * _DAYS_PER_WEEK - _MONDAY_OFFSET).astype("datetime64[D]")
+        return numbers.astype("datetime64[D]")
+
+    def get_totals(self, period, category=None):
+        """
+        Return the amount spent in every period from the first transaction to the
+        last, including periods with no spending.
+        :param period: "day", "week" or "month"
+        :param category: a budget index, or None for every budget
+        :return: a (period starts, totals) tuple of numpy arrays
+        """
+        cents, timestamps = self._select(category)
+        if len(cents) == 0:
+            return numpy.array([], dtype="datetime64[D]"), numpy.array([], dtype=numpy.float64)
+        numbers = self._period_numbers(timestamps, period)
+        first = numbers.min()
+        totals = numpy.bincount(numbers - first, weights=cents) / CENTS_PER_DOLLAR
+        return self._period_starts(first, numbers.max(), period), totals
+
+    def get_rolling_average(self, period, window, category=None):
+        """
+        Return the average amount spent per period over the last window periods, for
+        every period from the first transaction to the last. The first window - 1
+        periods do not have a full window and are NaN.
+        :param period: "day", "week" or "month"
+        :param window: the number of periods to average over, as an int
+        :param category: a budget index, or None for every budget
+        :return: a (period starts, averages) tuple of numpy arrays
+        """
+        if window < 1:
+            raise ValueError("Window must be at least 1.")
+        starts, totals = self.get_totals(period, category)
+        averages = numpy.full(len(totals), numpy.nan)
+        if len(totals) >= window:
+            running = numpy.concatenate(([0.0], numpy.cumsum(totals)))
+            averages[window - 1:] = (running[window:] - running[:-window]) / window
+        return starts, averages
+
+    def get_percent_of_limit(self, category):
+        """
+        Return how much of a budget's limit had been spent after each of its
+        transactions, in time order.
+        :param category: a budget index
+        :return: a (timestamps as datetime64, percentages) tuple of numpy arrays
+        """
+        cents, timestamps = self._select(category)
+        order = numpy.argsort(timestamps, kind="stable")
+        spent = numpy.cumsum(cents[order]) / CENTS_PER_DOLLAR
+        return timestamps[order].astype("datetime64[us]"), spent / self._limits[category] * PERCENT
+
+    def get_category_totals(self):
+        """
+        Return the amount spent and the number of transactions in each budget.
+        :return: a (totals, counts) tuple of numpy arrays, indexed by budget
+        """
+        size = len(self._names)
+        return (numpy.bincount(self._categories, weights=self._cents, minlength=size) / CENTS_PER_DOLLAR,
+                numpy.bincount(self._categories, minlength=size))
+
+    def get_breakdown(self):
+        """
+        Return the total, the number of transactions, the share of all spending and
+        the percentage of the limit spent for each budget.
+        :return: a dict of budget name to a dict of statistics
+        """
+        totals, counts = self.get_category_totals()
+        overall = totals.sum()
+        shares = totals / overall * PERCENT if overall else numpy.zeros(len(totals))
+        percents = totals / self._limits * PERCENT
+        return {name: {"total": float(total), "count": int(count), "share": float(share),
+                       "percent_of_limit": float(percent)}
+                for name, total, count, share, percent in zip(self._names, totals, counts, shares, percents)}
+
+
+def get_totals_by_account(banks, period):
+    """
+    Return the amount spent by each account in every period, over the periods from
+    the earliest transaction of any account to the latest.
+    :param banks: a list of BankAccounts
+    :param period: "day", "week" or "month"
+    :return: a (period starts, totals) tuple, where totals has a row per account
+    """
+    snapshots = [SpendingAnalytics(bank) for bank in banks]
+    cents = numpy.concatenate([snapshot.cents for snapshot in snapshots] + [numpy.array([], numpy.int64)])
+    timestamps = numpy.concatenate([snapshot.timestamps for snapshot in snapshots] + [numpy.array([], numpy.int64)])
+    accounts = numpy.repeat(numpy.arange(len(snapshots)), [len(snapshot.cents) for snapshot in snapshots])
+    if len(cents) == 0:
+        return numpy.array([], dtype="datetime64[D]"), numpy.zeros((len(banks), 0))
+
+    numbers = SpendingAnalytics._period_numbers(timestamps, period)
+    first, last = numbers.min(), numbers.max()
+    width = last - first + 1
+    totals = numpy.bincount(accounts * width + (numbers - first), weights=cents, minlength=len(banks) * width)
+    return SpendingAnalytics._period_starts(first, last, period), totals.reshape(len(banks), width) / CENTS_PER_DOLLAR
@@ -9,13 +9,14 @@ class Angel(User):
     """
     Class that represents an Angel user type.
     """
-    def __init__(self, name, age):
+    def __init__(self, name, age, bank=None):
         """
         Initialize a User of Angel type.
         :param name: the name of the user as a String
         :param age: the age of the Angel User
+        :param bank: a BankAccount, or None to prompt for the bank details
         """
-        super().__init__(name, age, 90, False, 0)
+        super().__init__(name, age, 90, False, 0, bank)
 
     def can_lock_account(self):
         """
@@ -36,4 +37,4 @@ class Angel(User):
         Return a polite notification.
         :return: polite notification as a string
         """
-        return Notifications.POLITE.value
+        return Notifications.POLITE.box
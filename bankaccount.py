@@ -2,8 +2,16 @@
 This module holds the Bank Account class.
 """
 
+from alertengine import Alert, AlertEngine
 from budget import Budget
+from ledger import Ledger, LedgerWriter
+from merchantstats import MerchantStats
+from money import MAX_CENTS, format_cents, to_cents, to_dollars
+from notificationqueue import NOTIFICATIONS
+from pagination import paginate
+from transactionreport import TransactionReport
 from datetime import datetime
+import threading
 
 
 class BankAccount:
@@ -12,20 +20,27 @@ class BankAccount:
         record and view transactions.
     """
 
-    PERCENT = 100
+    BUDGET_NAMES = ("Games and Entertainment", "Clothing and Accessories", "Eating Out", "Miscellaneous")
 
-    def __init__(self, number, name, balance):
+    def __init__(self, number, name, balance, budgets=None):
         """
         Initialize a BankAccount with a budget list, account number,
-        name, and balance.
+        name, and balance. The user is prompted for the budget limits
+        when no budget list is passed in. The balance is kept in cents.
         :param number: a string
         :param name: a string
-        :param balance: a float
+        :param balance: the balance in dollars, a float
+        :param budgets: a list of Budgets, or None
         """
-        self._budgets = self._create_budget_list()
+        self._budgets = budgets if budgets is not None else self._create_budget_list()
         self._number = number
         self._name = name
-        self._balance = balance
+        self._balance_cents = to_cents(balance)
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._alert_engine = None
+        self._merchant_stats = self._merge_merchant_stats()
+        self._ledger = None
 
     @property
     def name(self):
@@ -43,6 +58,14 @@ class BankAccount:
         """
         return self._number
 
+    @property
+    def lock(self):
+        """
+        Return the lock that is held while the account is being changed.
+        :return: a threading.RLock
+        """
+        return self._lock
+
     @property
     def budgets(self):
         """
@@ -55,9 +78,9 @@ class BankAccount:
     def balance(self):
         """
         Return the balance of the user's bank account.
-        :return: an int or a float
+        :return: a float
         """
-        return self._balance
+        return to_dollars(self._balance_cents)
 
     @balance.setter
     def balance(self, amount):
@@ -65,7 +88,31 @@ class BankAccount:
         Set the balance to the amount passed in.
         :param amount: an int or a float
         """
-        self._balance = amount
+        self._balance_cents = to_cents(amount)
+
+    @property
+    def balance_cents(self):
+        """
+        Return the balance of the user's bank account, in cents.
+        :return: an int
+        """
+        return self._balance_cents
+
+    def add_listener(self, listener):
+        """
+        Register a listener to be told about recorded transactions and locked budgets.
+        A listener provides on_transaction(user, budget_index, transaction) and
+        on_budget_locked(user, budget_index) methods.
+        :param listener: an object with the listener methods
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stop telling a listener about recorded transactions and locked budgets.
+        :param listener: a listener that was added before
+        """
+        self._listeners.remove(listener)
 
     def _get_budget_by_index(self, index):
         """
@@ -73,6 +120,8 @@ class BankAccount:
         :param index: an int
         :return: a Budget
         """
+        if not 0 <= index < len(self.budgets):
+            raise IndexError(f"There is no budget with index {index}.")
         return self.budgets[index]
 
     def _input_transaction_details(self):
@@ -85,7 +134,7 @@ class BankAccount:
         if budget.is_locked:
             raise BudgetIsLockedError(f"Budget {budget.name} is locked.")
 
-        amount = float(input("Enter the amount: "))
+        amount = to_cents(input("Enter the amount: "))
 
         if amount <= 0:
             raise TransactionAmountError("Negative or 0 amounts are not allowed when making transactions. "
@@ -114,121 +163,229 @@ class BankAccount:
             return
 
         # If the budget is locked or balance will drop below 0, don't continue transaction
+        with self._lock:
+            self._validate_transaction(budget, amount)
+            print("\nTransaction successful.")
+            self._complete_transaction(user, amount, budget_index, budget, timestamp, purchase_location)
+
+    def record_transactions(self, user, records):
+        """
+        Record many transactions at once without prompting for input. Each record is a
+        (budget_index, amount, purchase_location, timestamp) tuple and goes through the same
+        lock, balance and threshold checks as a transaction entered by the user. Amounts are
+        in dollars and are rounded to the nearest cent. A timestamp of None is replaced by
+        the current time. Records with a timestamp that is not a datetime or a location
+        that is not a string are rejected before anything is changed.
+
+        The checks and the balance updates of each record run while holding the account
+        lock, so records for the same account can be recorded from several threads.
+        :param user: a User
+        :param records: an iterable of tuples
+        :return: a TransactionReport with the accepted and rejected records
+        """
+        report = TransactionReport()
+        for record in records:
+            try:
+                budget_index, amount, purchase_location, timestamp = record
+                budget = self._get_budget_by_index(budget_index)
+                amount = to_cents(amount)
+                if timestamp is not None and not isinstance(timestamp, datetime):
+                    raise TypeError(f"{timestamp!r} is not a datetime.")
+                if not isinstance(purchase_location, str):
+                    raise TypeError(f"{purchase_location!r} is not a purchase location.")
+            except (ValueError, TypeError, IndexError) as e:
+                report.add_rejected(record, e)
+                continue
+
+            if timestamp is None:
+                timestamp = datetime.now()
+            with self._lock:
+                try:
+                    self._validate_transaction(budget, amount)
+                except (BudgetIsLockedError, BudgetIsReadOnlyError, InvalidBalanceError,
+                        TransactionAmountError) as e:
+                    report.add_rejected(record, e)
+                    continue
+                transaction = self._complete_transaction(user, amount, budget_index, budget,
+                                                         timestamp, purchase_location)
+            report.add_accepted(transaction)
+        return report
+
+    def _validate_transaction(self, budget, amount):
+        """
+        Check that a transaction can be made. Deny transactions when the budget is locked
+        or was opened from a ledger, when the amount is not positive or too large to store,
+        or when the balance would drop below 0.
+        :param budget: a Budget
+        :param amount: the amount in cents, an int
+        """
+        if budget.is_read_only:
+            raise BudgetIsReadOnlyError(f"Budget {budget.name} was opened from a ledger and is read-only.")
         if budget.is_locked:
-            raise BudgetIsLockedError("Budget is locked.")
-        else:
-            if self.balance < amount:
-                raise InvalidBalanceError("Transaction not processed. Amount would put balance below 0.")
-            else:
-                self._complete_transaction(user, amount, budget_index, budget, timestamp, purchase_location)
+            raise BudgetIsLockedError(f"Budget {budget.name} is locked.")
+        if amount <= 0:
+            raise TransactionAmountError("Negative or 0 amounts are not allowed when making transactions. "
+                                         "Could not complete your transaction.")
+        if amount > MAX_CENTS:
+            raise TransactionAmountError("The amount is too large to be recorded. Could not complete your transaction.")
+        if self._balance_cents < amount:
+            raise InvalidBalanceError("Transaction not processed. Amount would put balance below 0.")
 
     def _complete_transaction(self, user, amount, budget_index, budget, timestamp, purchase_location):
         """
         Complete a transaction by updating the bank balance, recording the transaction in the
         specified budget, and running checks on completions.
         :param user: a User
-        :param amount: a float
+        :param amount: the amount in cents, an int
         :param budget_index: an int
         :param budget: a Budget
         :param timestamp: a datetime object
         :param purchase_location: a string
+        :return: the Transaction recorded
         """
+        spent_before = budget.spent_cents
+        # stored first, so a transaction the store refuses leaves the balances untouched
+        transaction = budget.record_transaction(timestamp, amount, purchase_location)
         self._update_balance(amount, budget_index)
-        budget.record_transaction(timestamp, amount, purchase_location)
-        self._on_transaction_complete(user, budget)
+        self._update_merchant_stats(transaction)
+        for listener in self._listeners:
+            listener.on_transaction(user, budget_index, transaction)
+        self._on_transaction_complete(user, budget_index, budget, spent_before)
+        return transaction
 
-    def _on_transaction_complete(self, user, budget):
+    def apply_transaction(self, budget_index, amount, timestamp, purchase_location):
         """
-        Execute checks after a transaction is completed.
+        Apply a transaction that was already accepted, such as one read back from a
+        journal, by updating the balances and recording it without running any checks.
+        :param budget_index: an int
+        :param amount: the amount in dollars, a float
+        :param timestamp: a datetime object
+        :param purchase_location: a string
+        :return: the Transaction recorded
+        """
+        cents = to_cents(amount)
+        with self._lock:
+            transaction = self._get_budget_by_index(budget_index).record_transaction(timestamp, cents,
+                                                                                     purchase_location)
+            self._update_balance(cents, budget_index)
+            self._update_merchant_stats(transaction)
+            return transaction
+
+    def _on_transaction_complete(self, user, budget_index, budget, spent_before):
+        """
+        Lock the budget and post a notice for the user when the transaction just completed
+        took the amount spent in the budget over the warning, exceeded or lock threshold.
+        Thresholds that were already passed before the transaction are not raised again.
+        The notice is rendered and printed by the notification worker, so the transaction
+        does not wait for it.
         :param user: a user
+        :param budget_index: an int
         :param budget: a Budget
+        :param spent_before: the amount spent in the budget before the transaction, in cents
         """
-        print("\nTransaction successful.")
-        budget_balance = budget.amount_left
-        percent = (budget.amount_spent / budget.limit) * BankAccount.PERCENT
-
-        # check if the budget is exceeded
-        if self._check_budget_exceeded(budget_balance):
-            # yes - get notification and print transactions
-            self._notify_budget_exceeded(user, budget)
-
-        # check if the budget is almost exceeded
-        elif self._check_budget_almost_exceed(user, percent):
-            # yes - get warning and print transactions
-            self._warn_budget_almost_exceeded(user, budget)
+        alerts = self._get_alert_engine(user).check(budget_index, spent_before, budget.spent_cents)
+        if not alerts:
+            return
 
-        # lock the budget if exceeded
-        if self._check_lock_budget(percent, user):
+        # lock the budget if it went over the lock threshold
+        if Alert.LOCK in alerts:
             self._lock_budget(budget, user)
+        NOTIFICATIONS.post(self, user, budget_index, alerts)
 
-    def _check_lock_budget(self, percent, user):
+    def _get_alert_engine(self, user):
         """
-        Check if the budget should be locked. Return True if percentage is over the lock limit
-        and user is lockable, False if the percentage is not over the lock limit or if the user
-        is not lockable.
-        :param percent: int or a float
-        :param user: a user
-        :return: a boolean
+        Return the AlertEngine with this account's thresholds for a user's type,
+        creating it the first time it is needed.
+        :param user: a User
+        :return: an AlertEngine
         """
-        return percent > user.lock_limit and user.is_lockable
+        if self._alert_engine is None or not self._alert_engine.is_for(user):
+            self._alert_engine = AlertEngine.for_user(user, self.budgets)
+        return self._alert_engine
 
     def _lock_budget(self, budget, user):
         """
-        Lock a budget and increment the user's locked budget count. Notify
-        the user that their budget has been locked.
+        Lock a budget and increment the user's locked budget count.
         :param budget: a Budget
         :param user: a user
         """
         budget.is_locked = True
         user.increment_locked_budgets()
-        print(f"Budget {budget.name} has been locked")
+        budget_index = self.budgets.index(budget)
+        for listener in self._listeners:
+            listener.on_budget_locked(user, budget_index)
 
-    def _check_budget_almost_exceed(self, user, percent):
+    def get_notice(self, user, budget_index, alerts):
         """
-        Check if a budget is almost exceeded and return True if the percentage of the
-        amount spent from the budget, False otherwise.
+        Return the notice for alerts raised on a budget: the notification that the budget
+        is exceeded, or else the warning that it is almost exceeded, followed by a list of
+        all the transactions for that budget, and a line if the budget has been locked.
         :param user: a User
-        :param percent: an int or float
-        :return: a boolean
+        :param budget_index: an int
+        :param alerts: a collection of Alerts
+        :return: a string
         """
-        return percent > user.percentage_warning
+        budget = self._get_budget_by_index(budget_index)
+        lines = []
+        if Alert.EXCEEDED in alerts:
+            lines.append(user.get_notification())
+        elif Alert.WARNING in alerts:
+            lines.append(user.get_warning())
+        if lines:
+            with self._lock:
+                lines.append(budget.get_transactions_string())
+        if Alert.LOCK in alerts:
+            lines.append(f"Budget {budget.name} has been locked")
+        return "\n".join(lines)
+
+    def _update_balance(self, cents, budget_index):
+        """
+        Update the bank and budget balance based on the amount recorded in a transaction.
+        :param cents: the amount in cents, an int
+        :param budget_index: an int
+        """
+        self._balance_cents -= cents
+        self._get_budget_by_index(budget_index).update_balance(cents)
 
-    def _warn_budget_almost_exceeded(self, user, budget):
+    def _merge_merchant_stats(self):
         """
-        Warn the user that the budget is almost exceeded and print
-        a list of all the transactions for that budget.
-        :param user: a User
-        :param budget: a Budget
+        Add up the running totals of each purchase location over all budgets.
+        :return: a dict of location strings to MerchantStats
         """
-        print(user.get_warning())
-        print(budget.get_transactions_string())
+        account_stats = {}
+        for budget in self.budgets:
+            for location, stats in budget.merchant_stats.items():
+                if location not in account_stats:
+                    account_stats[location] = MerchantStats(location)
+                account_stats[location].merge(stats)
+        return account_stats
 
-    def _check_budget_exceeded(self, budget_balance):
+    def _update_merchant_stats(self, transaction):
         """
-        Check if a budget is exceeded.
-        :param budget_balance: an int or a float
-        :return: True if budget balance is under 0, False otherwise
+        Add a recorded transaction to the account's running totals of its location.
+        :param transaction: a Transaction
         """
-        return budget_balance < 0
+        stats = self._merchant_stats.get(transaction.purchase_location)
+        if stats is None:
+            stats = self._merchant_stats[transaction.purchase_location] = MerchantStats(transaction.purchase_location)
+        stats.add(transaction.timestamp, transaction.cents)
 
-    def _notify_budget_exceeded(self, user, budget):
+    def get_merchant_stats(self):
         """
-        Notify the user that the budget is exceeded and print
-        a list of all the transactions for that budget.
-        :param user: a User
-        :param budget: a Budget
+        Return the running totals for each purchase location across all budgets. They
+        are kept up to date as transactions are recorded, so nothing is added up here.
+        :return: a dict of location strings to MerchantStats
         """
-        print(user.get_notification())
-        print(budget.get_transactions_string())
+        return self._merchant_stats
 
-    def _update_balance(self, amount, budget_index):
+    def get_top_merchants(self, n, by="total"):
         """
-        Update the bank and budget balance based on the amount recorded in a transaction.
-        :param amount: a User
-        :param budget_index: an int
+        Return the n locations with the highest total spent or purchase count across all budgets.
+        :param n: an int
+        :param by: "total" or "count"
+        :return: a list of MerchantStats, highest first
         """
-        self.balance = self.balance - amount
-        self._get_budget_by_index(budget_index).update_balance(amount)
+        return MerchantStats.top(self.get_merchant_stats().values(), n, by)
 
     def view_budgets(self):
         """
@@ -245,6 +402,60 @@ class BankAccount:
         transactions_string = self._get_budget_by_index(budget_index).get_transactions_string()
         print(transactions_string)
 
+    def iter_transactions_by_budget(self, budget_index, page_size, newest_first=False, offset=0):
+        """
+        Yield the transactions of a budget one page at a time. Each page is only
+        rendered when it is requested.
+        :param budget_index: an int
+        :param page_size: the number of transactions per page, as an int
+        :param newest_first: True to start from the most recent transaction
+        :param offset: the number of transactions to skip before the first page, as an int
+        :return: a generator of strings
+        """
+        budget = self._get_budget_by_index(budget_index)
+        return paginate(budget.iter_transaction_strings(offset, newest_first=newest_first), page_size)
+
+    def _iter_details_rows(self, newest_first=False, offset=0):
+        """
+        Yield the bank account details one transaction at a time, in the same layout
+        as the string built by __str__. The header, the separators between budgets
+        and the balance are joined to the transaction next to them, so every row
+        holds one transaction, apart from the single row of an account without any.
+        :param newest_first: True to list the most recent transactions of each budget first
+        :param offset: the number of transactions to skip, counted across the budgets in order, as an int
+        :return: a generator of strings
+        """
+        prefix = f"\nViewing Bank Account Details \n" \
+                 f"---------------------------- \n" \
+                 f"\nNumber: {self.number}\n" \
+                 f"Name: {self.name}\n" \
+                 f"Transactions by Budget \n" \
+                 f"----------------------------- \n"
+        row = None
+        for index, budget in enumerate(self.budgets):
+            if index > 0:
+                prefix += "\n "
+            skipped = min(offset, len(budget.transactions))
+            offset -= skipped
+            for transaction_string in budget.iter_transaction_strings(skipped, newest_first=newest_first):
+                if row is not None:
+                    yield row
+                row = prefix + transaction_string
+                prefix = ""
+        yield (row if row is not None else "") + prefix + f"\nBalance: {format_cents(self._balance_cents)}\n"
+
+    def iter_details(self, page_size, newest_first=False, offset=0):
+        """
+        Yield the bank account details one page of page_size transactions at a time,
+        so the first page can be shown before the rest of the transaction history is
+        rendered.
+        :param page_size: the number of transactions per page, as an int
+        :param newest_first: True to list the most recent transactions of each budget first
+        :param offset: the number of transactions to skip before the first page, as an int
+        :return: a generator of strings
+        """
+        return paginate(self._iter_details_rows(newest_first, offset), page_size)
+
     @staticmethod
     def get_budget_index():
         """
@@ -282,7 +493,6 @@ class BankAccount:
         return the budget list created. Catch any errors regarding invalid inputs.
         :return: a list of Budgets
         """
-        budget_list = []
         while True:
             try:
                 print("\nEnter the budget limit for the given category:")
@@ -298,14 +508,20 @@ class BankAccount:
                 print("One or more of the values were incorrect. Please try again.")
                 continue
             else:
-                budget_list.append(Budget("Games and Entertainment", cat_one))
-                budget_list.append(Budget("Clothing and Accessories", cat_two))
-                budget_list.append(Budget("Eating Out", cat_three))
-                budget_list.append(Budget("Miscellaneous", cat_four))
+                budget_list = BankAccount.create_budget_list([cat_one, cat_two, cat_three, cat_four])
                 break
 
         return budget_list
 
+    @staticmethod
+    def create_budget_list(limits):
+        """
+        Create the budget list from the limits of each category, in menu order.
+        :param limits: a list of floats
+        :return: a list of Budgets
+        """
+        return [Budget(name, limit) for name, limit in zip(BankAccount.BUDGET_NAMES, limits)]
+
     def __str__(self):
         """
         Build a string that contains the bank account details, as well as all
@@ -322,7 +538,80 @@ class BankAccount:
                f"Transactions by Budget \n" \
                f"----------------------------- \n" \
                f"{transactions_string}\n" \
-               f"Balance: {self.balance:.2f}\n"
+               f"Balance: {format_cents(self._balance_cents)}\n"
+
+    def save_ledger(self, path):
+        """
+        Write the account details and every transaction to a binary ledger file.
+        :param path: the path of the ledger file, as a string
+        """
+        account = {"number": self.number, "name": self.name, "balance": self.balance,
+                   "budgets": [{"name": budget.name, "limit": budget.limit, "locked": budget.is_locked}
+                               for budget in self.budgets]}
+        with LedgerWriter(path, account) as writer:
+            for budget_id, budget in enumerate(self.budgets):
+                writer.add_store(budget_id, budget.transactions)
+
+    @classmethod
+    def open_ledger(cls, path):
+        """
+        Open a ledger file as a read-only BankAccount. The budgets read their
+        transactions straight from the memory-mapped file, so the account has to be
+        closed when it is no longer used. Recording a transaction in it is rejected
+        with a BudgetIsReadOnlyError.
+        :param path: the path of the ledger file, as a string
+        :return: a BankAccount
+        """
+        ledger = Ledger(path)
+        account = ledger.account
+        try:
+            budgets = [Budget.from_ledger(ledger, budget_id) for budget_id in range(len(account["budgets"]))]
+        except Exception:
+            ledger.close()
+            raise
+        bank = cls(account["number"], account["name"], account["balance"], budgets)
+        bank._ledger = ledger
+        return bank
+
+    def close(self):
+        """
+        Release the ledger file of an account opened with open_ledger. Its transactions
+        cannot be read afterwards. Does nothing for other accounts.
+        """
+        if self._ledger is not None:
+            self._ledger.close()
+            self._ledger = None
+
+    def __getstate__(self):
+        """
+        Return the state to pickle, leaving out the listeners and the lock since they
+        are tied to the running program, the alert thresholds since they are worked
+        out again when needed, and the ledger file of an account opened from one.
+        :return: a dict
+        """
+        state = self.__dict__.copy()
+        state["_listeners"] = []
+        del state["_lock"]
+        del state["_alert_engine"]
+        del state["_ledger"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled BankAccount with a new lock, converting the balance of an
+        account pickled before it was kept in cents and adding up the merchant totals
+        of an account pickled before they were kept.
+        :param state: a dict
+        """
+        if "_balance" in state:
+            state = dict(state)
+            state["_balance_cents"] = to_cents(state.pop("_balance"))
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._alert_engine = None
+        self._ledger = None
+        if "_merchant_stats" not in state:
+            self._merchant_stats = self._merge_merchant_stats()
 
     def _create_budget_list(self):
         while True:
@@ -361,6 +650,19 @@ class BudgetIsLockedError(Exception):
         super().__init__(message)
 
 
+class BudgetIsReadOnlyError(Exception):
+    """
+    Exception for when the user tries to make a transaction in a budget opened from a ledger.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a BudgetIsReadOnlyError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)
+
+
 class TransactionAmountError(Exception):
     """
     Exception for when the user enters an invalid transaction amount, such as negative values or zero.
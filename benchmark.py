@@ -0,0 +1,338 @@
+"""
+This module holds the benchmark suite for the transaction recording and rendering
+hot paths.
+
+Every benchmark builds an account with a given number of transactions already in its
+history, then times a single operation against it. Nothing reads from the terminal:
+histories are generated from a fixed seed, printed output is discarded, and the login
+menu is answered from a string. Results are written as JSON and can be compared with a
+stored baseline, in which case any benchmark that got slower than the threshold is
+reported and the exit status is 1.
+Run it with:
+    python benchmark.py --output results.json --baseline benchmark_baseline.json
+    python benchmark.py --sizes 10 1000 --save-baseline benchmark_baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from alertengine import PERCENT
+from angel import Angel
+from bankaccount import BankAccount
+from budget import Budget
+from fam import FAM
+from money import to_dollars
+from notificationqueue import NOTIFICATIONS
+from rebel import Rebel
+from transactionstore import TransactionStore, to_epoch_micros
+
+SIZES = (10, 1000, 100000, 1000000)
+SEED = 3522
+LOCATIONS = [f"Shop {number}" for number in range(50)]
+START = to_epoch_micros(datetime(2020, 1, 1))
+# The amount in cents added by each timed transaction, kept tiny so that the calls
+# made before the history is built again do not move the budget across a threshold.
+STEP = 1
+MIN_SECONDS = 0.2
+REPEAT = 5
+THRESHOLD = 0.25
+# The fraction by which a history may grow while it is being timed.
+GROWTH = 0.1
+
+
+def build_store(category, size, seed=SEED):
+    """
+    Create a TransactionStore holding size transactions, one second apart.
+    :param category: the budget name, as a string
+    :param size: the number of transactions, as an int
+    :param seed: the random seed, as an int
+    :return: a TransactionStore
+    """
+    generator = random.Random(seed)
+    amounts = array("q", (generator.randint(1, 500) for _ in range(size)))
+    timestamps = array("q", range(START, START + size * 1000000, 1000000))
+    codes = array("I", (generator.randrange(len(LOCATIONS)) for _ in range(size)))
+    return TransactionStore.from_columns(category, amounts, timestamps, codes, LOCATIONS)
+
+
+def build_account(size, spent_fraction=0.1):
+    """
+    Create a bank account whose first budget has size transactions, with the budget
+    limit set so that the given fraction of it has been spent.
+    :param size: the number of transactions, as an int
+    :param spent_fraction: a float
+    :return: a BankAccount
+    """
+    name = BankAccount.BUDGET_NAMES[0]
+    store = build_store(name, size)
+    budgets = [Budget(name, to_dollars(store.total()) / spent_fraction, store)]
+    budgets.extend(Budget(other, 100.0) for other in BankAccount.BUDGET_NAMES[1:])
+    return BankAccount("1", "Benchmark Bank", 10.0 ** 12, budgets)
+
+
+def prime_render_cache(budget):
+    """
+    Render every transaction in a budget once, as if the budget had already been viewed.
+    :param budget: a Budget
+    """
+    budget.get_transactions_string()
+
+
+def setup_budget_record_transaction(size):
+    """
+    Time Budget.record_transaction.
+    """
+    budget = build_account(size).budgets[0]
+    timestamp = datetime(2021, 1, 1)
+    return lambda: budget.record_transaction(timestamp, STEP, "Shop 0")
+
+
+def setup_complete_transaction(size):
+    """
+    Time BankAccount._complete_transaction for a transaction that stays under the
+    warning threshold, so _on_transaction_complete only runs its checks. The alert
+    thresholds are worked out before timing, since that happens once per account.
+    """
+    bank = build_account(size)
+    user = Rebel("Benchmark", 12, bank)
+    bank._get_alert_engine(user)
+    budget = bank.budgets[0]
+    timestamp = datetime(2021, 1, 1)
+    return lambda: bank._complete_transaction(user, STEP, 0, budget, timestamp, "Shop 0")
+
+
+def setup_complete_transaction_warning(size):
+    """
+    Time BankAccount._complete_transaction for a transaction that crosses the warning
+    threshold, so the alert is raised and a notification is posted. The amount spent
+    starts at the threshold and is taken back off after each call, so every call
+    crosses it. The notice is not rendered, since rendering is timed on its own by
+    budget.get_transactions_string.
+    """
+    bank = build_account(size)
+    user = Angel("Benchmark", 12, bank)
+    bank._get_alert_engine(user)
+    bank.get_notice = lambda notice_user, budget_index, alerts: ""
+    budget = bank.budgets[0]
+    budget.update_balance(budget.limit_cents * user.percentage_warning // PERCENT - budget.spent_cents)
+    timestamp = datetime(2021, 1, 1)
+
+    def operation():
+        bank._complete_transaction(user, STEP, 0, budget, timestamp, "Shop 0")
+        budget.update_balance(-STEP)
+    return operation
+
+
+def setup_get_transactions_string(size):
+    """
+    Time Budget.get_transactions_string right after a new transaction is recorded,
+    which is when the menu and the notifications call it.
+    """
+    budget = build_account(size).budgets[0]
+    prime_render_cache(budget)
+    timestamp = datetime(2021, 1, 1)
+
+    def operation():
+        budget.record_transaction(timestamp, STEP, "Shop 0")
+        return budget.get_transactions_string()
+    return operation
+
+
+def setup_bank_account_str(size):
+    """
+    Time BankAccount.__str__ right after a new transaction is recorded.
+    """
+    bank = build_account(size)
+    budget = bank.budgets[0]
+    prime_render_cache(budget)
+    timestamp = datetime(2021, 1, 1)
+
+    def operation():
+        budget.record_transaction(timestamp, STEP, "Shop 0")
+        return str(bank)
+    return operation
+
+
+def setup_transaction_str(size):
+    """
+    Time reading a transaction from the middle of the history and rendering it with Transaction.__str__.
+    """
+    store = build_account(size).budgets[0].transactions
+    middle = size // 2
+    return lambda: str(store[middle])
+
+
+def setup_login_user(size):
+    """
+    Time FAM._login_user with size users registered, choosing the last user.
+    """
+    bank = build_account(0)
+    fam = FAM()
+    fam.user_list = [Rebel(f"User {number}", 12, bank) for number in range(size)]
+    answer = f"{size}\n"
+
+    def operation():
+        with contextlib.redirect_stdout(io.StringIO()):
+            stdin = sys.stdin
+            sys.stdin = io.StringIO(answer)
+            try:
+                return fam._login_user()
+            finally:
+                sys.stdin = stdin
+    return operation
+
+
+# Each benchmark has a setup function, which builds the history and returns the
+# operation to time, and whether the operation adds a transaction to the history.
+BENCHMARKS = {
+    "budget.record_transaction": (setup_budget_record_transaction, True),
+    "bankaccount.complete_transaction": (setup_complete_transaction, True),
+    "bankaccount.complete_transaction_warning": (setup_complete_transaction_warning, True),
+    "budget.get_transactions_string": (setup_get_transactions_string, True),
+    "bankaccount.str": (setup_bank_account_str, True),
+    "transaction.str": (setup_transaction_str, False),
+    "fam.login_user": (setup_login_user, False),
+}
+
+
+def time_operation(setup, size, grows, min_seconds=MIN_SECONDS, repeat=REPEAT):
+    """
+    Time an operation, calling it enough times per round for the round to take at
+    least min_seconds. When the operation adds to the history, the history is built
+    again whenever it has grown by more than GROWTH, so the size it is timed at stays
+    close to the size asked for.
+    :param setup: a function that builds the history and returns the operation
+    :param size: the history size, as an int
+    :param grows: True if each call adds a transaction to the history
+    :param min_seconds: a float
+    :param repeat: the number of rounds, as an int
+    :return: a (calls per round, list of seconds per call) tuple
+    """
+    calls_per_setup = max(1, int(size * GROWTH)) if grows else None
+    operation = setup(size)
+    calls_since_setup = 0
+
+    def time_round(number):
+        nonlocal operation, calls_since_setup
+        elapsed = 0.0
+        while number:
+            batch = number if calls_per_setup is None else min(number, calls_per_setup)
+            if calls_per_setup is not None and calls_since_setup + batch > calls_per_setup:
+                operation = setup(size)
+                calls_since_setup = 0
+            calls_since_setup += batch
+            elapsed += _time_calls(operation, batch)
+            number -= batch
+        return elapsed
+
+    number = 1
+    while True:
+        elapsed = time_round(number)
+        if elapsed >= min_seconds or number >= 10 ** 6:
+            break
+        number *= 10 if elapsed < min_seconds / 10 else 2
+    timings = [elapsed / number] + [time_round(number) / number for _ in range(repeat - 1)]
+    return number, timings
+
+
+def _time_calls(operation, number):
+    """
+    Call an operation number times, discarding anything it prints.
+    :param operation: a function that takes no arguments
+    :param number: an int
+    :return: the elapsed time in seconds, as a float
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        elapsed = time.perf_counter() - started
+        NOTIFICATIONS.flush()
+        return elapsed
+
+
+def run_benchmarks(names, sizes, min_seconds=MIN_SECONDS, repeat=REPEAT):
+    """
+    Run the named benchmarks for each history size.
+    :param names: a list of benchmark names
+    :param sizes: a list of ints
+    :param min_seconds: the minimum duration of a round, as a float
+    :param repeat: the number of rounds, as an int
+    :return: the results, as a dict
+    """
+    results = []
+    for name in names:
+        setup, grows = BENCHMARKS[name]
+        for size in sizes:
+            number, timings = time_operation(setup, size, grows, min_seconds, repeat)
+            results.append({"name": name, "size": size, "calls": number,
+                            "best": min(timings), "median": statistics.median(timings)})
+            print(f"{name:<42} {size:>9} {results[-1]['median'] * 1e6:>14.2f} us", file=sys.stderr)
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "created": datetime.now().isoformat(timespec="seconds"), "results": results}
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Compare results with a baseline and list the benchmarks that got slower.
+    :param results: the results of run_benchmarks
+    :param baseline: earlier results of run_benchmarks
+    :param threshold: the allowed slow-down, as a fraction
+    :return: a list of (name, size, baseline seconds, seconds) tuples
+    """
+    expected = {(result["name"], result["size"]): result["median"] for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        before = expected.get((result["name"], result["size"]))
+        if before is not None and result["median"] > before * (1 + threshold):
+            regressions.append((result["name"], result["size"], before, result["median"]))
+    return regressions
+
+
+def main():
+    """
+    Parse the command line, run the benchmarks and compare them with the baseline.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the transaction and rendering hot paths.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="write the results to this JSON file instead of standard output")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="slow-down that counts as a regression, as a fraction (default 0.25)")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file as the new baseline")
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.benchmarks, arguments.sizes, arguments.min_seconds, arguments.repeat)
+    output = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    if arguments.save_baseline:
+        with open(arguments.save_baseline, "w") as file:
+            file.write(output)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            regressions = compare(results, json.load(file), arguments.threshold)
+        for name, size, before, after in regressions:
+            print(f"REGRESSION {name} [{size}]: {before * 1e6:.2f} us -> {after * 1e6:.2f} us", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
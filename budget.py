@@ -1,7 +1,14 @@
 """This module holds the Budget class"""
 
+import threading
+from itertools import chain, islice
+
+from gridrenderer import render_grid, render_transactions
+from ledger import LedgerStore
+from merchantstats import MerchantStats
+from money import format_cents, to_cents, to_dollars
 from transaction import Transaction
-from tabulate import tabulate
+from transactionstore import TransactionStore, from_epoch_micros
 
 
 class Budget:
@@ -11,20 +18,57 @@ class Budget:
     spent in the budget.
     """
 
-    def __init__(self, name, limit):
+    # the number of recent transactions whose rendered text is kept, for budgets held in memory
+    RENDER_CACHE_SIZE = 1000
+
+    def __init__(self, name, limit, transactions=None):
         """
         Initialize a new Budget with a name, limit, list of transactions,
-        amount spent, and amount left.
+        and amount spent. Amounts are kept in cents.
         :param name: a string
-        :param limit: a float
+        :param limit: the limit in dollars, a float
+        :param transactions: a store of transactions already made, or None for an empty TransactionStore
         """
         self._name = name
-        self._limit = limit
-        self._transactions = []
-        self._amount_spent = 0
-        self._amount_left = limit
+        self._limit_cents = to_cents(limit)
+        self._transactions = transactions if transactions is not None else TransactionStore(name)
+        self._merchant_stats = {}
+        self._rendered_transactions = []
+        self._rendered_start = 0
+        self._render_lock = threading.Lock()
+        self._spent_cents = self._transactions.total() if transactions is not None else 0
         self._is_locked = False
 
+    def replace_store(self, transactions):
+        """
+        Move the transactions recorded so far into a different transaction store
+        and keep using that store from now on.
+        :param transactions: an empty store of transactions
+        """
+        for transaction in self._transactions:
+            transactions.append(transaction.timestamp, transaction.cents, transaction.purchase_location)
+        self._transactions = transactions
+        with self._render_lock:
+            self._rendered_transactions = []
+            self._rendered_start = 0
+
+    @classmethod
+    def from_ledger(cls, ledger, budget_id):
+        """
+        Create a read-only Budget backed by the records of one budget in a Ledger.
+        The amount spent and the merchant totals are added up straight from the
+        ledger, and transactions are only read from the file when they are viewed.
+        :param ledger: a Ledger
+        :param budget_id: the position of the budget in the account, as an int
+        :return: a Budget
+        """
+        details = ledger.account["budgets"][budget_id]
+        store = LedgerStore(ledger, budget_id, details["name"])
+        budget = cls(details["name"], details["limit"], store)
+        budget.is_locked = details["locked"]
+        budget.load_merchant_totals(store.get_merchant_totals())
+        return budget
+
     # is locked property
     @property
     def is_locked(self):
@@ -42,15 +86,33 @@ class Budget:
         """
         self._is_locked = value
 
+    @property
+    def is_read_only(self):
+        """
+        Return whether the budget was opened from a ledger, so no transactions can be recorded in it.
+        :return: a boolean
+        """
+        return isinstance(self._transactions, LedgerStore)
+
     # transaction property
     @property
     def transactions(self):
         """
-        Return list of transactions.
-        :return: list of Transactions
+        Return the transactions recorded in this budget. Transactions are kept in
+        columnar form and only created as Transaction objects when they are read.
+        :return: a TransactionStore, a sequence of Transactions
         """
         return self._transactions
 
+    # merchant stats property
+    @property
+    def merchant_stats(self):
+        """
+        Return the running totals for each purchase location in this budget.
+        :return: a dict of location strings to MerchantStats
+        """
+        return self._merchant_stats
+
     # limit property
     @property
     def limit(self):
@@ -58,7 +120,15 @@ class Budget:
         Return the budget limit.
         :return: a float
         """
-        return self._limit
+        return to_dollars(self._limit_cents)
+
+    @property
+    def limit_cents(self):
+        """
+        Return the budget limit in cents.
+        :return: an int
+        """
+        return self._limit_cents
 
     # name property
     @property
@@ -77,7 +147,7 @@ class Budget:
         Return the amount spent in the budget.
         :return: a float
         """
-        return self._amount_spent
+        return to_dollars(self._spent_cents)
 
     @amount_spent.setter
     def amount_spent(self, amount):
@@ -85,42 +155,129 @@ class Budget:
         Set the amount spent to the amount passed in.
         :param amount: a float
         """
-        self._amount_spent = amount
+        self._spent_cents = to_cents(amount)
+
+    @property
+    def spent_cents(self):
+        """
+        Return the amount spent in the budget, in cents.
+        :return: an int
+        """
+        return self._spent_cents
 
     # amount_left property
     @property
     def amount_left(self):
         """
-        Return the amount left in the budget.
+        Return the amount left in the budget, the limit minus the amount spent.
         :return: a float
         """
-        return self._amount_left
+        return to_dollars(self._limit_cents - self._spent_cents)
 
-    @amount_left.setter
-    def amount_left(self, amount):
+    @property
+    def left_cents(self):
         """
-        Set the amount left to the amount passed in.
-        :param amount: a float
+        Return the amount left in the budget, in cents.
+        :return: an int
+        """
+        return self._limit_cents - self._spent_cents
+
+    def load_merchant_totals(self, merchant_totals):
         """
-        self._amount_left = amount
+        Replace the running totals of each purchase location with totals added up
+        elsewhere, such as from a ledger or a database.
+        :param merchant_totals: a dict of location strings to (count, cents, epoch microseconds) tuples
+        """
+        self._merchant_stats = {
+            location: MerchantStats.from_totals(location, count, cents, from_epoch_micros(latest))
+            for location, (count, cents, latest) in merchant_totals.items()}
 
-    def _add_to_transaction(self, transaction):
+    def _update_merchant_stats(self, timestamp, cents, purchase_location):
         """
-        Add a transaction to the transaction list.
-        :param transaction: Transaction
+        Add a purchase to the running totals of its location.
+        :param timestamp: a datetime object
+        :param cents: the amount in cents, an int
+        :param purchase_location: a string
         """
-        self._transactions.append(transaction)
+        stats = self._merchant_stats.get(purchase_location)
+        if stats is None:
+            stats = self._merchant_stats[purchase_location] = MerchantStats(purchase_location)
+        stats.add(timestamp, cents)
 
-    def record_transaction(self, timestamp, amount, purchase_location):
+    def record_transaction(self, timestamp, cents, purchase_location):
         """
         Record a new transaction.
         :param timestamp: a datetime object
-        :param amount: a float
+        :param cents: the amount in cents, an int
         :param purchase_location: a string
+        :return: the Transaction recorded
         """
-        transaction = Transaction(self.name, timestamp, amount, purchase_location)
-        self._add_to_transaction(transaction)
-        return transaction
+        self._transactions.append(timestamp, cents, purchase_location)
+        self._update_merchant_stats(timestamp, cents, purchase_location)
+        return Transaction(self.name, timestamp, cents, purchase_location)
+
+    def get_top_merchants(self, n, by="total"):
+        """
+        Return the n locations with the highest total spent or purchase count in this budget.
+        :param n: an int
+        :param by: "total" or "count"
+        :return: a list of MerchantStats, highest first
+        """
+        return MerchantStats.top(self._merchant_stats.values(), n, by)
+
+    def get_transactions_between(self, start=None, end=None):
+        """
+        Return the transactions made from start up to, but not including, end, in
+        time order, and the total amount spent in them.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a (list of Transactions, float) tuple
+        """
+        transactions, cents = self._transactions.get_between(start, end)
+        return transactions, to_dollars(cents)
+
+    def get_amount_spent_between(self, start=None, end=None):
+        """
+        Return the amount spent from start up to, but not including, end.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a float
+        """
+        return to_dollars(self._transactions.total_between(start, end))
+
+    def _render_new_transactions(self):
+        """
+        Render the transactions recorded since the last render and add them to the
+        rendered transactions cache, so each recent transaction is only rendered once.
+        The cache keeps between RENDER_CACHE_SIZE and twice that many of the latest
+        transactions, and is not used for budgets that read their transactions from a
+        database or a ledger. Called while holding the render lock.
+        """
+        if not isinstance(self._transactions, TransactionStore):
+            return
+        count = len(self._transactions)
+        rendered_end = self._rendered_start + len(self._rendered_transactions)
+        if rendered_end == count:
+            return
+        start = max(rendered_end, count - Budget.RENDER_CACHE_SIZE)
+        if start > rendered_end:
+            self._rendered_transactions = []
+            self._rendered_start = start
+        self._rendered_transactions.extend(render_transactions(self._transactions[start:count]))
+        excess = len(self._rendered_transactions) - Budget.RENDER_CACHE_SIZE
+        if excess >= Budget.RENDER_CACHE_SIZE:
+            # a new list, so readers holding the old one keep a consistent window
+            self._rendered_transactions = self._rendered_transactions[excess:]
+            self._rendered_start += excess
+
+    def _render_between(self, start, stop):
+        """
+        Render the transactions from start up to, but not including, stop.
+        :param start: an int
+        :param stop: an int
+        :return: a list of strings
+        """
+        return render_transactions(self._transactions[start:stop]) if start < stop else []
 
     def get_transactions_string(self):
         """
@@ -128,19 +285,87 @@ class Budget:
         transaction lists as a string.
         :return: a string
         """
-        transaction_string = ''
-        for transaction in self.transactions:
-            transaction_string += f"{str(transaction)}\n"
-        return transaction_string
+        with self._render_lock:
+            self._render_new_transactions()
+            start = self._rendered_start
+            rendered = self._rendered_transactions
+        end = start + len(rendered)
+        count = len(self._transactions)
+        if start == 0 and end >= count:
+            return ''.join(rendered)
+        return ''.join(chain(self._render_between(0, start), rendered, self._render_between(end, count)))
 
-    def update_balance(self, amount):
+    def iter_transaction_strings(self, offset=0, limit=None, newest_first=False):
         """
-        Increment the amount by the amount given
-        Decrement the amount left by the amount given.
-        :param amount: a float
+        Yield the rendered transactions one at a time, starting at offset and stopping
+        after limit transactions. Only the transactions that are yielded are rendered.
+        :param offset: the number of transactions to skip, as an int
+        :param limit: the maximum number of transactions to yield, as an int, or None for all
+        :param newest_first: True to start from the most recent transaction
+        :return: a generator of strings
+        """
+        count = len(self._transactions)
+        if newest_first:
+            indexes = range(count - 1 - offset, -1, -1)
+        else:
+            indexes = range(offset, count)
+
+        with self._render_lock:
+            start = self._rendered_start
+            rendered = self._rendered_transactions
+        for index in islice(indexes, limit):
+            if start <= index < start + len(rendered):
+                yield rendered[index - start]
+            else:
+                yield f"{str(self._transactions[index])}\n"
+
+    def get_transactions_page(self, page, page_size, newest_first=False):
+        """
+        Return a single page of rendered transactions as a string.
+        :param page: the page number starting at 0, as an int
+        :param page_size: the number of transactions per page, as an int
+        :param newest_first: True to start from the most recent transaction
+        :return: a string
+        """
+        return ''.join(self.iter_transaction_strings(page * page_size, page_size, newest_first))
+
+    def update_balance(self, cents):
+        """
+        Increment the amount spent by the amount given, which also decrements
+        the amount left.
+        :param cents: the amount in cents, an int
+        """
+        self._spent_cents += cents
+
+    def __getstate__(self):
+        """
+        Return the state to pickle, leaving out the rendered transactions cache and its lock.
+        :return: a dict
+        """
+        state = self.__dict__.copy()
+        state["_rendered_transactions"] = []
+        state["_rendered_start"] = 0
+        del state["_render_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled Budget with a new render lock, converting the amounts of
+        a Budget pickled before they were kept in cents.
+        :param state: a dict
         """
-        self.amount_spent += amount
-        self.amount_left -= amount
+        if "_limit" in state:
+            state = dict(state)
+            state["_limit_cents"] = to_cents(state.pop("_limit"))
+            state["_spent_cents"] = to_cents(state.pop("_amount_spent"))
+            del state["_amount_left"]
+        self.__dict__.update(state)
+        self._render_lock = threading.Lock()
+        if "_rendered_start" not in state:
+            # a Budget pickled when its whole rendered history was cached
+            self.__dict__.pop("_transactions_string", None)
+            self._rendered_transactions = []
+            self._rendered_start = 0
 
     def __str__(self):
         """
@@ -148,8 +373,8 @@ class Budget:
         :return: a string
         """
         locked = "Yes" if self.is_locked else "No"
-        budget_string = tabulate(
-            [["Category", f"{self.name}"], ["Locked", f"{locked}"], ["Limit in dollars", f"${self.limit:.2f}"],
-             ["Amount spent in dollars", f"${self.amount_spent:.2f}"], ["Amount left in dollars", f"${self.amount_left:.2f}"]],
-            tablefmt="grid")
+        budget_string = render_grid(
+            [["Category", f"{self.name}"], ["Locked", f"{locked}"], ["Limit in dollars", f"${format_cents(self.limit_cents)}"],
+             ["Amount spent in dollars", f"${format_cents(self.spent_cents)}"],
+             ["Amount left in dollars", f"${format_cents(self.left_cents)}"]])
         return budget_string
@@ -0,0 +1,110 @@
+"""
+This module holds the FAMClient, a small asyncio client for the FAMServer.
+
+Run it to send JSON requests typed one per line on standard input:
+    python client.py --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+
+class FAMClient:
+    """
+    Class that sends requests to a FAMServer and waits for the responses.
+    """
+
+    def __init__(self, reader, writer):
+        """
+        Initialize a FAMClient over an open connection.
+        :param reader: an asyncio.StreamReader
+        :param writer: an asyncio.StreamWriter
+        """
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, path=None):
+        """
+        Open a connection to a FAMServer.
+        :param host: the server address, as a string
+        :param port: the server TCP port, as an int
+        :param path: the path of the server's Unix socket to use instead of TCP, or None
+        :return: a FAMClient
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, command, **arguments):
+        """
+        Send a request and return the response.
+        :param command: the name of the command, as a string
+        :param arguments: the arguments of the command
+        :return: the response, as a dict
+        """
+        return await self.send(dict(arguments, command=command))
+
+    async def send(self, request):
+        """
+        Send a request given as a dict and return the response.
+        :param request: a dict
+        :return: the response, as a dict
+        """
+        self._writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await self._writer.drain()
+        return json.loads(await self._reader.readline())
+
+    async def close(self):
+        """
+        Close the connection.
+        """
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def run_interactive(host, port, path):
+    """
+    Send each line of standard input to the server as a request and print the responses.
+    :param host: the server address, as a string
+    :param port: the server TCP port, as an int
+    :param path: the path of the server's Unix socket, or None
+    """
+    client = await FAMClient.connect(host, port, path)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                response = await client.send(json.loads(line))
+            except ValueError:
+                print("Please enter the request as a JSON object.")
+                continue
+            for key, value in response.items():
+                print(f"{key}: {value}")
+    finally:
+        await client.close()
+
+
+def main():
+    """
+    Parse the command line and start an interactive client.
+    """
+    parser = argparse.ArgumentParser(description="Send JSON requests to a FAM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    arguments = parser.parse_args()
+    asyncio.run(run_interactive(arguments.host, arguments.port, arguments.unix))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,72 @@
 """
 This module holds the driver function for the FAM program.
+
+Run without arguments, it shows the menus. With --replay, it runs a script of
+recorded requests instead (see replay.py) and prints how long each command took:
+    python driver.py --replay script.jsonl --quiet --output timings.json
 """
+import argparse
+import json
+import os
+
 from fam import FAM
+from journal import Journal
+
+DATA_DIRECTORY = "fam_data"
+# Set this environment variable to a file path to record metrics and write them there on exit.
+METRICS_VARIABLE = "FAM_METRICS"
 
 
 def main():
     """
     Driver for the FAM system.
     """
+    parser = argparse.ArgumentParser(description="Family Appointed Moderator.")
+    parser.add_argument("--replay", help="run the requests in this script instead of showing the menus")
+    parser.add_argument("--quiet", action="store_true", help="discard the responses of the replayed requests")
+    parser.add_argument("--data", help="directory of the FAM journal (default fam_data, or none when replaying)")
+    parser.add_argument("--output", help="write the replay timings to this JSON file instead of standard output")
+    arguments = parser.parse_args()
+
+    metrics_path = os.environ.get(METRICS_VARIABLE)
+    if metrics_path:
+        # only imported when asked for, to keep startup fast
+        import instrumentation
+        instrumentation.enable()
 
-    fam = FAM()
+    data = arguments.data or (None if arguments.replay else DATA_DIRECTORY)
+    journal = Journal(data) if data else None
+    fam = FAM(journal)
 
-    # show main menu
-    fam.show_main_menu()
+    try:
+        if arguments.replay:
+            _replay(fam, arguments.replay, arguments.quiet, arguments.output)
+        else:
+            # show main menu
+            fam.show_main_menu()
+    finally:
+        if journal is not None and arguments.replay:
+            journal.close()
+        if metrics_path:
+            instrumentation.METRICS.write(metrics_path)
+
+
+def _replay(fam, path, quiet, output):
+    """
+    Replay a script against a FAM and write the timings as JSON.
+    :param fam: a FAM
+    :param path: the path of the script, as a string
+    :param quiet: True to discard the responses
+    :param output: the path of the JSON file for the timings, or None for standard output
+    """
+    # only imported when replaying, to keep startup fast
+    from replay import replay_file
+    report = json.dumps(replay_file(fam, path, quiet), indent=2)
+    if output:
+        with open(output, "w") as file:
+            file.write(report)
+    else:
+        print(report)
 
 
 if __name__ == '__main__':
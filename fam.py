@@ -2,10 +2,13 @@
 This module houses the FAM - contains the UI of the program.
 """
 
+from bankaccount import BankAccount, InvalidBalanceError
+from notificationqueue import NOTIFICATIONS
 from user import User, UserIsLockedError
 from angel import Angel
 from troublemaker import Troublemaker
 from rebel import Rebel
+from userregistry import UserRegistry
 
 
 class FAM:
@@ -13,11 +16,17 @@ class FAM:
     Class representing a Family Appointed Moderator (F.A.M.)
     """
 
-    def __init__(self):
+    PAGE_SIZE = 10
+    USER_TYPES = {"Angel": Angel, "Troublemaker": Troublemaker, "Rebel": Rebel}
+
+    def __init__(self, storage=None):
         """
-        Initialize the user list.
+        Initialize the user registry. When a storage is given, the users are loaded
+        from it and every change is saved to it.
+        :param storage: a Storage such as a Journal or a SQLiteStorage, or None to keep users in memory only
         """
-        self._user_list = []
+        self._storage = storage
+        self._users = UserRegistry(storage.recover() if storage is not None else [])
         self._current_user = None
 
     @property
@@ -36,28 +45,87 @@ class FAM:
         """
         self._current_user = user
 
+    @property
+    def users(self):
+        """
+        Retrieve the FAM user registry.
+        :return: a UserRegistry
+        """
+        return self._users
+
     @property
     def user_list(self):
         """
-        Retrieve the FAM user list.
-        :return: the user list as a list
+        Retrieve the FAM users in user id order, as a read-only list that follows the
+        registry without copying it. Users are added with add_user.
+        :return: a UserListView
         """
-        return self._user_list
+        return self._users.view
 
     @user_list.setter
     def user_list(self, user_list):
         """
-        Set the user list to the value passed in.
+        Replace the users with the ones in the list passed in. Each user's id is their position in the list.
+        The registry being replaced stops listening to its users' bank accounts.
         :param user_list: a list of Users
         """
-        self._user_list = user_list
+        self._users.detach()
+        self._users = UserRegistry(user_list)
+
+    def add_user(self, user):
+        """
+        Register a user that was created without prompting, such as one created
+        by the server or a replay script.
+        :param user: a User
+        :return: the id of the user, as an int
+        """
+        return self._add_user_to_list(user)
+
+    @staticmethod
+    def create_user(user_type, name, age, bank_number, bank_name, balance, limits):
+        """
+        Create a user and their bank account from details given up front instead of
+        prompting for them. The same rules apply as when registering from the menu.
+        :param user_type: "Angel", "Troublemaker" or "Rebel"
+        :param name: a string
+        :param age: an int
+        :param bank_number: a string
+        :param bank_name: a string
+        :param balance: the opening balance, as a float
+        :param limits: the limit of each budget in menu order, as a list of floats
+        :return: a User
+        """
+        if user_type not in FAM.USER_TYPES:
+            raise ValueError(f"Unknown user type {user_type!r}.")
+        balance = float(balance)
+        if balance <= 0:
+            raise InvalidBalanceError("Balance must be a positive non-zero value")
+        limits = [float(limit) for limit in limits]
+        if len(limits) != len(BankAccount.BUDGET_NAMES):
+            raise ValueError(f"Expected {len(BankAccount.BUDGET_NAMES)} budget limits.")
+        if any(limit <= 0 for limit in limits):
+            raise InvalidBalanceError("Budget limit has to be a positive non-zero value.")
+        bank = BankAccount(bank_number, bank_name, balance, BankAccount.create_budget_list(limits))
+        return FAM.USER_TYPES[user_type](name, int(age), bank)
+
+    def get_user(self, user_id):
+        """
+        Return the user with the given id.
+        :param user_id: an int
+        :return: a User
+        """
+        return self._users.get(user_id)
 
     def _add_user_to_list(self, user):
         """
-        Add a user to the list.
-        :param user: the User object to be added to the list of users
+        Add a user to the registry.
+        :param user: the User object to be added to the registry
+        :return: the id of the user, as an int
         """
-        self._user_list.append(user)
+        user_id = self._users.add(user)
+        if self._storage is not None:
+            self._storage.log_registration(user_id, user)
+        return user_id
 
     def _show_registration_menu(self):
         """
@@ -123,7 +191,8 @@ class FAM:
                   "2 - Record transaction\n"
                   "3 - View transactions by budget\n"
                   "4 - View bank account details\n"
-                  "5 - Logout\n"
+                  "5 - Import bank statement\n"
+                  "6 - Logout\n"
                   )
 
             try:
@@ -131,12 +200,22 @@ class FAM:
             except ValueError:
                 print("Invalid choice. Please try again.")
                 continue
-            # option 5 = LOGOUT, back to main menu
-            if option == 5:
+            # option 6 = LOGOUT, back to main menu
+            if option == 6:
                 return
             else:
                 # performs the action selected by the user.
                 self._perform_action(option)
+                self.flush_storage()
+                # show the budget notices before the menu is printed again
+                NOTIFICATIONS.flush()
+
+    def flush_storage(self):
+        """
+        Write any changes waiting in the storage to disk.
+        """
+        if self._storage is not None:
+            self._storage.flush()
 
     def _perform_action(self, option):
         """
@@ -148,37 +227,81 @@ class FAM:
         elif option == 2:
             self.current_user.record_transaction()
         elif option == 3:
-            self.current_user.view_transactions()
+            self._show_pages(self.current_user.get_transaction_pages(FAM.PAGE_SIZE, self._input_newest_first()))
         elif option == 4:
-            self.current_user.view_bank_details()
+            self._show_pages(self.current_user.get_bank_details_pages(FAM.PAGE_SIZE, self._input_newest_first()))
+        elif option == 5:
+            self.current_user.import_statement()
         else:
             print("Please enter a valid option.")
 
+    @staticmethod
+    def _input_newest_first():
+        """
+        Ask whether transactions should be listed from newest to oldest.
+        :return: True for newest first, False for oldest first
+        """
+        choice = input("Show the newest transactions first? (y/n): ")
+        return choice.strip().lower().startswith("y")
+
+    @staticmethod
+    def _show_pages(pages):
+        """
+        Print pages one at a time, waiting for the user before showing the next one.
+        :param pages: an iterable of strings
+        """
+        pages = iter(pages)
+        page = next(pages, None)
+        if page is None:
+            print("\nThere is nothing to show.")
+            return
+
+        while page is not None:
+            print(page)
+            page = next(pages, None)
+            if page is not None:
+                choice = input("Press Enter for the next page, or q to go back: ")
+                if choice.strip().lower() == "q":
+                    return
+
     def _login_user(self):
         """
-        Select a user from the user list to log in.
+        Select a user from the user registry to log in. When there are more users than
+        fit on a page, the menu shows one page at a time, and a user on any page can be
+        chosen by entering their id.
         :return: True if the login process succeeds, False otherwise
         """
-        # Display list of users and prompt an input
-        print("\n---- Login Menu ----")
-        for user in self.user_list:
-            print(f"{self.user_list.index(user) + 1} - {user}")
-
+        user_count = len(self._users)
+        page_count = max(1, -(-user_count // FAM.PAGE_SIZE))
         # Exit if the last option is chosen
-        choice_exit = len(self.user_list) + 1
-        print(f"{choice_exit} - Back to main menu")
-
-        valid_users = range(1, len(self.user_list) + 1)
-        choice = 0
+        choice_exit = user_count + 1
+        page = 0
+        show_page = True
         while True:
+            if show_page:
+                # Display a page of users and prompt an input
+                print("\n---- Login Menu ----")
+                for user_id, user in self._users.get_page(page, FAM.PAGE_SIZE):
+                    print(f"{user_id + 1} - {user}")
+                print(f"{choice_exit} - Back to main menu")
+                if page_count > 1:
+                    print(f"Page {page + 1} of {page_count}. Enter n for the next page or p for the previous page.")
+                show_page = False
+
+            answer = input("Choose a user by entering the id: ")
+            if page_count > 1 and answer.strip().lower() in ("n", "p"):
+                step = 1 if answer.strip().lower() == "n" else -1
+                page = min(max(page + step, 0), page_count - 1)
+                show_page = True
+                continue
             try:
-                choice = int(input("Choose a user by entering the id: "))
+                choice = int(answer)
             except ValueError:
                 print("\nInvalid choice. Please try again.")
                 continue
 
             # Loop until a valid user is selected
-            if choice in valid_users:
+            if 1 <= choice <= user_count:
                 break
             elif choice == choice_exit:
                 return False
@@ -186,7 +309,7 @@ class FAM:
                 print("\nPlease enter a valid option")
 
         # Set current user to selected user
-        self.current_user = self.user_list[choice - 1]
+        self.current_user = self._users.get(choice - 1)
         return True
 
     def show_main_menu(self):
@@ -223,6 +346,8 @@ class FAM:
                 continue
 
             if choice == 3:
+                if self._storage is not None:
+                    self._storage.close()
                 return
             elif choice > 3 or choice < 0:
                 print("\nInvalid choice. Please try again.")
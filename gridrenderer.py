@@ -0,0 +1,119 @@
+"""
+This module holds a renderer for the small two-column grid tables that describe
+transactions and budgets. It draws the same text as tabulate(rows, tablefmt="grid")
+without tabulate's per-call type and width inference, and renders the transactions of
+a budget in one pass.
+
+Only plain cells are drawn here: printable ASCII with no leading or trailing spaces,
+in columns where at least one cell is not a number. Tabulate aligns, strips or
+measures other cells differently, so any table with one of them is handed to
+tabulate instead.
+"""
+
+from money import format_cents
+
+TIME_FORMAT = "%b %d %Y %H:%M:%S"
+TRANSACTION_LABELS = ("Category", "Time", "Amount", "Location")
+_LABEL_WIDTH = len(max(TRANSACTION_LABELS, key=len))
+_borders = {}
+
+
+def _is_plain(cell):
+    """
+    Return whether a cell is drawn the same way here as by tabulate.
+    :param cell: a string
+    :return: a boolean
+    """
+    return cell.isascii() and cell.isprintable() and cell != "" and cell[0] != " " and cell[-1] != " "
+
+
+def _is_text(cell):
+    """
+    Return whether tabulate would treat a cell as text rather than as a number or a boolean.
+    :param cell: a string
+    :return: a boolean
+    """
+    if cell in ("True", "False"):
+        return False
+    try:
+        float(cell)
+    except ValueError:
+        return True
+    return False
+
+
+def _tabulate_grid(rows):
+    """
+    Draw a table with tabulate, which is only imported when a table needs it.
+    :param rows: a list of lists of strings
+    :return: a string
+    """
+    from tabulate import tabulate
+    return tabulate(rows, tablefmt="grid")
+
+
+def _border(widths):
+    """
+    Return the line drawn between rows for the given column widths.
+    :param widths: a tuple of ints
+    :return: a string
+    """
+    border = _borders.get(widths)
+    if border is None:
+        border = _borders[widths] = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    return border
+
+
+def render_grid(rows):
+    """
+    Draw rows of string cells as a grid table, exactly as tabulate(rows, tablefmt="grid") would.
+    :param rows: a list of lists of strings, all of the same length
+    :return: a string
+    """
+    columns = list(zip(*rows))
+    if not all(_is_plain(cell) for column in columns for cell in column) or \
+            not all(any(_is_text(cell) for cell in column) for column in columns):
+        return _tabulate_grid(rows)
+
+    widths = tuple(max(map(len, column)) for column in columns)
+    border = _border(widths)
+    lines = [border]
+    for row in rows:
+        lines.append("| " + " | ".join(cell.ljust(width) for cell, width in zip(row, widths)) + " |")
+        lines.append(border)
+    return "\n".join(lines)
+
+
+def render_transaction(category, timestamp, cents, location):
+    """
+    Draw the grid table of a transaction, the same text as Transaction.__str__.
+    :param category: a string
+    :param timestamp: a datetime
+    :param cents: the amount in cents, an int
+    :param location: a string
+    :return: a string
+    """
+    time = timestamp.strftime(TIME_FORMAT)
+    amount = f"${format_cents(cents)}"
+    if not (_is_plain(category) and _is_plain(time) and _is_plain(location)):
+        cells = (category, time, amount, location)
+        return _tabulate_grid([[label, cell] for label, cell in zip(TRANSACTION_LABELS, cells)])
+
+    width = max(len(category), len(time), len(amount), len(location))
+    border = _border((_LABEL_WIDTH, width))
+    return f"{border}\n| Category | {category.ljust(width)} |\n{border}\n| Time     | {time.ljust(width)} |\n" \
+           f"{border}\n| Amount   | {amount.ljust(width)} |\n{border}\n| Location | {location.ljust(width)} |\n{border}"
+
+
+def render_transactions(transactions):
+    """
+    Draw the grid table of each transaction in one pass, each followed by a newline.
+    :param transactions: an iterable of Transactions
+    :return: a list of strings
+    """
+    rendered = []
+    append = rendered.append
+    for transaction in transactions:
+        append(render_transaction(transaction.category, transaction.timestamp, transaction.cents,
+                                  transaction.purchase_location) + "\n")
+    return rendered
@@ -0,0 +1,243 @@
+"""
+This module holds the StatementImporter class, which streams bank statements
+into a user's bank account.
+"""
+
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+
+class StatementImporter:
+    """
+    Class that imports a CSV or JSON lines bank statement into a user's bank account.
+    Rows are read, parsed and recorded through a chain of generators in fixed size
+    chunks, so memory use does not depend on the size of the statement.
+
+    Every row needs a budget (the budget name or its menu number), an amount and a
+    location. The timestamp is optional, in ISO 8601 format, and defaults to the time
+    of the import.
+    """
+
+    CSV_EXTENSIONS = (".csv",)
+    JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson", ".json")
+
+    def __init__(self, user, chunk_size=1000, quarantine_path=None, progress=None, progress_every=10000):
+        """
+        Initialize a StatementImporter for a user.
+        :param user: the User whose bank account receives the transactions
+        :param chunk_size: the number of rows recorded at a time, as an int
+        :param quarantine_path: path of a JSON lines file that bad rows are written to,
+                                or None to print them instead
+        :param progress: a callable that receives an ImportSummary, or None to print progress
+        :param progress_every: the number of rows between progress reports, as an int
+        """
+        self._user = user
+        self._chunk_size = chunk_size
+        self._quarantine_path = quarantine_path
+        self._progress = progress if progress is not None else print
+        self._progress_every = progress_every
+        self._budget_indexes = self._create_budget_index_map(user.bank.budgets)
+
+    @staticmethod
+    def _create_budget_index_map(budgets):
+        """
+        Map the budget names and menu numbers that can appear in a statement to budget indexes.
+        :param budgets: a list of Budgets
+        :return: a dict of strings to ints
+        """
+        budget_indexes = {}
+        for index, budget in enumerate(budgets):
+            budget_indexes[budget.name.lower()] = index
+            budget_indexes[str(index + 1)] = index
+        return budget_indexes
+
+    def import_file(self, path):
+        """
+        Import every row in the statement at the given path.
+        :param path: the path of a .csv or .jsonl file, as a string
+        :return: an ImportSummary
+        """
+        summary = ImportSummary()
+        quarantine = open(self._quarantine_path, "a", encoding="utf-8") if self._quarantine_path else None
+        try:
+            with open(path, newline="", encoding="utf-8") as statement:
+                rows = self._read_rows(statement, path)
+                for chunk in self._chunk(self._parse_rows(rows)):
+                    self._record_chunk(chunk, summary, quarantine)
+        finally:
+            if quarantine is not None:
+                quarantine.close()
+
+        self._progress(summary)
+        return summary
+
+    def _read_rows(self, statement, path):
+        """
+        Yield (line number, row) pairs from an open statement file. A row that could not
+        be read, such as a CSV row with a field over the csv module's size limit, is
+        yielded as a StatementRowError instead of a dict.
+        :param statement: an open file
+        :param path: the path of the file, used to pick the format
+        :return: a generator of (int, dict) tuples
+        """
+        lower_path = path.lower()
+        if lower_path.endswith(StatementImporter.CSV_EXTENSIONS):
+            reader = csv.DictReader(statement)
+            try:
+                reader.fieldnames
+            except csv.Error as e:
+                raise ValueError(f"The header of {path} could not be read: {e}") from e
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    # the DictReader only counts the lines of rows that were read
+                    line_number = reader.reader.line_num
+                    row = StatementRowError(f"Line {line_number} could not be read: {e}", None)
+                    yield line_number, row
+                else:
+                    yield reader.line_num, row
+        elif lower_path.endswith(StatementImporter.JSON_LINES_EXTENSIONS):
+            for line_number, line in enumerate(statement, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = StatementRowError(f"Line {line_number} is not valid JSON.", line.rstrip("\n"))
+                else:
+                    if not isinstance(row, dict):
+                        row = StatementRowError(f"Line {line_number} is not a JSON object.", row)
+                yield line_number, row
+        else:
+            raise ValueError(f"Unsupported statement format: {path}")
+
+    def _parse_rows(self, rows):
+        """
+        Turn (line number, row) pairs into transaction records. Rows that cannot be
+        parsed are passed through with a StatementRowError in place of the record.
+        :param rows: an iterable of (int, dict) tuples
+        :return: a generator of (int, row, record) tuples
+        """
+        for line_number, row in rows:
+            if isinstance(row, StatementRowError):
+                yield line_number, row.row, row
+                continue
+            try:
+                record = self._parse_row(row)
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                record = StatementRowError(f"Line {line_number} could not be read: {e!r}", row)
+            yield line_number, row, record
+
+    def _parse_row(self, row):
+        """
+        Build a (budget_index, amount, purchase_location, timestamp) record from a row.
+        :param row: a dict
+        :return: a tuple
+        """
+        budget = str(row["budget"]).strip().lower()
+        if budget not in self._budget_indexes:
+            raise ValueError(f"Unknown budget {row['budget']!r}")
+        budget_index = self._budget_indexes[budget]
+        amount = float(row["amount"])
+        purchase_location = str(row["location"]).strip()
+        timestamp = row.get("timestamp")
+        timestamp = datetime.fromisoformat(timestamp.strip()) if timestamp else None
+        return budget_index, amount, purchase_location, timestamp
+
+    def _chunk(self, parsed_rows):
+        """
+        Group parsed rows into lists of at most chunk_size rows.
+        :param parsed_rows: an iterable of parsed rows
+        :return: a generator of lists
+        """
+        iterator = iter(parsed_rows)
+        while True:
+            chunk = list(islice(iterator, self._chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _record_chunk(self, chunk, summary, quarantine):
+        """
+        Record the valid rows of a chunk in the user's bank account and quarantine the rest.
+        :param chunk: a list of (line number, row, record) tuples
+        :param summary: the ImportSummary to update
+        :param quarantine: an open quarantine file, or None
+        """
+        rows_by_record = {}
+        records = []
+        for line_number, row, record in chunk:
+            if isinstance(record, StatementRowError):
+                self._quarantine(quarantine, line_number, row, record)
+                summary.rejected += 1
+            else:
+                rows_by_record[id(record)] = (line_number, row)
+                records.append(record)
+
+        report = self._user.bank.record_transactions(self._user, records)
+        summary.imported += len(report.accepted)
+        summary.rejected += len(report.rejected)
+        for record, error in report.rejected:
+            line_number, row = rows_by_record[id(record)]
+            self._quarantine(quarantine, line_number, row, error)
+
+        previous_count = summary.rows
+        summary.rows += len(chunk)
+        if summary.rows // self._progress_every > previous_count // self._progress_every:
+            self._progress(summary)
+
+    @staticmethod
+    def _quarantine(quarantine, line_number, row, error):
+        """
+        Write a bad row to the quarantine file, or print why it was skipped if there is none.
+        :param quarantine: an open file, or None
+        :param line_number: an int
+        :param row: the row as it was read
+        :param error: an Exception explaining why the row was rejected
+        """
+        if quarantine is None:
+            print(f"Skipped line {line_number}: {error}")
+            return
+        quarantine.write(json.dumps({"line": line_number, "row": row, "error": str(error)}, default=str))
+        quarantine.write("\n")
+
+
+class ImportSummary:
+    """
+    Class holding the running totals of a statement import.
+    """
+
+    def __init__(self):
+        """
+        Initialize an ImportSummary with all counts at 0.
+        """
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+
+    def __str__(self):
+        """
+        Return the import progress as a string.
+        :return: a string
+        """
+        return f"Read {self.rows} row(s): {self.imported} imported, {self.rejected} rejected."
+
+
+class StatementRowError(Exception):
+    """
+    Exception for a statement row that is malformed or missing required values.
+    """
+
+    def __init__(self, message, row):
+        """
+        Initialize a StatementRowError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        :param row: the row that could not be read
+        """
+        super().__init__(message)
+        self.row = row
@@ -0,0 +1,221 @@
+"""
+This module holds the opt-in instrumentation of the transaction recording, threshold
+check, budget locking and rendering hot paths.
+
+Instrumentation is off by default and then costs nothing: enable() replaces each
+instrumented method with a wrapper that counts its calls and records their latency in
+a histogram, and disable() puts the original methods back. The metrics can be written
+in the Prometheus text format or as JSON:
+    import instrumentation
+    instrumentation.enable()
+    ...
+    instrumentation.METRICS.write("metrics.prom")
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from alertengine import AlertEngine
+from bankaccount import BankAccount
+from budget import Budget
+from transaction import Transaction
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# The methods that are instrumented, by the group they are reported under.
+INSTRUMENTED = {
+    "record": [(BankAccount, "record_transaction"), (BankAccount, "record_transactions"),
+               (BankAccount, "_complete_transaction"), (BankAccount, "_on_transaction_complete"),
+               (Budget, "record_transaction")],
+    "threshold": [(AlertEngine, "check")],
+    "lock": [(BankAccount, "_lock_budget")],
+    "render": [(Budget, "get_transactions_string"), (BankAccount, "__str__"), (BankAccount, "get_notice"),
+               (Transaction, "__str__")],
+}
+
+
+class Histogram:
+    """
+    Class that counts calls and how long they took, in cumulative latency buckets.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty Histogram.
+        """
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        """
+        Record one call.
+        :param seconds: the duration of the call, as a float
+        """
+        self.bucket_counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def cumulative_counts(self):
+        """
+        Return the number of calls at or under each bucket bound, ending with all calls.
+        :return: a list of ints
+        """
+        counts = []
+        running = 0
+        for count in self.bucket_counts:
+            running += count
+            counts.append(running)
+        return counts
+
+
+class Metrics:
+    """
+    Class that holds a latency Histogram for each instrumented method.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty set of Metrics.
+        """
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, group, method, seconds):
+        """
+        Record one call of a method.
+        :param group: the group the method is reported under, as a string
+        :param method: the qualified name of the method, as a string
+        :param seconds: the duration of the call, as a float
+        """
+        with self._lock:
+            histogram = self._histograms.get((group, method))
+            if histogram is None:
+                histogram = self._histograms[(group, method)] = Histogram()
+            histogram.observe(seconds)
+
+    def get_count(self, method):
+        """
+        Return the number of recorded calls of a method.
+        :param method: the qualified name of the method, such as "BankAccount._lock_budget"
+        :return: an int
+        """
+        with self._lock:
+            return sum(histogram.count for (_, name), histogram in self._histograms.items() if name == method)
+
+    def reset(self):
+        """
+        Forget every recorded call.
+        """
+        with self._lock:
+            self._histograms.clear()
+
+    def to_dict(self):
+        """
+        Return the metrics as a dict that can be written as JSON.
+        :return: a dict
+        """
+        with self._lock:
+            return {"buckets": list(BUCKETS),
+                    "methods": [{"group": group, "method": method, "count": histogram.count,
+                                 "total_seconds": histogram.total, "bucket_counts": histogram.cumulative_counts()}
+                                for (group, method), histogram in sorted(self._histograms.items())]}
+
+    def to_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        :return: a string
+        """
+        lines = ["# HELP fam_calls_total Number of calls of an instrumented method.",
+                 "# TYPE fam_calls_total counter"]
+        histogram_lines = ["# HELP fam_call_duration_seconds Latency of an instrumented method.",
+                           "# TYPE fam_call_duration_seconds histogram"]
+        with self._lock:
+            for (group, method), histogram in sorted(self._histograms.items()):
+                labels = f'group="{group}",method="{method}"'
+                lines.append(f"fam_calls_total{{{labels}}} {histogram.count}")
+                bounds = [repr(bound) for bound in BUCKETS] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    histogram_lines.append(f'fam_call_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                histogram_lines.append(f"fam_call_duration_seconds_sum{{{labels}}} {histogram.total!r}")
+                histogram_lines.append(f"fam_call_duration_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines + histogram_lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the metrics to a file, as JSON if the path ends in .json and in the
+        Prometheus text format otherwise.
+        :param path: a string
+        """
+        with open(path, "w") as file:
+            if path.endswith(".json"):
+                json.dump(self.to_dict(), file, indent=2)
+            else:
+                file.write(self.to_prometheus())
+
+
+METRICS = Metrics()
+_originals = {}
+
+
+def _instrument(group, method_name, function):
+    """
+    Wrap a function so that each call is timed and recorded in METRICS.
+    :param group: the group the method is reported under, as a string
+    :param method_name: the qualified name of the method, as a string
+    :param function: the original function
+    :return: the wrapper function
+    """
+    clock = time.perf_counter
+    observe = METRICS.observe
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            observe(group, method_name, clock() - started)
+    return wrapper
+
+
+def enable():
+    """
+    Start recording metrics by replacing the instrumented methods with timed wrappers.
+    Calling it again while enabled does nothing.
+    """
+    for group, methods in INSTRUMENTED.items():
+        for cls, name in methods:
+            if (cls, name) in _originals:
+                continue
+            original = inspect.getattr_static(cls, name)
+            method_name = f"{cls.__name__}.{name}"
+            if isinstance(original, staticmethod):
+                replacement = staticmethod(_instrument(group, method_name, original.__func__))
+            else:
+                replacement = _instrument(group, method_name, original)
+            _originals[(cls, name)] = original
+            setattr(cls, name, replacement)
+
+
+def disable():
+    """
+    Stop recording metrics and put the original methods back. The metrics recorded
+    so far are kept.
+    """
+    while _originals:
+        (cls, name), original = _originals.popitem()
+        setattr(cls, name, original)
+
+
+def is_enabled():
+    """
+    Return whether metrics are being recorded.
+    :return: a boolean
+    """
+    return bool(_originals)
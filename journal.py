@@ -0,0 +1,324 @@
+"""
+This module holds the Journal class, which makes the FAM user list durable with an
+append-only event log and periodic snapshots.
+"""
+
+import json
+import os
+import pickle
+import threading
+import time
+
+from bankaccount import BankAccount
+from fam import FAM
+from storage import Storage
+from transactionstore import to_epoch_micros, from_epoch_micros
+
+
+class Journal(Storage):
+    """
+    Class that records every registration, transaction and budget lock as a line in
+    an append-only log, and periodically writes a snapshot of all the users.
+
+    Events are buffered and written with a single fsync once batch_size events are
+    waiting or flush_interval seconds have passed since the oldest of them (group
+    commit). After snapshot_every events the log is set aside, every user is pickled
+    to a snapshot file along with the sequence number of their latest event, and the
+    old log is deleted, so recovery only ever replays the events since the last
+    snapshot.
+
+    Each user is pickled while holding their account lock, and every event is logged
+    while the account lock is held, so a user's snapshot always matches their latest
+    sequence number even while other threads keep recording transactions.
+    """
+
+    LOG_FILE = "journal.log"
+    OLD_LOG_FILE = "journal.log.old"
+    SNAPSHOT_FILE = "snapshot.pickle"
+
+    def __init__(self, directory, batch_size=256, flush_interval=0.05, snapshot_every=100000):
+        """
+        Initialize a Journal that keeps its files in a directory.
+        :param directory: the path of the directory, as a string
+        :param batch_size: the number of events written per fsync, as an int
+        :param flush_interval: the longest time in seconds an event waits to be written, as a float
+        :param snapshot_every: the number of events between snapshots, as an int
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._log_path = os.path.join(directory, Journal.LOG_FILE)
+        self._old_log_path = os.path.join(directory, Journal.OLD_LOG_FILE)
+        self._snapshot_path = os.path.join(directory, Journal.SNAPSHOT_FILE)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._snapshot_every = snapshot_every
+        self._users = []
+        self._user_sequences = {}
+        self._sequence = 0
+        self._events_since_snapshot = 0
+        self._buffer = []
+        self._oldest_buffered = None
+        self._log = None
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+
+    @property
+    def sequence(self):
+        """
+        Return the sequence number of the latest event.
+        :return: an int
+        """
+        return self._sequence
+
+    def recover(self):
+        """
+        Rebuild the user list from the latest snapshot and the events logged after it,
+        then open the log for new events. If anything was replayed, a new snapshot is
+        written straight away so the next recovery starts from here.
+        :return: the recovered list of Users, in user id order
+        """
+        self._load_snapshot()
+        old_replayed, old_complete = self._replay_log(self._old_log_path)
+        replayed, complete = self._replay_log(self._log_path)
+        self._log = open(self._log_path, "ab")
+        for user_id, user in enumerate(self._users):
+            self._attach(user_id, user)
+        if old_replayed or replayed or not complete or os.path.exists(self._old_log_path):
+            self.snapshot()
+        return list(self._users)
+
+    def _load_snapshot(self):
+        """
+        Load the users and their latest sequence numbers from the snapshot file, if there is one.
+        """
+        if not os.path.exists(self._snapshot_path):
+            return
+        with open(self._snapshot_path, "rb") as snapshot:
+            state = pickle.load(snapshot)
+        self._users = [pickle.loads(user) for user in state["users"]]
+        self._user_sequences = dict(enumerate(state["sequences"]))
+        self._sequence = state["seq"]
+
+    def _replay_log(self, path):
+        """
+        Apply the events in a log file that are newer than the snapshot of their user.
+        Reading stops at a line that was only partly written before a crash.
+        :param path: the path of the log file, as a string
+        :return: the number of events applied as an int, and False if the log ended
+                 with a partly written line
+        """
+        if not os.path.exists(path):
+            return 0, True
+        replayed = 0
+        with open(path, "rb") as log:
+            for line in log:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    return replayed, False
+                self._sequence = max(self._sequence, event["seq"])
+                if event["seq"] > self._user_sequences.get(event["user"], 0):
+                    self._replay(event)
+                    self._user_sequences[event["user"]] = event["seq"]
+                    replayed += 1
+        return replayed, True
+
+    def _replay(self, event):
+        """
+        Apply a logged event to the user list.
+        :param event: a dict
+        """
+        if event["event"] == "register":
+            bank = BankAccount(event["number"], event["bank"], event["balance"],
+                               BankAccount.create_budget_list(event["limits"]))
+            user_type = FAM.USER_TYPES[event["type"]]
+            self._users.append(user_type(event["name"], event["age"], bank))
+        elif event["event"] == "transaction":
+            self._users[event["user"]].bank.apply_transaction(event["budget"], event["amount"],
+                                                              from_epoch_micros(event["timestamp"]),
+                                                              event["location"])
+        elif event["event"] == "lock":
+            user = self._users[event["user"]]
+            user.bank.budgets[event["budget"]].is_locked = True
+            user.increment_locked_budgets()
+
+    def _attach(self, user_id, user):
+        """
+        Start logging the transactions and budget locks of a user's bank account.
+        :param user_id: the id of the user, as an int
+        :param user: a User
+        """
+        user.bank.add_listener(AccountJournal(self, user_id))
+
+    def log_registration(self, user_id, user):
+        """
+        Log a newly registered user with their bank details and budget limits, add
+        them to the users that are snapshotted, and start logging their bank account.
+        :param user_id: the id of the user, which is the number of users registered before them, as an int
+        :param user: a User
+        """
+        bank = user.bank
+        with bank.lock:
+            self._append({"event": "register", "user": user_id, "type": user.get_type(), "name": user.name,
+                          "age": user.age, "number": bank.number, "bank": bank.name, "balance": bank.balance,
+                          "limits": [budget.limit for budget in bank.budgets]}, user)
+            self._attach(user_id, user)
+
+    def log_transaction(self, user_id, budget_index, transaction):
+        """
+        Log a recorded transaction.
+        :param user_id: an int
+        :param budget_index: an int
+        :param transaction: a Transaction
+        """
+        self._append({"event": "transaction", "user": user_id, "budget": budget_index,
+                      "amount": transaction.dollar_amount, "location": transaction.purchase_location,
+                      "timestamp": to_epoch_micros(transaction.timestamp)})
+
+    def log_budget_locked(self, user_id, budget_index):
+        """
+        Log a budget being locked.
+        :param user_id: an int
+        :param budget_index: an int
+        """
+        self._append({"event": "lock", "user": user_id, "budget": budget_index})
+
+    def _append(self, event, registered_user=None):
+        """
+        Give an event the next sequence number and buffer it, writing the buffer out
+        when it is full or has waited long enough.
+        :param event: a dict with the id of the user it belongs to
+        :param registered_user: the User a register event is for, added to the snapshotted
+        users together with the event so a snapshot never holds one without the other
+        """
+        with self._lock:
+            if self._log is None:
+                raise JournalError("The journal has to be recovered before events can be logged.")
+            if registered_user is not None:
+                self._users.append(registered_user)
+            self._sequence += 1
+            event["seq"] = self._sequence
+            self._user_sequences[event["user"]] = self._sequence
+            self._buffer.append(json.dumps(event, separators=(",", ":")) + "\n")
+            now = time.monotonic()
+            if self._oldest_buffered is None:
+                self._oldest_buffered = now
+
+            if len(self._buffer) >= self._batch_size or now - self._oldest_buffered >= self._flush_interval:
+                self.flush()
+            self._events_since_snapshot += 1
+            snapshot_due = self._events_since_snapshot >= self._snapshot_every
+
+        if snapshot_due:
+            self.snapshot()
+
+    def flush(self):
+        """
+        Write the buffered events to the log and fsync it.
+        """
+        with self._lock:
+            if not self._buffer:
+                return
+            self._log.write("".join(self._buffer).encode("utf-8"))
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._buffer = []
+            self._oldest_buffered = None
+
+    def snapshot(self):
+        """
+        Write a snapshot of every user. The current log is set aside first, so events
+        logged while the snapshot is written go to a fresh log. The snapshot is written
+        to a temporary file and renamed into place so a crash never leaves a partial
+        one, and the old log is deleted once the snapshot is in place.
+        """
+        if not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self.flush()
+                self._log.close()
+                if os.path.exists(self._old_log_path):
+                    # an earlier snapshot did not finish; keep its events ahead of this log's
+                    with open(self._old_log_path, "ab") as old_log, open(self._log_path, "rb") as log:
+                        old_log.write(log.read())
+                    os.remove(self._log_path)
+                else:
+                    os.replace(self._log_path, self._old_log_path)
+                self._log = open(self._log_path, "ab")
+                self._events_since_snapshot = 0
+                users = list(self._users)
+
+            pickled_users = []
+            sequences = []
+            for user_id, user in enumerate(users):
+                with user.bank.lock:
+                    pickled_users.append(pickle.dumps(user, protocol=pickle.HIGHEST_PROTOCOL))
+                    with self._lock:
+                        sequences.append(self._user_sequences.get(user_id, 0))
+
+            temp_path = self._snapshot_path + ".tmp"
+            with open(temp_path, "wb") as snapshot:
+                pickle.dump({"seq": max(sequences, default=0), "users": pickled_users, "sequences": sequences},
+                            snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(temp_path, self._snapshot_path)
+            os.remove(self._old_log_path)
+        finally:
+            self._snapshot_lock.release()
+
+    def close(self):
+        """
+        Write any buffered events and close the log.
+        """
+        with self._lock:
+            if self._log is None:
+                return
+            self.flush()
+            self._log.close()
+            self._log = None
+
+
+class AccountJournal:
+    """
+    Class that listens to a single user's bank account and logs its events to a Journal.
+    """
+
+    def __init__(self, journal, user_id):
+        """
+        Initialize an AccountJournal for a user.
+        :param journal: a Journal
+        :param user_id: the id of the user, as an int
+        """
+        self._journal = journal
+        self._user_id = user_id
+
+    def on_transaction(self, user, budget_index, transaction):
+        """
+        Log a recorded transaction.
+        :param user: a User
+        :param budget_index: an int
+        :param transaction: a Transaction
+        """
+        self._journal.log_transaction(self._user_id, budget_index, transaction)
+
+    def on_budget_locked(self, user, budget_index):
+        """
+        Log a locked budget.
+        :param user: a User
+        :param budget_index: an int
+        """
+        self._journal.log_budget_locked(self._user_id, budget_index)
+
+
+class JournalError(Exception):
+    """
+    Exception for when the journal is used before it has been recovered or after it has been closed.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a JournalError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)
@@ -0,0 +1,434 @@
+"""
+This module holds the binary ledger file format: the LedgerWriter that creates ledger
+files, the Ledger that reads them through mmap, and the LedgerStore that lets a Budget
+use a ledger as a read-only transaction store.
+
+A ledger file is laid out as:
+    header      magic, version, record count and dictionary offset (32 bytes)
+    records     one fixed-width record per transaction (24 bytes each):
+                timestamp as epoch microseconds (int64), amount in cents (int64),
+                budget id (int32) and location id (int32), all little-endian
+    dictionary  UTF-8 JSON with the location names and the account details
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from functools import lru_cache
+
+from money import to_dollars
+from transaction import Transaction
+from transactionstore import TransactionStore, from_epoch_micros, to_epoch_micros
+
+
+MAGIC = b"FAMLEDG1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+RECORD = struct.Struct("<qqii")
+
+# Position of each field within a record, counted in int64 words and in int32 words.
+AMOUNT_WORD = 1
+WORDS_PER_RECORD = 3
+BUDGET_HALF_WORD = 4
+HALF_WORDS_PER_RECORD = 6
+
+
+@lru_cache(maxsize=None)
+def _import_numpy():
+    """
+    Import numpy the first time a ledger needs it, so programs that never read a
+    ledger do not pay for importing it.
+    :return: the numpy module, or None when it is not installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class LedgerWriter:
+    """
+    Class that writes transactions to a new ledger file.
+    """
+
+    def __init__(self, path, account=None):
+        """
+        Initialize a LedgerWriter and create the file at path.
+        :param path: the path of the ledger file, as a string
+        :param account: a dict of account details to store in the dictionary, or None
+        """
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        self._account = account if account is not None else {}
+        self._locations = []
+        self._location_ids = {}
+        self._count = 0
+
+    def add(self, timestamp, cents, budget_id, location):
+        """
+        Write a single transaction record.
+        :param timestamp: the time of the transaction as epoch microseconds, an int
+        :param cents: the amount in cents, an int
+        :param budget_id: an int
+        :param location: the purchase location, a string
+        """
+        location_id = self._location_ids.get(location)
+        if location_id is None:
+            location_id = self._location_ids[location] = len(self._locations)
+            self._locations.append(location)
+        self._file.write(RECORD.pack(timestamp, cents, budget_id, location_id))
+        self._count += 1
+
+    def add_store(self, budget_id, store):
+        """
+        Write every transaction in a budget's store. The columns of a TransactionStore
+        are read directly; other stores, such as a SQLiteTransactionStore or a
+        LedgerStore, are read as Transactions.
+        :param budget_id: an int
+        :param store: a TransactionStore, or any sequence of Transactions
+        """
+        if not isinstance(store, TransactionStore):
+            for transaction in store:
+                self.add(to_epoch_micros(transaction.timestamp), transaction.cents, budget_id,
+                         transaction.purchase_location)
+            return
+        locations = store.locations
+        for timestamp, cents, code in zip(store.timestamps, store.amounts, store.location_codes):
+            self.add(timestamp, cents, budget_id, locations[code])
+
+    def close(self):
+        """
+        Write the dictionary, fill in the header and close the file.
+        """
+        dictionary_offset = self._file.tell()
+        self._file.write(json.dumps({"locations": self._locations, "account": self._account}).encode("utf-8"))
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, self._count, dictionary_offset))
+        self._file.close()
+
+    def __enter__(self):
+        """
+        Return the writer for use in a with statement.
+        :return: a LedgerWriter
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Close the writer at the end of a with statement.
+        """
+        self.close()
+
+
+class Ledger:
+    """
+    Class that reads a ledger file through a read-only memory map. The records are
+    exposed as memoryviews over the mapped file, so nothing is copied or converted
+    until a value is read, and totals are computed without creating Transactions.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize a Ledger by mapping the file at path.
+        :param path: the path of the ledger file, as a string
+        """
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, dictionary_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise LedgerError(f"{path} is not a version {VERSION} ledger file.")
+
+        self._count = count
+        self._records = memoryview(self._map)[HEADER.size:HEADER.size + count * RECORD.size]
+        dictionary = json.loads(self._map[dictionary_offset:].decode("utf-8"))
+        self._locations = dictionary["locations"]
+        self._account = dictionary["account"]
+
+    @property
+    def account(self):
+        """
+        Return the account details stored with the ledger.
+        :return: a dict
+        """
+        return self._account
+
+    @property
+    def locations(self):
+        """
+        Return the location names, indexed by location id.
+        :return: a list of strings
+        """
+        return self._locations
+
+    def __len__(self):
+        """
+        Return the number of records in the ledger.
+        :return: an int
+        """
+        return self._count
+
+    def _as_numpy(self):
+        """
+        Return the records as a numpy structured array over the mapped file.
+        :return: a numpy array
+        """
+        numpy = _import_numpy()
+        dtype = numpy.dtype([("timestamp", "<i8"), ("cents", "<i8"), ("budget", "<i4"), ("location", "<i4")])
+        return numpy.frombuffer(self._records, dtype=dtype, count=self._count)
+
+    def _words(self):
+        """
+        Return the records as native int64 and int32 memoryviews, or None when the
+        machine is not little-endian and the records have to be unpacked instead.
+        :return: a (memoryview, memoryview) tuple, or None
+        """
+        if sys.byteorder != "little":
+            return None
+        return self._records.cast("q"), self._records.cast("i")
+
+    def total_cents(self, budget_id=None):
+        """
+        Return the total amount in cents of every record, or of the records of one budget.
+        :param budget_id: an int, or None for all budgets
+        :return: an int
+        """
+        if _import_numpy() is not None:
+            records = self._as_numpy()
+            if budget_id is not None:
+                records = records[records["budget"] == budget_id]
+            return int(records["cents"].sum())
+
+        words = self._words()
+        if words is None:
+            return sum(cents for _, cents, budget, _ in RECORD.iter_unpack(self._records)
+                       if budget_id is None or budget == budget_id)
+        int64_words, int32_words = words
+        amounts = int64_words[AMOUNT_WORD::WORDS_PER_RECORD]
+        if budget_id is None:
+            return sum(amounts)
+        budgets = int32_words[BUDGET_HALF_WORD::HALF_WORDS_PER_RECORD]
+        return sum(cents for cents, budget in zip(amounts, budgets) if budget == budget_id)
+
+    def total(self, budget_id=None):
+        """
+        Return the total amount in dollars of every record, or of the records of one budget.
+        :param budget_id: an int, or None for all budgets
+        :return: a float
+        """
+        return to_dollars(self.total_cents(budget_id))
+
+    def get_positions(self, budget_id):
+        """
+        Return the positions of the records that belong to a budget.
+        :param budget_id: an int
+        :return: an array of ints
+        """
+        numpy = _import_numpy()
+        if numpy is not None:
+            return array("Q", numpy.flatnonzero(self._as_numpy()["budget"] == budget_id).tobytes())
+        words = self._words()
+        if words is None:
+            budgets = (budget for _, _, budget, _ in RECORD.iter_unpack(self._records))
+        else:
+            budgets = words[1][BUDGET_HALF_WORD::HALF_WORDS_PER_RECORD]
+        return array("Q", (position for position, budget in enumerate(budgets) if budget == budget_id))
+
+    def get_merchant_totals(self, budget_id):
+        """
+        Return the number of records, the total in cents and the latest timestamp of
+        each location in a budget, without creating any Transactions.
+        :param budget_id: an int
+        :return: a dict of location strings to (count, cents, epoch microseconds) tuples
+        """
+        numpy = _import_numpy()
+        if numpy is not None:
+            records = self._as_numpy()
+            records = records[records["budget"] == budget_id]
+            locations = records["location"]
+            counts = numpy.bincount(locations, minlength=len(self._locations))
+            totals = numpy.zeros(len(self._locations), dtype=numpy.int64)
+            numpy.add.at(totals, locations, records["cents"])
+            latest = numpy.full(len(self._locations), numpy.iinfo(numpy.int64).min, dtype=numpy.int64)
+            numpy.maximum.at(latest, locations, records["timestamp"])
+            return {self._locations[location_id]: (int(counts[location_id]), int(totals[location_id]),
+                                                    int(latest[location_id]))
+                    for location_id in numpy.flatnonzero(counts)}
+
+        merchant_totals = {}
+        for timestamp, cents, record_budget_id, location in self.iter_records():
+            if record_budget_id != budget_id:
+                continue
+            count, total, latest = merchant_totals.get(location, (0, 0, timestamp))
+            merchant_totals[location] = (count + 1, total + cents, max(latest, timestamp))
+        return merchant_totals
+
+    def get_record(self, position):
+        """
+        Return a single record without converting any of the others.
+        :param position: an int
+        :return: a (timestamp, cents, budget id, location) tuple
+        """
+        timestamp, cents, budget_id, location_id = RECORD.unpack_from(self._records, position * RECORD.size)
+        return timestamp, cents, budget_id, self._locations[location_id]
+
+    def iter_records(self):
+        """
+        Iterate over every record in file order.
+        :return: an iterator of (timestamp, cents, budget id, location) tuples
+        """
+        locations = self._locations
+        for timestamp, cents, budget_id, location_id in RECORD.iter_unpack(self._records):
+            yield timestamp, cents, budget_id, locations[location_id]
+
+    def close(self):
+        """
+        Release the memoryview and the memory map, and close the file.
+        """
+        if getattr(self, "_records", None) is not None:
+            self._records.release()
+            self._records = None
+        self._map.close()
+        self._file.close()
+
+
+class LedgerStore(Sequence):
+    """
+    Class that gives a Budget read-only access to its transactions in a Ledger, in
+    place of a TransactionStore. Transactions are created only when they are read.
+    """
+
+    def __init__(self, ledger, budget_id, category):
+        """
+        Initialize a LedgerStore for one budget of a ledger.
+        :param ledger: a Ledger
+        :param budget_id: an int
+        :param category: the budget name, as a string
+        """
+        self._ledger = ledger
+        self._budget_id = budget_id
+        self._category = category
+        self._positions = ledger.get_positions(budget_id)
+
+    @property
+    def category(self):
+        """
+        Return the budget category that the transactions belong to.
+        :return: a string
+        """
+        return self._category
+
+    def get_merchant_totals(self):
+        """
+        Return the number of transactions, the total in cents and the latest timestamp
+        of each location in the budget.
+        :return: a dict of location strings to (count, cents, epoch microseconds) tuples
+        """
+        return self._ledger.get_merchant_totals(self._budget_id)
+
+    def append(self, timestamp, amount, purchase_location):
+        """
+        Refuse to add a transaction, since ledgers are read-only.
+        """
+        raise LedgerError("Transactions cannot be recorded in a budget opened from a ledger.")
+
+    def total(self):
+        """
+        Return the sum in cents of all the amounts in the budget.
+        :return: an int
+        """
+        return self._ledger.total_cents(self._budget_id)
+
+    def _materialize(self, index):
+        """
+        Create the Transaction stored at an index.
+        :param index: a non-negative int
+        :return: a Transaction
+        """
+        timestamp, cents, _, location = self._ledger.get_record(self._positions[index])
+        return Transaction(self._category, from_epoch_micros(timestamp), cents, location)
+
+    def get_indexes_between(self, start=None, end=None):
+        """
+        Return the indexes of the transactions made from start up to, but not
+        including, end, in time order. Ledgers are archives without a time index,
+        so this scans the timestamps of the budget's records.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a list of ints
+        """
+        low = None if start is None else to_epoch_micros(start)
+        high = None if end is None else to_epoch_micros(end)
+        matches = []
+        for index, position in enumerate(self._positions):
+            timestamp = self._ledger.get_record(position)[0]
+            if (low is None or timestamp >= low) and (high is None or timestamp < high):
+                matches.append((timestamp, index))
+        return [index for _, index in sorted(matches)]
+
+    def get_between(self, start=None, end=None):
+        """
+        Return the transactions made from start up to, but not including, end, in
+        time order, along with the sum of their amounts in cents.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a (list of Transactions, int) tuple
+        """
+        indexes = self.get_indexes_between(start, end)
+        return [self._materialize(index) for index in indexes], self._sum_amounts(indexes)
+
+    def total_between(self, start=None, end=None):
+        """
+        Return the sum in cents of the amounts of the transactions made from start
+        up to, but not including, end.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: an int
+        """
+        return self._sum_amounts(self.get_indexes_between(start, end))
+
+    def _sum_amounts(self, indexes):
+        """
+        Return the sum in cents of the amounts at the given indexes.
+        :param indexes: a list of ints
+        :return: an int
+        """
+        return sum(self._ledger.get_record(self._positions[index])[1] for index in indexes)
+
+    def __getitem__(self, index):
+        """
+        Return the Transaction at an index, or a list of Transactions for a slice.
+        :param index: an int or a slice
+        :return: a Transaction or a list of Transactions
+        """
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transaction index out of range")
+        return self._materialize(index)
+
+    def __len__(self):
+        """
+        Return the number of transactions in the budget.
+        :return: an int
+        """
+        return len(self._positions)
+
+
+class LedgerError(Exception):
+    """
+    Exception for a file that is not a ledger, or for writing to a ledger opened as read-only.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a LedgerError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)
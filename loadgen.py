@@ -0,0 +1,380 @@
+"""
+This module holds a synthetic workload generator and a load harness that drives it
+through the FAM model, for seeing how the system behaves with many users.
+
+Every user is generated from the seed and their own number, so any process can build
+any user and the same arguments always give the same workload:
+- the user type is drawn from a configurable Angel/Troublemaker/Rebel mix, with an age
+  that suits it, and budget limits spread around typical amounts for each category
+- each user makes a number of transactions spread around the mean, some users being
+  much busier than others, and spends about a share of each limit that depends on
+  their type, so Rebels and Troublemakers cross their lock thresholds and Angels
+  mostly get warnings
+- visits to a merchant are usually a single transaction, but some are bursts of
+  several transactions in a row, and a few merchants get most of the visits
+
+The users are split into shards that are recorded on a pool of processes. Each shard
+registers its users with a FAM and records their visits through
+BankAccount.record_transactions, taking turns between users, then is dropped, so the
+memory used stays bounded by the shard size however many users are generated. The
+report gives the throughput, the latency percentiles of the record_transactions
+calls, which record one visit each, and the peak resident set size.
+Run it with:
+    python loadgen.py --users 1000 10000 100000 --transactions-per-user 100 --workers 4
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from bankaccount import BankAccount
+from fam import FAM
+from notificationqueue import NOTIFICATIONS
+
+SEED = 3522
+START = datetime(2020, 1, 1)
+USER_TYPES = ("Angel", "Troublemaker", "Rebel")
+USER_MIX = (0.4, 0.35, 0.25)
+# The ages of each user type, and the share of their budget limits they spend on average.
+AGES = {"Angel": (6, 10), "Troublemaker": (10, 14), "Rebel": (13, 17)}
+SPEND_SHARES = {"Angel": 0.7, "Troublemaker": 1.0, "Rebel": 1.15}
+# The typical limit of each budget, in dollars, for a 12 year old.
+TYPICAL_LIMITS = (60.0, 150.0, 120.0, 80.0)
+LIMIT_SIGMA = 0.5
+CATEGORY_MIX = (0.3, 0.2, 0.35, 0.15)
+# How much the number of transactions and the amounts vary between users and transactions.
+ACTIVITY_SIGMA = 1.0
+AMOUNT_SIGMA = 0.8
+TRANSACTIONS_PER_USER = 100
+BURST_PROBABILITY = 0.1
+BURST_SIZE = 20
+MERCHANTS = 1000
+MERCHANT_SKEW = 1.1
+# The mean number of seconds between visits, and the range between transactions of a burst.
+VISIT_GAP = 6 * 3600
+BURST_GAP = (5, 60)
+SHARD_SIZE = 1000
+
+
+class Workload:
+    """
+    Class that generates users and the visits they make, from a seed and the mix of
+    users and spending.
+    """
+
+    def __init__(self, transactions_per_user=TRANSACTIONS_PER_USER, user_mix=USER_MIX,
+                 category_mix=CATEGORY_MIX, burst_probability=BURST_PROBABILITY, burst_size=BURST_SIZE,
+                 merchants=MERCHANTS, merchant_skew=MERCHANT_SKEW, spend_scale=1.0, seed=SEED):
+        """
+        Initialize a Workload.
+        :param transactions_per_user: the mean number of transactions per user, as an int
+        :param user_mix: the weight of Angels, Troublemakers and Rebels, as three floats
+        :param category_mix: the weight of each budget in menu order, as four floats
+        :param burst_probability: the chance that a visit is a burst, as a float
+        :param burst_size: the most transactions in a burst, as an int
+        :param merchants: the number of merchants, as an int
+        :param merchant_skew: the Zipf exponent of merchant popularity, 0 for uniform
+        :param spend_scale: a float that multiplies the share of their limits users spend
+        :param seed: the random seed, as an int
+        """
+        if len(user_mix) != len(USER_TYPES):
+            raise ValueError(f"Expected {len(USER_TYPES)} user type weights.")
+        if len(category_mix) != len(BankAccount.BUDGET_NAMES):
+            raise ValueError(f"Expected {len(BankAccount.BUDGET_NAMES)} budget weights.")
+        self._transactions_per_user = transactions_per_user
+        self._user_weights = _cumulate(user_mix)
+        self._category_shares = [weight / sum(category_mix) for weight in category_mix]
+        self._category_weights = _cumulate(category_mix)
+        self._burst_probability = burst_probability
+        self._burst_size = max(2, burst_size)
+        self._merchants = [f"Merchant {rank}" for rank in range(1, merchants + 1)]
+        self._merchant_weights = _cumulate(rank ** -merchant_skew for rank in range(1, merchants + 1))
+        self._spend_scale = spend_scale
+        self._seed = seed
+
+    def create_user(self, number):
+        """
+        Create a user and the visits they will make.
+        :param number: the number of the user, as an int
+        :return: a (User, iterator of lists of transaction records) tuple
+        """
+        generator = random.Random(f"{self._seed}:{number}")
+        user_type = generator.choices(USER_TYPES, cum_weights=self._user_weights)[0]
+        age = generator.randint(*AGES[user_type])
+        limits = [round(typical * age / 12 * generator.lognormvariate(0, LIMIT_SIGMA), 2)
+                  for typical in TYPICAL_LIMITS]
+        balance = round(sum(limits) * generator.uniform(1.5, 3), 2)
+        user = FAM.create_user(user_type, f"User {number}", age, str(number), "Load Bank", balance, limits)
+        return user, self._iter_visits(generator, user_type, limits)
+
+    def _iter_visits(self, generator, user_type, limits):
+        """
+        Generate the visits of a user. Each visit is a list of (budget_index, amount,
+        purchase_location, timestamp) records at one merchant.
+        :param generator: the user's random.Random
+        :param user_type: a string
+        :param limits: the budget limits in dollars, as a list of floats
+        :return: an iterator of lists of tuples
+        """
+        count = max(1, round(self._transactions_per_user * _mean_one(generator, ACTIVITY_SIGMA)))
+        share = SPEND_SHARES[user_type] * self._spend_scale
+        # the mean amount that makes the user spend their share of each limit
+        means = [share * limit / max(1.0, count * category_share)
+                 for limit, category_share in zip(limits, self._category_shares)]
+        clock = START + timedelta(seconds=generator.uniform(0, VISIT_GAP))
+        while count:
+            budget_index = generator.choices(range(len(limits)), cum_weights=self._category_weights)[0]
+            merchant = generator.choices(self._merchants, cum_weights=self._merchant_weights)[0]
+            size = 1
+            if generator.random() < self._burst_probability:
+                size = min(count, generator.randint(2, self._burst_size))
+            records = []
+            for _ in range(size):
+                amount = max(0.01, round(means[budget_index] * _mean_one(generator, AMOUNT_SIGMA), 2))
+                records.append((budget_index, amount, merchant, clock))
+                clock += timedelta(seconds=generator.uniform(*BURST_GAP))
+            count -= size
+            yield records
+            clock += timedelta(seconds=generator.expovariate(1 / VISIT_GAP))
+
+
+def _cumulate(weights):
+    """
+    Return the running totals of weights, for random.choices.
+    :param weights: an iterable of numbers
+    :return: a list of floats
+    """
+    totals = []
+    running = 0.0
+    for weight in weights:
+        running += weight
+        totals.append(running)
+    return totals
+
+
+def _mean_one(generator, sigma):
+    """
+    Draw from a log-normal distribution with a mean of 1.
+    :param generator: a random.Random
+    :param sigma: the spread, as a float
+    :return: a float
+    """
+    return generator.lognormvariate(-sigma * sigma / 2, sigma)
+
+
+class LatencyHistogram:
+    """
+    Class that counts latencies in buckets that grow by GROWTH, so percentiles are
+    within 2% of the true value and histograms from several processes can be merged.
+    """
+
+    SMALLEST = 1e-7
+    GROWTH = 1.02
+
+    def __init__(self):
+        """
+        Initialize an empty LatencyHistogram.
+        """
+        self._counts = array("Q")
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """
+        Record one latency.
+        :param seconds: a float
+        """
+        index = 0 if seconds <= self.SMALLEST else int(math.log(seconds / self.SMALLEST, self.GROWTH)) + 1
+        counts = self._counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        """
+        Add the latencies recorded in another histogram to this one.
+        :param other: a LatencyHistogram
+        """
+        if len(other._counts) > len(self._counts):
+            self._counts.extend([0] * (len(other._counts) - len(self._counts)))
+        for index, count in enumerate(other._counts):
+            self._counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        """
+        Return the latency that the given fraction of the recorded latencies are at or under.
+        :param fraction: a float between 0 and 1
+        :return: the upper bound of its bucket in seconds, as a float
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        running = 0
+        for index, count in enumerate(self._counts):
+            running += count
+            if running >= rank:
+                return min(self.max, self.SMALLEST * self.GROWTH ** index)
+        return self.max
+
+
+def run_shard(workload, first, count):
+    """
+    Register a shard of users with a FAM and record all their visits, taking turns
+    between the users.
+    :param workload: a Workload
+    :param first: the number of the first user, as an int
+    :param count: the number of users, as an int
+    :return: a dict of counts, with the LatencyHistogram of the record_transactions calls
+    """
+    fam = FAM()
+    active = []
+    user_types = dict.fromkeys(USER_TYPES, 0)
+    for number in range(first, first + count):
+        user, visits = workload.create_user(number)
+        fam.add_user(user)
+        user_types[user.get_type()] += 1
+        active.append((user, visits))
+
+    histogram = LatencyHistogram()
+    clock = time.perf_counter
+    accepted = rejected = locked = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while active:
+            waiting = []
+            for user, visits in active:
+                records = next(visits, None)
+                if records is None:
+                    continue
+                started = clock()
+                report = user.bank.record_transactions(user, records)
+                histogram.observe(clock() - started)
+                accepted += len(report.accepted)
+                rejected += len(report.rejected)
+                waiting.append((user, visits))
+            active = waiting
+        NOTIFICATIONS.flush()
+    for user in fam.user_list:
+        locked += sum(budget.is_locked for budget in user.bank.budgets)
+    return {"user_types": user_types, "accepted": accepted, "rejected": rejected, "locked_budgets": locked,
+            "histogram": histogram, "peak_rss_mb": peak_rss_mb()}
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process.
+    :return: the size in megabytes as a float, or None where the resource module is missing
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def run(workload, user_count, workers=1, shard_size=SHARD_SIZE):
+    """
+    Generate and record the visits of user_count users on a pool of processes. With
+    a single worker the shards are recorded in this process.
+    :param workload: a Workload
+    :param user_count: an int
+    :param workers: the number of worker processes, as an int
+    :param shard_size: the number of users recorded together, as an int
+    :return: the report, as a dict
+    """
+    firsts = range(0, user_count, shard_size)
+    counts = [min(shard_size, user_count - first) for first in firsts]
+    started = time.perf_counter()
+    if workers == 1:
+        results = [run_shard(workload, first, count) for first, count in zip(firsts, counts)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_shard, [workload] * len(counts), firsts, counts))
+    elapsed = time.perf_counter() - started
+
+    histogram = LatencyHistogram()
+    user_types = dict.fromkeys(USER_TYPES, 0)
+    for result in results:
+        histogram.merge(result["histogram"])
+        for user_type, count in result["user_types"].items():
+            user_types[user_type] += count
+    transactions = sum(result["accepted"] + result["rejected"] for result in results)
+    worker_peaks = [result["peak_rss_mb"] for result in results if result["peak_rss_mb"] is not None]
+    return {"users": user_count, "workers": workers, "user_types": user_types,
+            "transactions": transactions,
+            "accepted": sum(result["accepted"] for result in results),
+            "rejected": sum(result["rejected"] for result in results),
+            "locked_budgets": sum(result["locked_budgets"] for result in results),
+            "seconds": elapsed, "transactions_per_second": transactions / elapsed if elapsed else 0.0,
+            # the time spent inside record_transactions, summed over the workers, without generating
+            "recording_seconds": histogram.total, "calls": histogram.count,
+            "call_latency_us": {"mean": histogram.total / histogram.count * 1e6 if histogram.count else 0.0,
+                                "p50": histogram.percentile(0.5) * 1e6, "p90": histogram.percentile(0.9) * 1e6,
+                                "p99": histogram.percentile(0.99) * 1e6, "p999": histogram.percentile(0.999) * 1e6,
+                                "max": histogram.max * 1e6},
+            "peak_rss_mb": {"main": peak_rss_mb(), "worker": max(worker_peaks, default=None)}}
+
+
+def main():
+    """
+    Parse the command line, run the load for each number of users and print the reports.
+    """
+    parser = argparse.ArgumentParser(description="Generate users and transactions and record them through FAM.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--transactions-per-user", type=int, default=TRANSACTIONS_PER_USER,
+                        help="mean number of transactions per user (default 100)")
+    parser.add_argument("--user-mix", type=float, nargs=3, default=list(USER_MIX),
+                        metavar=("ANGEL", "TROUBLEMAKER", "REBEL"), help="weight of each user type")
+    parser.add_argument("--category-mix", type=float, nargs=4, default=list(CATEGORY_MIX),
+                        help="weight of each budget, in menu order")
+    parser.add_argument("--burst-probability", type=float, default=BURST_PROBABILITY)
+    parser.add_argument("--burst-size", type=int, default=BURST_SIZE)
+    parser.add_argument("--merchants", type=int, default=MERCHANTS)
+    parser.add_argument("--merchant-skew", type=float, default=MERCHANT_SKEW,
+                        help="Zipf exponent of merchant popularity, 0 for uniform (default 1.1)")
+    parser.add_argument("--spend-scale", type=float, default=1.0,
+                        help="multiplies the share of their limits users spend (default 1.0)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="write the reports to this JSON file instead of standard output")
+    arguments = parser.parse_args()
+
+    workload = Workload(arguments.transactions_per_user, arguments.user_mix, arguments.category_mix,
+                        arguments.burst_probability, arguments.burst_size, arguments.merchants,
+                        arguments.merchant_skew, arguments.spend_scale, arguments.seed)
+    reports = []
+    for user_count in arguments.users:
+        report = run(workload, user_count, arguments.workers, arguments.shard_size)
+        reports.append(report)
+        print(f"{user_count:>9} users {report['transactions']:>12} tx {report['seconds']:>9.2f}s "
+              f"{report['transactions_per_second']:>10.0f} tx/s  p99 {report['call_latency_us']['p99']:>9.1f} us  "
+              f"peak {report['peak_rss_mb']['worker'] or report['peak_rss_mb']['main'] or 0:.0f} MB", file=sys.stderr)
+
+    output = json.dumps(reports, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
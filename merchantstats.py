@@ -0,0 +1,140 @@
+"""
+This module holds the MerchantStats class.
+"""
+
+import heapq
+
+from money import to_cents, to_dollars
+from transactionstore import to_naive_utc
+
+
+class MerchantStats:
+    """
+    Class representing the running totals of the purchases made at one location:
+    how many there were, how much was spent, and when the latest one was made.
+    """
+
+    __slots__ = ("_location", "_count", "_total_cents", "_last_seen")
+
+    def __init__(self, location):
+        """
+        Initialize MerchantStats with no purchases for a location.
+        :param location: the purchase location, as a string
+        """
+        self._location = location
+        self._count = 0
+        self._total_cents = 0
+        self._last_seen = None
+
+    @classmethod
+    def from_totals(cls, location, count, total_cents, last_seen):
+        """
+        Create MerchantStats from totals added up elsewhere, such as in a ledger or a database.
+        :param location: the purchase location, as a string
+        :param count: the number of purchases, as an int
+        :param total_cents: the total amount spent in cents, an int
+        :param last_seen: the time of the latest purchase, as a naive datetime
+        :return: a MerchantStats
+        """
+        stats = cls(location)
+        stats._count = count
+        stats._total_cents = total_cents
+        stats._last_seen = last_seen
+        return stats
+
+    @property
+    def location(self):
+        """
+        Return the purchase location.
+        :return: a string
+        """
+        return self._location
+
+    @property
+    def count(self):
+        """
+        Return the number of purchases made at the location.
+        :return: an int
+        """
+        return self._count
+
+    @property
+    def total(self):
+        """
+        Return the total amount spent at the location.
+        :return: a float
+        """
+        return to_dollars(self._total_cents)
+
+    @property
+    def total_cents(self):
+        """
+        Return the total amount spent at the location, in cents.
+        :return: an int
+        """
+        return self._total_cents
+
+    @property
+    def last_seen(self):
+        """
+        Return the time of the latest purchase made at the location.
+        :return: a naive datetime, or None if there were no purchases
+        """
+        return self._last_seen
+
+    def add(self, timestamp, cents):
+        """
+        Add a purchase to the totals. An aware timestamp is kept as naive UTC, the way
+        it is stored, so purchases with and without a time zone can be compared.
+        :param timestamp: a datetime
+        :param cents: the amount in cents, an int
+        """
+        timestamp = to_naive_utc(timestamp)
+        self._count += 1
+        self._total_cents += cents
+        if self._last_seen is None or timestamp > self._last_seen:
+            self._last_seen = timestamp
+
+    def merge(self, other):
+        """
+        Add the totals of another MerchantStats for the same location to these totals.
+        :param other: a MerchantStats
+        """
+        self._count += other.count
+        self._total_cents += other.total_cents
+        if other.last_seen is not None and (self._last_seen is None or other.last_seen > self._last_seen):
+            self._last_seen = other.last_seen
+
+    @staticmethod
+    def top(stats, n, by="total"):
+        """
+        Return the n merchants with the highest total or count, highest first.
+        :param stats: an iterable of MerchantStats
+        :param n: an int
+        :param by: "total" or "count"
+        :return: a list of MerchantStats
+        """
+        if by not in ("total", "count"):
+            raise ValueError(f"Cannot rank merchants by {by!r}.")
+        key = "total_cents" if by == "total" else by
+        return heapq.nlargest(n, stats, key=lambda merchant: getattr(merchant, key))
+
+    def __setstate__(self, state):
+        """
+        Restore pickled MerchantStats, converting the total of stats pickled before
+        amounts were kept in cents.
+        :param state: a (None, dict of slot values) tuple
+        """
+        slots = dict(state[1])
+        if "_total" in slots:
+            slots["_total_cents"] = to_cents(slots.pop("_total"))
+        for name, value in slots.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        """
+        Return the merchant totals as a string.
+        :return: a string
+        """
+        return f"MerchantStats({self.location!r}, count={self.count}, total={self.total:.2f}, " \
+               f"last_seen={self.last_seen})"
@@ -0,0 +1,54 @@
+"""
+This module holds the conversions between dollar amounts and the integer cents that
+balances, budgets and transactions are kept in.
+
+Amounts are stored as whole cents in Python ints, so adding and subtracting them is
+exact however many transactions are recorded, and columns of them fit in array("q")
+and int64 numpy arrays. Dollars only appear at the edges: amounts that are typed in,
+passed to the public methods or read from files are converted with to_cents, and
+amounts that are shown are converted with to_dollars or format_cents.
+"""
+
+import math
+
+CENTS_PER_DOLLAR = 100
+# The largest amount in cents that fits in an int64 column of amounts.
+MAX_CENTS = 2 ** 63 - 1
+# Below this many cents, dividing by 100 gives a float close enough to the exact amount
+# that formatting it with two decimals always gives the exact digits.
+_FLOAT_EXACT_CENTS = 2 ** 52
+
+
+def to_cents(amount):
+    """
+    Convert an amount in dollars to whole cents, rounded to the nearest cent.
+    :param amount: an int, a float or a string of a number
+    :return: an int
+    """
+    if type(amount) is int:
+        return amount * CENTS_PER_DOLLAR
+    cents = float(amount) * CENTS_PER_DOLLAR
+    if not math.isfinite(cents):
+        raise ValueError(f"{amount} is not an amount of money.")
+    return round(cents)
+
+
+def to_dollars(cents):
+    """
+    Convert an amount in cents to dollars.
+    :param cents: an int
+    :return: a float
+    """
+    return cents / CENTS_PER_DOLLAR
+
+
+def format_cents(cents):
+    """
+    Format an amount in cents as dollars with two decimals, such as "-4.00".
+    :param cents: an int
+    :return: a string
+    """
+    if -_FLOAT_EXACT_CENTS < cents < _FLOAT_EXACT_CENTS:
+        return f"{cents / CENTS_PER_DOLLAR:.2f}"
+    dollars, cents_left = divmod(abs(cents), CENTS_PER_DOLLAR)
+    return f"{'-' if cents < 0 else ''}{dollars}.{cents_left:02d}"
@@ -0,0 +1,258 @@
+"""
+This module holds the NotificationQueue, which renders and delivers budget notices on
+a background thread so that recording a transaction does not wait for them.
+
+When a transaction takes a budget over a threshold, the BankAccount posts a small
+Notification with the budget and the alerts it raised, and returns as soon as the
+balances are updated. A worker thread takes the notifications from a bounded queue,
+renders each notice with the budget's transactions and delivers it. Alerts raised on
+a budget whose notification is still waiting are merged into it, so a burst of
+transactions renders the budget once.
+
+Waiting for the notices is bounded: flush takes a timeout, and at exit the worker is
+given SHUTDOWN_TIMEOUT seconds to deliver what is waiting before it is stopped, so a
+delivery that hangs does not keep the program from exiting. A child process forked
+while notifications are waiting starts with an empty queue and no worker, since the
+parent delivers them.
+"""
+
+import atexit
+import os
+import sys
+import threading
+import weakref
+from collections import deque
+
+
+class Notification:
+    """
+    Class representing the alerts raised on a budget that have not been delivered yet.
+    """
+
+    def __init__(self, bank, user, budget_index, alerts):
+        """
+        Initialize a Notification for alerts raised on a budget.
+        :param bank: the BankAccount of the budget
+        :param user: the User who made the transactions
+        :param budget_index: an int
+        :param alerts: an iterable of Alerts
+        """
+        self._bank = bank
+        self._user = user
+        self._budget_index = budget_index
+        self._alerts = set(alerts)
+
+    @property
+    def bank(self):
+        """
+        Return the bank account of the budget.
+        :return: a BankAccount
+        """
+        return self._bank
+
+    @property
+    def user(self):
+        """
+        Return the user who made the transactions.
+        :return: a User
+        """
+        return self._user
+
+    @property
+    def budget_index(self):
+        """
+        Return the index of the budget.
+        :return: an int
+        """
+        return self._budget_index
+
+    @property
+    def alerts(self):
+        """
+        Return the alerts raised on the budget.
+        :return: a set of Alerts
+        """
+        return self._alerts
+
+    def add_alerts(self, user, alerts):
+        """
+        Merge alerts raised by a later transaction into this notification.
+        :param user: the User who made the transaction
+        :param alerts: an iterable of Alerts
+        """
+        self._user = user
+        self._alerts.update(alerts)
+
+    def render(self):
+        """
+        Return the text of the notice.
+        :return: a string
+        """
+        return self._bank.get_notice(self._user, self._budget_index, self._alerts)
+
+
+def print_notice(notification, notice):
+    """
+    Deliver a notice by printing it.
+    :param notification: the Notification the notice was rendered from
+    :param notice: a string
+    """
+    print(notice)
+
+
+class NotificationQueue:
+    """
+    Class that delivers Notifications in the order they were posted, on a worker
+    thread started by the first one. The queue holds at most one notification per
+    budget, and at most MAX_SIZE in total; when it is full, a notification is
+    delivered on the thread that posted it instead.
+    """
+
+    MAX_SIZE = 1000
+    # the most seconds to wait at exit for the waiting notifications to be delivered
+    SHUTDOWN_TIMEOUT = 5.0
+
+    def __init__(self, deliver=print_notice, max_size=MAX_SIZE):
+        """
+        Initialize an empty NotificationQueue.
+        :param deliver: a function called with each Notification and its notice
+        :param max_size: the most notifications waiting at once, as an int
+        """
+        self.deliver = deliver
+        self._max_size = max_size
+        self._exit_registered = False
+        self._reset()
+        _QUEUES.add(self)
+
+    def _reset(self):
+        """
+        Start with no notifications waiting and no worker thread.
+        """
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._waiting = deque()
+        self._pending = {}
+        # the notifications posted to the worker that it has not finished delivering
+        self._unfinished = 0
+        self._worker = None
+
+    def post(self, bank, user, budget_index, alerts):
+        """
+        Queue a notification for alerts raised on a budget, or merge the alerts into
+        the notification already waiting for that budget.
+        :param bank: a BankAccount
+        :param user: a User
+        :param budget_index: an int
+        :param alerts: an iterable of Alerts
+        """
+        key = (id(bank), budget_index)
+        with self._lock:
+            notification = self._pending.get(key)
+            if notification is not None:
+                notification.add_alerts(user, alerts)
+                return
+            notification = Notification(bank, user, budget_index, alerts)
+            if len(self._waiting) < self._max_size:
+                self._waiting.append((key, notification))
+                self._pending[key] = notification
+                self._unfinished += 1
+                self._start_worker()
+                self._changed.notify_all()
+                return
+        self._deliver(notification)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every notification posted so far has been delivered, or until
+        timeout seconds have passed.
+        :param timeout: a number of seconds, or None to wait for as long as it takes
+        :return: True if every notification was delivered, False if the wait timed out
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: not self._unfinished, timeout)
+
+    def close(self, timeout=SHUTDOWN_TIMEOUT):
+        """
+        Give the worker thread up to timeout seconds to deliver the waiting
+        notifications, then stop it. Notifications it has not delivered by then are
+        dropped. A later post starts a new worker.
+        :param timeout: a number of seconds, or None to wait for as long as it takes
+        """
+        self.flush(timeout)
+        with self._changed:
+            worker = self._worker
+            if worker is None:
+                return
+            self._worker = None
+            dropped = self._unfinished
+            self._waiting.clear()
+            self._pending.clear()
+            self._unfinished = 0
+            self._changed.notify_all()
+        if dropped:
+            print(f"Dropped {dropped} notification(s) that could not be delivered in time.", file=sys.stderr)
+        else:
+            worker.join(timeout)
+
+    def _start_worker(self):
+        """
+        Start the worker thread if it is not running yet. Called while holding the lock.
+        """
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="notifications", daemon=True)
+            self._worker.start()
+            if not self._exit_registered:
+                # deliver what is still waiting before the program exits
+                atexit.register(self.close)
+                self._exit_registered = True
+
+    def _run(self):
+        """
+        Deliver queued notifications until the queue is closed or the program exits.
+        """
+        worker = threading.current_thread()
+        while True:
+            with self._changed:
+                while not self._waiting and self._worker is worker:
+                    self._changed.wait()
+                if self._worker is not worker:
+                    return
+                key, notification = self._waiting.popleft()
+                del self._pending[key]
+            try:
+                self._deliver(notification)
+            finally:
+                with self._changed:
+                    # a closed queue has already dropped this notification from the count
+                    if self._worker is worker:
+                        self._unfinished -= 1
+                    self._changed.notify_all()
+
+    def _deliver(self, notification):
+        """
+        Render a notification and deliver its notice.
+        :param notification: a Notification
+        """
+        try:
+            self.deliver(notification, notification.render())
+        except Exception as e:
+            print(f"Could not deliver a notification: {e}", file=sys.stderr)
+
+
+# every NotificationQueue, so the ones copied into a forked child can be emptied
+_QUEUES = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    """
+    Empty every NotificationQueue in a forked child, which has the parent's waiting
+    notifications and worker but no worker thread running.
+    """
+    for notification_queue in list(_QUEUES):
+        notification_queue._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+NOTIFICATIONS = NotificationQueue()
@@ -3,13 +3,32 @@ This module holds the the different types of notifications and warnings.
 """
 
 from enum import Enum
-from tabulate import tabulate
+from functools import lru_cache
 
 
 class Notifications(Enum):
     """
     Enum for notifications and warning messages. Stores the message strings as constants.
     """
-    POLITE = tabulate([["Hey buddy, please be aware of your spendings :) You have exceeded the limit for this budget."]], tablefmt="fancy_grid")
-    RUDE = tabulate([["You suck at managing your finances. You have exceeded the limit for this budget."]], tablefmt="fancy_grid")
-    WARNING = tabulate([["Warning! You getting close to your budget limit"]], tablefmt="fancy_grid")
+    POLITE = "Hey buddy, please be aware of your spendings :) You have exceeded the limit for this budget."
+    RUDE = "You suck at managing your finances. You have exceeded the limit for this budget."
+    WARNING = "Warning! You getting close to your budget limit"
+
+    @property
+    def box(self):
+        """
+        Return the message drawn in a box. The box is only drawn the first time it is needed.
+        :return: a string
+        """
+        return _draw_box(self.value)
+
+
+@lru_cache(maxsize=None)
+def _draw_box(message):
+    """
+    Draw a message in a box with tabulate, which is only imported once a box is drawn.
+    :param message: a string
+    :return: a string
+    """
+    from tabulate import tabulate
+    return tabulate([[message]], tablefmt="fancy_grid")
@@ -0,0 +1,23 @@
+"""
+This module holds the helper for splitting rendered output into pages.
+"""
+
+from itertools import islice
+
+
+def paginate(rows, page_size):
+    """
+    Group rendered rows into pages of at most page_size rows. Rows are only
+    pulled from the iterable when the page that holds them is requested.
+    :param rows: an iterable of strings
+    :param page_size: the number of rows per page, as an int
+    :return: a generator of strings
+    """
+    if page_size < 1:
+        raise ValueError("Page size must be at least 1.")
+    rows = iter(rows)
+    while True:
+        page = ''.join(islice(rows, page_size))
+        if not page:
+            return
+        yield page
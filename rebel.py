@@ -9,13 +9,14 @@ class Rebel(User):
     """
     Class that represents a Rebel user type.
     """
-    def __init__(self, name, age):
+    def __init__(self, name, age, bank=None):
         """
         Initialize a User of Rebel type.
         :param name: the name of the user as a String
         :param age: the age of the Rebel User
+        :param bank: a BankAccount, or None to prompt for the bank details
         """
-        super().__init__(name, age, 50, True, 100)
+        super().__init__(name, age, 50, True, 100, bank)
 
     def can_lock_account(self):
         """
@@ -38,4 +39,4 @@ class Rebel(User):
         Return a rude notification.
         :return: rude notification as a string
         """
-        return Notifications.RUDE.value
+        return Notifications.RUDE.box
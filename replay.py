@@ -0,0 +1,138 @@
+"""
+This module holds the Replay, which runs a recorded script of FAM requests without
+prompts, for reproducing incidents and for load testing.
+
+A script has one JSON request per line, in the format FAMServer serves and writes with
+server.py --record, such as:
+    {"command": "login", "name": "Jeff", "session": 1}
+    {"command": "record_transaction", "budget": 0, "amount": 12.5, "location": "EB Games",
+     "timestamp": "2020-01-31T10:00:00", "session": 1}
+Every request goes through the same command handlers as the server, in script order
+and at full speed. The optional "session" picks which logged in session runs the
+request, so interleaved sessions replay the way they were recorded. Blank lines and
+lines starting with # are skipped. Each request waits for the budget notices it
+raised, which come back in its own response, so replaying a script always gives the
+same responses.
+Run it with:
+    python driver.py --replay script.jsonl --quiet
+"""
+
+import json
+import sys
+import time
+
+from server import FAMServer, Session
+
+MICROSECONDS = 1000000
+MILLISECONDS = 1000
+
+
+class Replay:
+    """
+    Class that runs scripted requests against a FAM and times each one.
+    """
+
+    def __init__(self, fam):
+        """
+        Initialize a Replay for a FAM.
+        :param fam: a FAM
+        """
+        self._server = FAMServer(fam, wait_for_notices=True)
+        self._sessions = {}
+        self._timings = {}
+        self._errors = {}
+        self._seconds = 0.0
+
+    def run(self, lines, output=None):
+        """
+        Run every request in a script.
+        :param lines: an iterable of request lines, as strings
+        :param output: a text file to write each response to as JSON, or None to discard them
+        """
+        clock = time.perf_counter
+        started = clock()
+        with self._server.receiving_notices():
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                command, session = self._parse(line)
+                request_started = clock()
+                response = self._server.handle_request(session, line)
+                elapsed = clock() - request_started
+
+                self._timings.setdefault(command, []).append(elapsed)
+                if not response["ok"]:
+                    self._errors[command] = self._errors.get(command, 0) + 1
+                if output is not None:
+                    output.write(json.dumps(response) + "\n")
+        self._seconds += clock() - started
+
+    def _parse(self, line):
+        """
+        Return the command of a request line and the session that runs it.
+        :param line: a string
+        :return: a (command name, Session) tuple
+        """
+        try:
+            request = json.loads(line)
+            command = str(request["command"])
+            number = int(request.get("session", 0))
+        except (ValueError, KeyError, TypeError):
+            return "invalid", self._get_session(0)
+        return command, self._get_session(number)
+
+    def _get_session(self, number):
+        """
+        Return the session with a number, starting it the first time it is used.
+        :param number: an int
+        :return: a Session
+        """
+        session = self._sessions.get(number)
+        if session is None:
+            session = self._sessions[number] = Session(number)
+        return session
+
+    def get_report(self):
+        """
+        Return the number of requests, the total time and the requests per second, with
+        the count, errors, total and latency percentiles of each command.
+        :return: a dict
+        """
+        count = sum(len(timings) for timings in self._timings.values())
+        return {"requests": count,
+                "errors": sum(self._errors.values()),
+                "seconds": self._seconds,
+                "requests_per_second": count / self._seconds if self._seconds else 0.0,
+                "commands": {command: self._summarize(command, timings)
+                             for command, timings in sorted(self._timings.items())}}
+
+    def _summarize(self, command, timings):
+        """
+        Return the statistics of the timings of one command.
+        :param command: the name of the command, as a string
+        :param timings: a list of seconds
+        :return: a dict
+        """
+        ordered = sorted(timings)
+
+        def percentile(fraction):
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * MICROSECONDS
+
+        return {"count": len(ordered), "errors": self._errors.get(command, 0),
+                "total_ms": sum(ordered) * MILLISECONDS, "mean_us": sum(ordered) / len(ordered) * MICROSECONDS,
+                "p50_us": percentile(0.5), "p99_us": percentile(0.99), "max_us": ordered[-1] * MICROSECONDS}
+
+
+def replay_file(fam, path, quiet=False):
+    """
+    Replay the script in a file, writing the responses to standard output unless quiet.
+    :param fam: a FAM
+    :param path: the path of the script, as a string
+    :param quiet: True to discard the responses
+    :return: the report, as a dict
+    """
+    replay = Replay(fam)
+    with open(path) as script:
+        replay.run(script, None if quiet else sys.stdout)
+    return replay.get_report()
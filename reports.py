@@ -0,0 +1,150 @@
+"""
+This module holds the ReportJob, which renders the bank account statement of every
+user in a family and writes each one to its own file.
+
+Rendering is spread over a pool of processes. Each account is sent to the workers as
+its transaction columns in raw bytes rather than as pickled Transactions, and the
+workers write the statements themselves so only file names are sent back.
+Run it with:
+    python reports.py --data fam_data --output statements --workers 4
+"""
+
+import argparse
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from bankaccount import BankAccount
+from budget import Budget
+from transactionstore import TransactionStore
+
+CHUNKS_PER_WORKER = 4
+
+
+def pack_account(bank):
+    """
+    Return the parts of a bank account that its statement is built from, with each
+    budget's transactions as column bytes.
+    :param bank: a BankAccount
+    :return: a tuple
+    """
+    with bank.lock:
+        budgets = []
+        for budget in bank.budgets:
+            store = budget.transactions
+            if not isinstance(store, TransactionStore):
+                store = _copy_store(budget.name, store)
+            budgets.append((budget.name, budget.limit, store.amounts.tobytes(), store.timestamps.tobytes(),
+                            store.location_codes.tobytes(), store.locations))
+        return bank.number, bank.name, bank.balance, budgets
+
+
+def _copy_store(category, transactions):
+    """
+    Copy a store of transactions of any kind into a TransactionStore.
+    :param category: the budget name, as a string
+    :param transactions: a sequence of Transactions
+    :return: a TransactionStore
+    """
+    store = TransactionStore(category)
+    for transaction in transactions:
+        store.append(transaction.timestamp, transaction.cents, transaction.purchase_location)
+    return store
+
+
+def unpack_account(packed):
+    """
+    Rebuild a bank account from the tuple made by pack_account.
+    :param packed: a tuple
+    :return: a BankAccount
+    """
+    number, name, balance, packed_budgets = packed
+    budgets = []
+    for budget_name, limit, amounts, timestamps, location_codes, locations in packed_budgets:
+        store = TransactionStore.from_columns(budget_name, array("q", amounts), array("q", timestamps),
+                                              array("I", location_codes), locations)
+        budgets.append(Budget(budget_name, limit, store))
+    return BankAccount(number, name, balance, budgets)
+
+
+def render_chunk(output_directory, chunk):
+    """
+    Render and write the statements of a chunk of accounts. Runs in a worker process.
+    :param output_directory: the directory to write the statements to, as a string
+    :param chunk: a list of (user id, packed account) tuples
+    :return: the paths of the statements written, as a list of strings
+    """
+    paths = []
+    for user_id, packed in chunk:
+        path = os.path.join(output_directory, f"statement_{user_id}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(str(unpack_account(packed)))
+        paths.append(path)
+    return paths
+
+
+class ReportJob:
+    """
+    Class that writes the bank account statement of every user, in parallel.
+    """
+
+    def __init__(self, output_directory, workers=None, chunk_size=None):
+        """
+        Initialize a ReportJob.
+        :param output_directory: the directory to write the statements to, as a string
+        :param workers: the number of worker processes, or None for one per CPU
+        :param chunk_size: the number of accounts sent to a worker at a time, or None
+        to split the users into a few chunks per worker
+        """
+        self._output_directory = output_directory
+        self._workers = workers or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+
+    def run(self, users):
+        """
+        Write a statement for each user. The statement of the user at position i in
+        users is written to statement_i.txt. With a single worker the statements are
+        rendered in this process.
+        :param users: a list of Users
+        :return: the paths of the statements written, in user order, as a list of strings
+        """
+        os.makedirs(self._output_directory, exist_ok=True)
+        accounts = [(user_id, pack_account(user.bank)) for user_id, user in enumerate(users)]
+        chunk_size = self._chunk_size or max(1, -(-len(accounts) // (self._workers * CHUNKS_PER_WORKER)))
+        chunks = [accounts[start:start + chunk_size] for start in range(0, len(accounts), chunk_size)]
+
+        if self._workers == 1:
+            results = [render_chunk(self._output_directory, chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=self._workers) as pool:
+                results = list(pool.map(render_chunk, [self._output_directory] * len(chunks), chunks))
+        return [path for paths in results for path in paths]
+
+
+def main():
+    """
+    Parse the command line, recover the users from the journal and write their statements.
+    """
+    from fam import FAM
+    from journal import Journal
+
+    parser = argparse.ArgumentParser(description="Write the bank account statement of every user.")
+    parser.add_argument("--data", default="fam_data", help="directory of the FAM journal")
+    parser.add_argument("--output", default="statements", help="directory to write the statements to")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    arguments = parser.parse_args()
+
+    journal = Journal(arguments.data)
+    try:
+        users = FAM(journal).user_list
+    finally:
+        journal.close()
+    started = time.perf_counter()
+    paths = ReportJob(arguments.output, arguments.workers, arguments.chunk_size).run(users)
+    print(f"Wrote {len(paths)} statements to {arguments.output} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,551 @@
+"""
+This module holds the FAMServer, which serves many FAM sessions at once on a single
+asyncio event loop.
+
+Clients send one JSON object per line and get one JSON object per line back. Every
+request has a "command", and every response has "ok", with "error" when ok is false:
+    {"command": "register", "type": "Rebel", "name": "Jeff", "age": 12, "bank_number": "123",
+     "bank_name": "TD", "balance": 1000, "limits": [100, 100, 100, 100]}
+    {"command": "users", "type": "Rebel", "locked": true, "page": 0, "page_size": 10}
+    {"command": "login", "user": 0}
+    {"command": "login", "name": "Jeff"}
+    {"command": "record_transaction", "budget": 0, "amount": 12.5, "location": "EB Games",
+     "timestamp": "2020-01-31T10:00:00"}
+    {"command": "view_budgets"}
+    {"command": "view_transactions", "budget": 0, "page": 0, "page_size": 10, "newest_first": true}
+    {"command": "view_account"}
+    {"command": "logout"}
+Budget notices are rendered in the background once a transaction has been recorded,
+and are returned in the "messages" of the next response to a session of that user.
+Only the latest MAX_NOTICES are kept for a user, and they are dropped once no session
+is logged in as that user.
+Requests run on worker threads, as do the storage flushes, so journal writes, fsyncs,
+snapshots and large renders for one session do not hold up the event loop and the
+other sessions. Requests that change or read the user list run one at a time.
+With --record, every request is also written to a file with the number of its session,
+so the traffic can be replayed later with python driver.py --replay. Sessions are
+numbered after the ones already in the file, so a file recorded over several runs
+replays each connection in its own session.
+Run it with:
+    python server.py --port 8765
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+
+import instrumentation
+from bankaccount import InvalidBalanceError
+from fam import FAM
+from journal import Journal
+from notificationqueue import NOTIFICATIONS
+from userregistry import UserNotFoundError
+
+
+class FAMServer:
+    """
+    Class that serves FAM sessions over TCP or a Unix socket. All sessions share one
+    FAM user list, and each connection has its own logged in user.
+    """
+
+    FLUSH_INTERVAL = 0.05
+    MAX_NOTICES = 10
+
+    def __init__(self, fam, record=None, session_count=0, wait_for_notices=False):
+        """
+        Initialize a FAMServer for a FAM.
+        :param fam: a FAM
+        :param record: a text file to write every request to, or None
+        :param session_count: the number of sessions already in the record file, as an int
+        :param wait_for_notices: True to wait for the notices raised by a request and
+        return them in its own response, so the responses do not depend on timing
+        """
+        self._fam = fam
+        self._record = record
+        self._session_count = session_count
+        self._wait_for_notices = wait_for_notices
+        self._commands = {
+            "register": self._register,
+            "users": self._list_users,
+            "login": self._login,
+            "record_transaction": self._record_transaction,
+            "view_budgets": self._view_budgets,
+            "view_transactions": self._view_transactions,
+            "view_account": self._view_account,
+            "logout": self._logout,
+        }
+        self._notices = {}
+        self._session_counts = {}
+        self._notices_lock = threading.Lock()
+        self._users_lock = threading.Lock()
+        self._record_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def receiving_notices(self):
+        """
+        Deliver budget notices to the sessions of this server until the block ends, then
+        give them back to the deliver function that was used before.
+        """
+        previous = NOTIFICATIONS.deliver
+        NOTIFICATIONS.deliver = self.deliver_notice
+        try:
+            yield
+        finally:
+            NOTIFICATIONS.flush()
+            NOTIFICATIONS.deliver = previous
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """
+        Accept connections until the server is cancelled, flushing the FAM storage in
+        the background so group commits do not wait on idle sessions.
+        :param host: the address to listen on, as a string
+        :param port: the TCP port to listen on, as an int
+        :param path: the path of a Unix socket to listen on instead of TCP, or None
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_session, path=path)
+        else:
+            server = await asyncio.start_server(self.handle_session, host, port)
+        flusher = asyncio.create_task(self._flush_periodically())
+        try:
+            with self.receiving_notices():
+                async with server:
+                    await server.serve_forever()
+        finally:
+            flusher.cancel()
+            self._fam.flush_storage()
+
+    async def _flush_periodically(self):
+        """
+        Flush the FAM storage every FLUSH_INTERVAL seconds, on a worker thread so the
+        fsync does not hold up the event loop.
+        """
+        while True:
+            await asyncio.sleep(FAMServer.FLUSH_INTERVAL)
+            await asyncio.to_thread(self._fam.flush_storage)
+
+    async def handle_session(self, reader, writer):
+        """
+        Answer the requests of one connection until it is closed.
+        :param reader: an asyncio.StreamReader
+        :param writer: an asyncio.StreamWriter
+        """
+        self._session_count += 1
+        session = Session(self._session_count)
+        try:
+            while True:
+                try:
+                    line = await self._read_line(reader)
+                except RequestTooLongError as e:
+                    response = {"ok": False, "error": str(e)}
+                else:
+                    if not line:
+                        break
+                    try:
+                        response = await asyncio.to_thread(self.handle_request, session, line)
+                    except Exception as e:
+                        print(f"Could not answer a request: {e!r}", file=sys.stderr)
+                        response = {"ok": False, "error": "The request could not be completed."}
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._switch_user(session.user, None)
+            writer.close()
+
+    @staticmethod
+    async def _read_line(reader):
+        """
+        Read the next request line. A line longer than the reader's limit is read to
+        its end and dropped, so the next request starts on the line after it.
+        :param reader: an asyncio.StreamReader
+        :return: the line as bytes, or empty bytes when the connection was closed
+        """
+        too_long = False
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                # the connection was closed, possibly in the middle of a line
+                return b"" if too_long else e.partial
+            except asyncio.LimitOverrunError as e:
+                too_long = True
+                await reader.readexactly(e.consumed)
+                continue
+            if too_long:
+                raise RequestTooLongError("The request line is too long.")
+            return line
+
+    def handle_request(self, session, line):
+        """
+        Run a single request line and build its response. Anything the FAM prints while
+        running the request, such as budget warnings, is returned in "messages". Requests
+        of different sessions can run at the same time on different threads.
+        :param session: the Session of the connection
+        :param line: the request, as JSON bytes
+        :return: a dict
+        """
+        try:
+            request = json.loads(line)
+            command = self._commands[request["command"]]
+        except (ValueError, KeyError, TypeError):
+            return {"ok": False, "error": "Invalid request."}
+        if self._record is not None:
+            self._record_request(session, request)
+
+        user = session.user
+        try:
+            with capture_output() as output:
+                response = command(session, request)
+        except (InvalidBalanceError, SessionError, UserNotFoundError, ValueError, TypeError, KeyError,
+                IndexError) as e:
+            response = {"ok": False, "error": str(e)}
+        finally:
+            if session.user is not user:
+                self._switch_user(user, session.user)
+        if self._wait_for_notices:
+            NOTIFICATIONS.flush()
+        messages = "\n".join([output.getvalue().strip()] + self._take_notices(session.user)).strip()
+        if messages:
+            response["messages"] = messages
+        return response
+
+    def _record_request(self, session, request):
+        """
+        Write a request to the record file with the number of its session. Transactions
+        without a timestamp get the current time first, so a replay records them at the
+        same time.
+        :param session: the Session of the connection
+        :param request: a dict
+        """
+        if request["command"] == "record_transaction" and not request.get("timestamp"):
+            request["timestamp"] = datetime.now().isoformat()
+        line = json.dumps(dict(request, session=session.number)) + "\n"
+        with self._record_lock:
+            self._record.write(line)
+
+    def deliver_notice(self, notification, notice):
+        """
+        Keep a budget notice until the next response to a session of its user, or drop
+        it if no session is logged in as that user. Called by the notification worker.
+        :param notification: a Notification
+        :param notice: a string
+        """
+        with self._notices_lock:
+            if notification.user not in self._session_counts:
+                return
+            notices = self._notices.get(notification.user)
+            if notices is None:
+                notices = self._notices[notification.user] = deque(maxlen=FAMServer.MAX_NOTICES)
+            notices.append(notice)
+
+    def _switch_user(self, old_user, new_user):
+        """
+        Count a session that was logged in as old_user as logged in as new_user, and
+        drop the notices of old_user if it was their last session.
+        :param old_user: a User, or None
+        :param new_user: a User, or None
+        """
+        with self._notices_lock:
+            if old_user is not None:
+                count = self._session_counts[old_user] - 1
+                if count:
+                    self._session_counts[old_user] = count
+                else:
+                    del self._session_counts[old_user]
+                    self._notices.pop(old_user, None)
+            if new_user is not None:
+                self._session_counts[new_user] = self._session_counts.get(new_user, 0) + 1
+
+    def _take_notices(self, user):
+        """
+        Remove and return the notices waiting for a user.
+        :param user: a User, or None
+        :return: a list of strings
+        """
+        if user is None:
+            return []
+        with self._notices_lock:
+            return list(self._notices.pop(user, ()))
+
+    def _register(self, session, request):
+        """
+        Register a new user and log them in.
+        """
+        user = FAM.create_user(request["type"], request["name"], request["age"], request["bank_number"],
+                               request["bank_name"], request["balance"], request["limits"])
+        with self._users_lock:
+            session.user_id = self._fam.add_user(user)
+        session.user = user
+        return {"ok": True, "user": session.user_id}
+
+    def _list_users(self, session, request):
+        """
+        List one page of the registered users with their ids, optionally only those of
+        one type, with one name, or whose account is or is not locked.
+        """
+        page, page_size = FAMServer._get_paging(request)
+        with self._users_lock:
+            page = self._fam.users.get_page(page, page_size, request.get("type"), request.get("name"),
+                                            request.get("locked"))
+        return {"ok": True, "users": [{"user": user_id, "name": user.name, "type": user.get_type()}
+                                      for user_id, user in page]}
+
+    def _login(self, session, request):
+        """
+        Log in as an existing user, chosen by id or by a name no other user has.
+        """
+        with self._users_lock:
+            if "user" in request:
+                user_id = int(request["user"])
+                user = self._fam.get_user(user_id)
+            else:
+                users = self._fam.users.find_by_name(request["name"])
+                if len(users) != 1:
+                    raise SessionError(f"{len(users)} users are named {request['name']}. Please log in by id.")
+                user = users[0]
+                user_id = self._fam.users.get_id(user)
+        if user.can_lock_account():
+            raise SessionError("Your account is locked.")
+        session.user_id = user_id
+        session.user = user
+        return {"ok": True, "user": session.user_id, "name": user.name}
+
+    def _record_transaction(self, session, request):
+        """
+        Record a transaction for the logged in user.
+        """
+        user = session.get_active_user()
+        timestamp = request.get("timestamp")
+        timestamp = datetime.fromisoformat(timestamp) if timestamp else None
+        report = user.bank.record_transactions(
+            user, [(int(request["budget"]), request["amount"], str(request["location"]), timestamp)])
+        if report.rejected:
+            return {"ok": False, "error": str(report.rejected[0][1])}
+        return {"ok": True, "balance": user.bank.balance}
+
+    def _view_budgets(self, session, request):
+        """
+        Return the status of each of the logged in user's budgets.
+        """
+        user = session.get_active_user()
+        return {"ok": True, "budgets": [{"name": budget.name, "locked": budget.is_locked, "limit": budget.limit,
+                                         "spent": budget.amount_spent, "left": budget.amount_left}
+                                        for budget in user.bank.budgets]}
+
+    def _view_transactions(self, session, request):
+        """
+        Return one page of the rendered transactions of one of the logged in user's budgets.
+        """
+        user = session.get_active_user()
+        budget_index = int(request["budget"])
+        if budget_index < 0:
+            raise IndexError("list index out of range")
+        budget = user.bank.budgets[budget_index]
+        page, page_size = FAMServer._get_paging(request)
+        return {"ok": True, "transactions": budget.get_transactions_page(page, page_size,
+                                                                         bool(request.get("newest_first", False)))}
+
+    @staticmethod
+    def _get_paging(request):
+        """
+        Return the page number and page size of a request, refusing negative pages and
+        empty pages.
+        :param request: a dict
+        :return: a (page, page_size) tuple of ints
+        """
+        page = int(request.get("page", 0))
+        page_size = int(request.get("page_size", FAM.PAGE_SIZE))
+        if page < 0:
+            raise ValueError("The page cannot be negative.")
+        if page_size < 1:
+            raise ValueError("The page size must be at least 1.")
+        return page, page_size
+
+    def _view_account(self, session, request):
+        """
+        Return the rendered bank account details of the logged in user.
+        """
+        user = session.get_active_user()
+        return {"ok": True, "account": str(user.bank)}
+
+    def _logout(self, session, request):
+        """
+        Log the session out.
+        """
+        session.user_id = None
+        session.user = None
+        return {"ok": True}
+
+
+class Session:
+    """
+    Class representing one client connection and the user logged in on it.
+    """
+
+    def __init__(self, number=0):
+        """
+        Initialize a Session with no user logged in.
+        :param number: the number of the session, as an int
+        """
+        self.number = number
+        self.user_id = None
+        self.user = None
+
+    def get_active_user(self):
+        """
+        Return the logged in user, refusing users whose account has been locked.
+        :return: a User
+        """
+        if self.user is None:
+            raise SessionError("Please log in first.")
+        if self.user.can_lock_account():
+            raise SessionError("Your account is locked. We have logged you out")
+        return self.user
+
+
+class ThreadOutput:
+    """
+    Class that stands in for sys.stdout and sends what a thread prints while it runs
+    a request to that request's own buffer, so requests running at the same time on
+    different threads do not capture each other's output. Other threads print to the
+    original stdout.
+    """
+
+    def __init__(self, stdout):
+        """
+        Initialize a ThreadOutput in front of a stdout.
+        :param stdout: a text file
+        """
+        self._stdout = stdout
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def capture(self):
+        """
+        Capture what the current thread prints until the block ends.
+        :return: an io.StringIO
+        """
+        previous = getattr(self._local, "buffer", None)
+        self._local.buffer = output = io.StringIO()
+        try:
+            yield output
+        finally:
+            self._local.buffer = previous
+
+    def write(self, text):
+        """
+        Write text to the current thread's buffer, or to the original stdout.
+        :param text: a string
+        :return: the number of characters written, as an int
+        """
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self._stdout).write(text)
+
+    def __getattr__(self, name):
+        """
+        Pass anything else, such as flush, on to the original stdout.
+        """
+        return getattr(self._stdout, name)
+
+
+_OUTPUT_LOCK = threading.Lock()
+
+
+def capture_output():
+    """
+    Capture what the current thread prints, putting a ThreadOutput in front of
+    sys.stdout the first time it is used.
+    :return: a context manager that gives an io.StringIO
+    """
+    with _OUTPUT_LOCK:
+        if not isinstance(sys.stdout, ThreadOutput):
+            sys.stdout = ThreadOutput(sys.stdout)
+        return sys.stdout.capture()
+
+
+class RequestTooLongError(Exception):
+    """
+    Exception for a request line longer than the server reads at once.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a RequestTooLongError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)
+
+
+class SessionError(Exception):
+    """
+    Exception for a request that needs a logged in user when there is none, or whose user is locked out.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a SessionError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)
+
+
+def count_recorded_sessions(path):
+    """
+    Return the highest session number in a record file.
+    :param path: the path of the record file, as a string
+    :return: an int, 0 when the file does not exist or has no sessions
+    """
+    highest = 0
+    try:
+        with open(path) as record:
+            for line in record:
+                try:
+                    highest = max(highest, int(json.loads(line).get("session", 0)))
+                except (ValueError, TypeError, AttributeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return highest
+
+
+def main():
+    """
+    Parse the command line and run the server until it is interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Serve FAM sessions over TCP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--data", default="fam_data", help="directory of the FAM journal")
+    parser.add_argument("--metrics", help="write metrics to this file on exit (.json or Prometheus text)")
+    parser.add_argument("--record", help="append every request to this file, to replay with driver.py --replay")
+    arguments = parser.parse_args()
+
+    if arguments.metrics:
+        instrumentation.enable()
+    journal = Journal(arguments.data)
+    session_count = count_recorded_sessions(arguments.record) if arguments.record else 0
+    record = open(arguments.record, "a", buffering=1) if arguments.record else None
+    server = FAMServer(FAM(journal), record, session_count)
+    try:
+        asyncio.run(server.serve(arguments.host, arguments.port, arguments.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        journal.close()
+        if record is not None:
+            record.close()
+        if arguments.metrics:
+            instrumentation.METRICS.write(arguments.metrics)
+
+
+if __name__ == '__main__':
+    main()
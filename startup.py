@@ -0,0 +1,92 @@
+"""
+This module holds the import-time measurement for the cold start of the FAM program.
+
+It imports a module in fresh interpreters with python -X importtime, and reports the
+median time to import it along with the slowest modules it pulls in. It also checks
+that the rendering and optional dependencies, which are only needed once something is
+rendered or a ledger or database is opened, are not imported at startup.
+Run it with:
+    python startup.py --runs 10 --max-ms 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULE = "driver"
+RUNS = 10
+TOP = 10
+# Modules that must only be imported when they are first used.
+LAZY_MODULES = ("tabulate", "numpy", "inspect", "instrumentation")
+
+
+def measure_once(module):
+    """
+    Import a module in a fresh interpreter and read the import times it reports.
+    :param module: the name of the module, as a string
+    :return: a dict of module name to cumulative import time in microseconds
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # lines look like "import time:       self |  cumulative | [indent]name"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure(module=MODULE, runs=RUNS):
+    """
+    Import a module in fresh interpreters several times.
+    :param module: the name of the module, as a string
+    :param runs: the number of interpreters to start, as an int
+    :return: the results, as a dict
+    """
+    samples = [measure_once(module) for _ in range(runs)]
+    imported = set().union(*samples)
+    medians = {name: statistics.median(sample.get(name, 0) for sample in samples) for name in imported}
+    slowest = sorted((name for name in imported if name != module), key=medians.get, reverse=True)[:TOP]
+    return {"module": module, "runs": runs, "median_ms": medians[module] / 1000,
+            "slowest": [{"module": name, "median_ms": medians[name] / 1000} for name in slowest],
+            "eager": sorted(name for name in LAZY_MODULES if name in imported)}
+
+
+def main():
+    """
+    Parse the command line, measure the import time and check it against the limits.
+    """
+    parser = argparse.ArgumentParser(description="Measure how long the FAM program takes to import.")
+    parser.add_argument("--module", default=MODULE)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--max-ms", type=float, help="fail if the median import time is higher than this")
+    parser.add_argument("--output", help="write the results to this JSON file instead of standard output")
+    arguments = parser.parse_args()
+
+    results = measure(arguments.module, arguments.runs)
+    output = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+    failed = False
+    if results["eager"]:
+        print(f"Imported at startup: {', '.join(results['eager'])}", file=sys.stderr)
+        failed = True
+    if arguments.max_ms is not None and results["median_ms"] > arguments.max_ms:
+        print(f"Import took {results['median_ms']:.1f} ms, over the limit of {arguments.max_ms:.1f} ms",
+              file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
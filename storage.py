@@ -0,0 +1,529 @@
+"""
+This module holds the storage layer behind the FAM: the Storage base class, and the
+SQLiteStorage implementation with its connection pool and transaction store.
+"""
+
+import abc
+import sqlite3
+import threading
+from abc import ABC
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+from bankaccount import BankAccount
+from budget import Budget
+from fam import FAM
+from money import to_dollars
+from notificationqueue import NOTIFICATIONS
+from transaction import Transaction
+from transactionstore import to_epoch_micros, from_epoch_micros
+
+
+class Storage(ABC):
+    """
+    The Storage class is the blueprint for keeping the FAM users and their bank
+    accounts somewhere that outlives the program.
+    """
+
+    @abc.abstractmethod
+    def recover(self):
+        """
+        Load the stored users and start storing their changes. A user's id is their
+        position in the list.
+        :return: a list of Users
+        """
+        pass
+
+    @abc.abstractmethod
+    def log_registration(self, user_id, user):
+        """
+        Store a newly registered user and start storing their changes.
+        :param user_id: the id of the user, as an int
+        :param user: a User
+        """
+        pass
+
+    @abc.abstractmethod
+    def flush(self):
+        """
+        Write any changes that are waiting to be stored.
+        """
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        """
+        Write any waiting changes and release the storage.
+        """
+        pass
+
+
+class ConnectionPool:
+    """
+    Class that keeps a fixed number of open SQLite connections to one database file
+    and lends them out, so readers can share connections instead of opening new ones.
+    """
+
+    def __init__(self, path, size=4):
+        """
+        Initialize a ConnectionPool with size open connections.
+        :param path: the path of the database file, as a string
+        :param size: the number of connections, as an int
+        """
+        self._idle = [ConnectionPool.connect(path) for _ in range(size)]
+        self._available = threading.Condition()
+        self._closed = False
+
+    @staticmethod
+    def connect(path):
+        """
+        Open a connection that can be used from any thread, with write-ahead logging
+        so readers are not blocked by the writer.
+        :param path: the path of the database file, as a string
+        :return: a sqlite3.Connection
+        """
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the length of a with statement, waiting for one to be
+        returned if they are all in use.
+        :return: a sqlite3.Connection
+        """
+        with self._available:
+            while not self._idle and not self._closed:
+                self._available.wait()
+            if self._closed:
+                raise StorageError("The storage has been closed.")
+            connection = self._idle.pop()
+        try:
+            yield connection
+        finally:
+            with self._available:
+                if self._closed:
+                    # the pool was closed while the connection was lent out
+                    connection.close()
+                else:
+                    self._idle.append(connection)
+                    self._available.notify()
+
+    def close(self):
+        """
+        Close every connection in the pool. Connections that are lent out are closed
+        when they are returned, and borrowing a connection afterwards raises a
+        StorageError instead of waiting.
+        """
+        with self._available:
+            self._closed = True
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+            self._available.notify_all()
+
+
+class SQLiteStorage(Storage):
+    """
+    Class that stores users, bank accounts, budgets and transactions in a SQLite
+    database file. Budgets read their transactions from the database on demand, so
+    transaction history is not kept in memory. Balances, limits and amounts are
+    stored as INTEGER cents, so the database adds them up exactly.
+
+    New transactions are buffered and inserted with executemany in a single database
+    transaction once batch_size of them are waiting, or when the storage is flushed.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS accounts (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id),
+            number TEXT NOT NULL,
+            name TEXT NOT NULL,
+            opening_cents INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS budgets (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            budget_index INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            limit_cents INTEGER NOT NULL,
+            is_locked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, budget_index)
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            budget_index INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            cents INTEGER NOT NULL,
+            location TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS transactions_by_budget_time
+            ON transactions (user_id, budget_index, timestamp, cents);
+        CREATE INDEX IF NOT EXISTS transactions_by_budget_order
+            ON transactions (user_id, budget_index, id);
+    """
+
+    def __init__(self, path, batch_size=1000, pool_size=4):
+        """
+        Initialize a SQLiteStorage for the database file at path, creating the
+        tables if they do not exist.
+        :param path: the path of the database file, as a string
+        :param batch_size: the number of transactions inserted at a time, as an int
+        :param pool_size: the number of connections shared by readers, as an int
+        """
+        self._writer = ConnectionPool.connect(path)
+        self._writer.executescript(SQLiteStorage.SCHEMA)
+        self._pool = ConnectionPool(path, pool_size)
+        self._batch_size = batch_size
+        self._pending = []
+        self._lock = threading.RLock()
+
+    @property
+    def pool(self):
+        """
+        Return the connection pool shared by readers.
+        :return: a ConnectionPool
+        """
+        return self._pool
+
+    def recover(self):
+        """
+        Load every user with their bank account and budgets. Budget transactions
+        stay in the database and are read when they are needed, and the merchant
+        totals of each budget are added up by the database.
+        :return: a list of Users
+        """
+        spent_by_user = dict(self.query("SELECT user_id, SUM(cents) FROM transactions GROUP BY user_id"))
+        counts = {(user_id, budget_index): count for user_id, budget_index, count in self.query(
+            "SELECT user_id, budget_index, COUNT(*) FROM transactions GROUP BY user_id, budget_index")}
+        merchant_totals = {}
+        for user_id, budget_index, location, count, cents, latest in self.query(
+                "SELECT user_id, budget_index, location, COUNT(*), SUM(cents), MAX(timestamp) "
+                "FROM transactions GROUP BY user_id, budget_index, location"):
+            merchant_totals.setdefault((user_id, budget_index), {})[location] = (count, cents, latest)
+        budget_rows = {}
+        for user_id, budget_index, budget_name, limit_cents, is_locked in self.query(
+                "SELECT user_id, budget_index, name, limit_cents, is_locked FROM budgets "
+                "ORDER BY user_id, budget_index"):
+            budget_rows.setdefault(user_id, []).append((budget_index, budget_name, limit_cents, is_locked))
+
+        users = []
+        for user_id, user_type, name, age, number, bank_name, opening_cents in self.query(
+                "SELECT u.id, u.type, u.name, u.age, a.number, a.name, a.opening_cents "
+                "FROM users u JOIN accounts a ON a.user_id = u.id ORDER BY u.id"):
+            budgets = []
+            for budget_index, budget_name, limit_cents, is_locked in budget_rows.get(user_id, []):
+                store = SQLiteTransactionStore(self, user_id, budget_index, budget_name,
+                                               counts.get((user_id, budget_index), 0))
+                budget = Budget(budget_name, to_dollars(limit_cents), store)
+                budget.is_locked = bool(is_locked)
+                budget.load_merchant_totals(merchant_totals.get((user_id, budget_index), {}))
+                budgets.append(budget)
+
+            balance = to_dollars(opening_cents - spent_by_user.get(user_id, 0))
+            user = FAM.USER_TYPES[user_type](name, age, BankAccount(number, bank_name, balance, budgets))
+            user.locked_budgets = sum(budget.is_locked for budget in budgets)
+            user.bank.add_listener(SQLiteAccountListener(self, user_id))
+            users.append(user)
+        return users
+
+    def log_registration(self, user_id, user):
+        """
+        Insert a newly registered user, move their budgets onto database-backed
+        transaction stores and start storing their budget locks.
+        :param user_id: the id of the user, as an int
+        :param user: a User
+        """
+        bank = user.bank
+        with self._lock, self._writer:
+            self.flush()
+            self._writer.execute("INSERT INTO users (id, type, name, age) VALUES (?, ?, ?, ?)",
+                                 (user_id, user.get_type(), user.name, user.age))
+            self._writer.execute("INSERT INTO accounts (user_id, number, name, opening_cents) VALUES (?, ?, ?, ?)",
+                                 (user_id, bank.number, bank.name, bank.balance_cents + sum(
+                                     budget.spent_cents for budget in bank.budgets)))
+            self._writer.executemany(
+                "INSERT INTO budgets (user_id, budget_index, name, limit_cents, is_locked) VALUES (?, ?, ?, ?, ?)",
+                [(user_id, index, budget.name, budget.limit_cents, int(budget.is_locked))
+                 for index, budget in enumerate(bank.budgets)])
+
+        for index, budget in enumerate(bank.budgets):
+            budget.replace_store(SQLiteTransactionStore(self, user_id, index, budget.name))
+        bank.add_listener(SQLiteAccountListener(self, user_id))
+
+    def add_transaction(self, user_id, budget_index, timestamp, cents, purchase_location):
+        """
+        Buffer a transaction to be inserted, inserting the buffer if it is full.
+        :param user_id: an int
+        :param budget_index: an int
+        :param timestamp: epoch microseconds, as an int
+        :param cents: the amount in cents, an int
+        :param purchase_location: a string
+        """
+        with self._lock:
+            self._pending.append((user_id, budget_index, timestamp, cents, purchase_location))
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def lock_budget(self, user_id, budget_index):
+        """
+        Store that a budget has been locked.
+        :param user_id: an int
+        :param budget_index: an int
+        """
+        with self._lock, self._writer:
+            self.flush()
+            self._writer.execute("UPDATE budgets SET is_locked = 1 WHERE user_id = ? AND budget_index = ?",
+                                 (user_id, budget_index))
+
+    def flush(self):
+        """
+        Insert every buffered transaction in a single database transaction.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            with self._writer:
+                self._writer.executemany(
+                    "INSERT INTO transactions (user_id, budget_index, timestamp, cents, location) "
+                    "VALUES (?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+
+    def query(self, sql, parameters=()):
+        """
+        Run a read query on a pooled connection, after inserting any buffered
+        transactions so the results include them.
+        :param sql: a string
+        :param parameters: a tuple
+        :return: a list of rows
+        """
+        self.flush()
+        with self._pool.connection() as connection:
+            return connection.execute(sql, parameters).fetchall()
+
+    def get_balance(self, user_id):
+        """
+        Return the current balance of a user's bank account.
+        :param user_id: an int
+        :return: a float
+        """
+        rows = self.query("SELECT a.opening_cents - IFNULL((SELECT SUM(cents) FROM transactions t "
+                          "WHERE t.user_id = a.user_id), 0) FROM accounts a WHERE a.user_id = ?", (user_id,))
+        if not rows:
+            return None
+        return to_dollars(rows[0][0])
+
+    def close(self):
+        """
+        Deliver the notices still waiting, since they read their budgets from the
+        database, then insert any buffered transactions and close every connection.
+        """
+        NOTIFICATIONS.flush()
+        with self._lock:
+            self.flush()
+            self._writer.close()
+        self._pool.close()
+
+
+class SQLiteTransactionStore(Sequence):
+    """
+    Class that gives a Budget access to its transactions in a SQLiteStorage, in place
+    of a TransactionStore. Transactions are read from the database when they are needed.
+    """
+
+    def __init__(self, storage, user_id, budget_index, category, count=0):
+        """
+        Initialize a SQLiteTransactionStore for one budget of one user.
+        :param storage: a SQLiteStorage
+        :param user_id: an int
+        :param budget_index: an int
+        :param category: the budget name, as a string
+        :param count: the number of transactions already stored for the budget, as an int
+        """
+        self._storage = storage
+        self._user_id = user_id
+        self._budget_index = budget_index
+        self._category = category
+        self._count = count
+
+    @property
+    def category(self):
+        """
+        Return the budget category that the transactions belong to.
+        :return: a string
+        """
+        return self._category
+
+    def append(self, timestamp, amount, purchase_location):
+        """
+        Add a transaction to the end of the store.
+        :param timestamp: a datetime
+        :param amount: the amount in cents, an int
+        :param purchase_location: a string
+        :return: the index of the new transaction, as an int
+        """
+        self._storage.add_transaction(self._user_id, self._budget_index, to_epoch_micros(timestamp),
+                                      amount, purchase_location)
+        self._count += 1
+        return self._count - 1
+
+    def total(self):
+        """
+        Return the sum in cents of all the amounts in the budget.
+        :return: an int
+        """
+        return self.total_between()
+
+    def _select(self, where, parameters, order, limit=-1, offset=0):
+        """
+        Return the transactions of this budget that match a condition as Transactions.
+        :param where: extra SQL conditions, as a string
+        :param parameters: the values for the extra conditions, as a tuple
+        :param order: the SQL ordering, as a string
+        :param limit: the maximum number of rows, as an int, or -1 for no limit
+        :param offset: the number of rows to skip, as an int
+        :return: a list of Transactions
+        """
+        rows = self._storage.query(
+            f"SELECT timestamp, cents, location FROM transactions WHERE user_id = ? AND budget_index = ? "
+            f"{where} ORDER BY {order} LIMIT ? OFFSET ?",
+            (self._user_id, self._budget_index) + parameters + (limit, offset))
+        return [Transaction(self._category, from_epoch_micros(timestamp), cents, location)
+                for timestamp, cents, location in rows]
+
+    @staticmethod
+    def _time_range(start, end):
+        """
+        Build the SQL conditions and values for a time range.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a (string, tuple) tuple
+        """
+        where = ""
+        parameters = ()
+        if start is not None:
+            where += " AND timestamp >= ?"
+            parameters += (to_epoch_micros(start),)
+        if end is not None:
+            where += " AND timestamp < ?"
+            parameters += (to_epoch_micros(end),)
+        return where, parameters
+
+    def get_between(self, start=None, end=None):
+        """
+        Return the transactions made from start up to, but not including, end, in
+        time order, along with the sum of their amounts in cents.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a (list of Transactions, int) tuple
+        """
+        where, parameters = SQLiteTransactionStore._time_range(start, end)
+        transactions = self._select(where, parameters, "timestamp, id")
+        return transactions, sum(transaction.cents for transaction in transactions)
+
+    def total_between(self, start=None, end=None):
+        """
+        Return the sum in cents of the amounts of the transactions made from start
+        up to, but not including, end.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: an int
+        """
+        where, parameters = SQLiteTransactionStore._time_range(start, end)
+        rows = self._storage.query(
+            f"SELECT IFNULL(SUM(cents), 0) FROM transactions WHERE user_id = ? AND budget_index = ?{where}",
+            (self._user_id, self._budget_index) + parameters)
+        return rows[0][0]
+
+    def __getitem__(self, index):
+        """
+        Return the Transaction at an index, or a list of Transactions for a slice.
+        :param index: an int or a slice
+        :return: a Transaction or a list of Transactions
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._select("", (), "id", max(0, stop - start), start)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transaction index out of range")
+        return self._select("", (), "id", 1, index)[0]
+
+    def __iter__(self):
+        """
+        Iterate over the transactions in the order they were recorded, reading them
+        from the database a page at a time.
+        :return: an iterator of Transactions
+        """
+        page_size = 1000
+        last_id = 0
+        while True:
+            rows = self._storage.query(
+                "SELECT id, timestamp, cents, location FROM transactions "
+                "WHERE user_id = ? AND budget_index = ? AND id > ? ORDER BY id LIMIT ?",
+                (self._user_id, self._budget_index, last_id, page_size))
+            for last_id, timestamp, cents, location in rows:
+                yield Transaction(self._category, from_epoch_micros(timestamp), cents, location)
+            if len(rows) < page_size:
+                return
+
+    def __len__(self):
+        """
+        Return the number of transactions in the budget.
+        :return: an int
+        """
+        return self._count
+
+
+class SQLiteAccountListener:
+    """
+    Class that listens to a single user's bank account and stores its budget locks.
+    Transactions are stored by the budgets' SQLiteTransactionStores.
+    """
+
+    def __init__(self, storage, user_id):
+        """
+        Initialize a SQLiteAccountListener for a user.
+        :param storage: a SQLiteStorage
+        :param user_id: an int
+        """
+        self._storage = storage
+        self._user_id = user_id
+
+    def on_transaction(self, user, budget_index, transaction):
+        """
+        Do nothing, since the budget's store has already saved the transaction.
+        """
+        pass
+
+    def on_budget_locked(self, user, budget_index):
+        """
+        Store a locked budget.
+        :param user: a User
+        :param budget_index: an int
+        """
+        self._storage.lock_budget(self._user_id, budget_index)
+
+
+class StorageError(Exception):
+    """
+    Exception for when the storage is used after it has been closed.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a StorageError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)
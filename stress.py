@@ -0,0 +1,142 @@
+"""
+This module holds a stress test for recording transactions from many threads at once.
+
+It records the same workload with thread pools of different sizes, checks that no
+update was lost and no budget was locked twice, and prints the throughput of each run.
+Run it with:
+    python stress.py --accounts 200 --transactions 200000 --workers 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bankaccount import BankAccount
+from money import to_cents
+from notificationqueue import NOTIFICATIONS
+from rebel import Rebel
+
+OPENING_BALANCE = 10 ** 9
+# The first budget is small so that it gets locked part way through the run.
+BUDGET_LIMITS = [200, 10 ** 8, 10 ** 8, 10 ** 8]
+CHUNK_SIZE = 50
+
+
+def create_users(count):
+    """
+    Create Rebel users whose bank accounts are set up without prompting.
+    :param count: the number of users, as an int
+    :return: a list of Users
+    """
+    return [Rebel(f"User {number}", 12,
+                  BankAccount(str(number), "Stress Bank", OPENING_BALANCE,
+                              BankAccount.create_budget_list(BUDGET_LIMITS)))
+            for number in range(count)]
+
+
+def create_workload(user_count, transaction_count, seed):
+    """
+    Create chunks of transaction records spread randomly over the users, so that
+    several threads work on the same account at the same time.
+    :param user_count: an int
+    :param transaction_count: an int
+    :param seed: the random seed, as an int
+    :return: a list of (user index, list of records) tuples
+    """
+    generator = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    chunks = []
+    for chunk_start in range(0, transaction_count, CHUNK_SIZE):
+        records = [(generator.randrange(len(BUDGET_LIMITS)), generator.randint(1, 500) / 100,
+                    f"Shop {generator.randrange(50)}", start + timedelta(seconds=chunk_start + offset))
+                   for offset in range(min(CHUNK_SIZE, transaction_count - chunk_start))]
+        chunks.append((generator.randrange(user_count), records))
+    return chunks
+
+
+def run(workers, user_count, chunks):
+    """
+    Record every chunk on a thread pool and check the accounts afterwards.
+    :param workers: the number of threads, as an int
+    :param user_count: an int
+    :param chunks: the workload from create_workload
+    :return: a (seconds, accepted count, list of problems) tuple
+    """
+    users = create_users(user_count)
+
+    def record(chunk):
+        user = users[chunk[0]]
+        return len(user.bank.record_transactions(user, chunk[1]).accepted)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            accepted = sum(pool.map(record, chunks))
+        elapsed = time.perf_counter() - started
+        NOTIFICATIONS.flush()
+
+    return elapsed, accepted, check_users(users, accepted)
+
+
+def check_users(users, accepted):
+    """
+    Check that every recorded transaction is reflected exactly once in the balances,
+    budgets and lock counts.
+    :param users: a list of Users
+    :param accepted: the number of transactions that were accepted, as an int
+    :return: a list of problems found, as strings
+    """
+    problems = []
+    recorded = 0
+    for user in users:
+        bank = user.bank
+        spent = 0
+        for budget in bank.budgets:
+            total = budget.transactions.total()
+            recorded += len(budget.transactions)
+            spent += total
+            if budget.spent_cents != total or budget.left_cents != budget.limit_cents - total:
+                problems.append(f"{user.name}: {budget.name} totals do not match its transactions")
+        if bank.balance_cents != to_cents(OPENING_BALANCE) - spent:
+            problems.append(f"{user.name}: balance lost an update")
+        locked = sum(budget.is_locked for budget in bank.budgets)
+        if user.locked_budgets != locked:
+            problems.append(f"{user.name}: {user.locked_budgets} lock(s) counted for {locked} locked budget(s)")
+    if recorded != accepted:
+        problems.append(f"{accepted} transactions accepted but {recorded} recorded")
+    return problems
+
+
+def main():
+    """
+    Parse the command line, run the stress test for each worker count and print the results.
+    """
+    parser = argparse.ArgumentParser(description="Record transactions from many threads and check for lost updates.")
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=3522)
+    arguments = parser.parse_args()
+
+    chunks = create_workload(arguments.accounts, arguments.transactions, arguments.seed)
+    failed = False
+    print(f"{'workers':>8} {'seconds':>10} {'tx/s':>12} {'speed-up':>9}  result")
+    baseline = None
+    for workers in arguments.workers:
+        elapsed, accepted, problems = run(workers, arguments.accounts, chunks)
+        throughput = accepted / elapsed
+        baseline = baseline or throughput
+        result = "ok" if not problems else f"FAILED: {problems[0]} ({len(problems)} problem(s))"
+        failed = failed or bool(problems)
+        print(f"{workers:>8} {elapsed:>10.2f} {throughput:>12.0f} {throughput / baseline:>8.2f}x  {result}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
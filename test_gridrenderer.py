@@ -0,0 +1,98 @@
+"""
+This module holds the checks that the grid renderer draws exactly the same text as
+tabulate(rows, tablefmt="grid").
+Run it with:
+    python -m unittest test_gridrenderer
+"""
+
+import unittest
+from datetime import datetime
+
+from budget import Budget
+from gridrenderer import TIME_FORMAT, TRANSACTION_LABELS, render_grid, render_transaction, render_transactions
+from money import format_cents
+from transaction import Transaction
+
+try:
+    from tabulate import tabulate
+except ImportError:
+    tabulate = None
+
+TABLES = [
+    [["Category", "Eating Out"], ["Locked", "No"], ["Limit in dollars", "$60.00"]],
+    [["Name", "Jeff"], ["Age", "12"], ["Type", "Rebel"]],
+    # a column of numbers, which tabulate aligns to the right
+    [["a", "1"], ["b", "22.5"], ["c", "-3"]],
+    [["x", "True"], ["y", "False"]],
+    # cells tabulate strips or measures differently
+    [["Location", " padded "], ["Note", ""]],
+    [["Location", "Café Müller"], ["Tab", "a\tb"]],
+    [["Multi", "one\ntwo"], ["Wide", "x" * 40]],
+]
+
+TRANSACTIONS = [
+    ("Eating Out", datetime(2020, 1, 31, 10, 0), 1250, "EB Games"),
+    ("Games and Entertainment", datetime(2021, 12, 1, 23, 59, 59), 1, "Shop 0"),
+    ("Miscellaneous", datetime(2020, 6, 15), 123456789, "A very long purchase location name"),
+    ("Clothing and Accessories", datetime(2020, 2, 29, 12, 30), 5, " spaced "),
+    ("Eating Out", datetime(2020, 3, 1), 999, "Crème Brûlée"),
+    ("Eating Out", datetime(2020, 3, 1), 10000, "1234"),
+]
+
+
+def tabulate_transaction(category, timestamp, cents, location):
+    """
+    Draw a transaction the way it was drawn with tabulate.
+    :param category: a string
+    :param timestamp: a datetime
+    :param cents: the amount in cents, an int
+    :param location: a string
+    :return: a string
+    """
+    cells = (category, timestamp.strftime(TIME_FORMAT), f"${format_cents(cents)}", location)
+    return tabulate([[label, cell] for label, cell in zip(TRANSACTION_LABELS, cells)], tablefmt="grid")
+
+
+@unittest.skipIf(tabulate is None, "tabulate is not installed")
+class GridRendererTest(unittest.TestCase):
+    """
+    Class that compares the grid renderer with tabulate.
+    """
+
+    def test_render_grid_matches_tabulate(self):
+        """
+        Every table is drawn the same as by tabulate, whether or not it is plain.
+        """
+        for rows in TABLES:
+            with self.subTest(rows=rows):
+                self.assertEqual(tabulate(rows, tablefmt="grid"), render_grid(rows))
+
+    def test_render_transaction_matches_tabulate(self):
+        """
+        Every transaction is drawn the same as by tabulate.
+        """
+        for details in TRANSACTIONS:
+            with self.subTest(details=details):
+                self.assertEqual(tabulate_transaction(*details), render_transaction(*details))
+
+    def test_render_transactions_matches_tabulate(self):
+        """
+        Rendering many transactions in one pass gives each one's table and a newline.
+        """
+        transactions = [Transaction(*details) for details in TRANSACTIONS]
+        self.assertEqual([tabulate_transaction(*details) + "\n" for details in TRANSACTIONS],
+                         render_transactions(transactions))
+
+    def test_budget_matches_tabulate(self):
+        """
+        A budget's summary is drawn the same as by tabulate.
+        """
+        budget = Budget("Eating Out", 60)
+        budget.update_balance(1234)
+        rows = [["Category", "Eating Out"], ["Locked", "No"], ["Limit in dollars", "$60.00"],
+                ["Amount spent in dollars", "$12.34"], ["Amount left in dollars", "$47.66"]]
+        self.assertEqual(tabulate(rows, tablefmt="grid"), str(budget))
+
+
+if __name__ == '__main__':
+    unittest.main()
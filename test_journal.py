@@ -0,0 +1,126 @@
+"""
+This module holds the checks that a Journal recovers the FAM users after a run that
+ended without closing it, as it would after a crash.
+Run it with:
+    python -m unittest test_journal
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from fam import FAM
+from journal import Journal
+from notificationqueue import NOTIFICATIONS
+
+START = datetime(2020, 1, 1)
+
+
+def ignore_notice(notification, notice):
+    """
+    Drop a budget notice instead of printing it.
+    :param notification: a Notification
+    :param notice: a string
+    """
+    pass
+
+
+def describe(users):
+    """
+    Return what recovery has to restore for each user: the balance, the amount spent
+    and lock of each budget, and the number of locked budgets.
+    :param users: a list of Users
+    :return: a list of tuples
+    """
+    return [(user.name, user.bank.balance_cents, user.locked_budgets,
+             [(budget.spent_cents, budget.is_locked, len(budget.transactions)) for budget in user.bank.budgets])
+            for user in users]
+
+
+class JournalRecoveryTest(unittest.TestCase):
+    """
+    Class that records transactions through a journal, abandons it without closing it,
+    and recovers the users from its directory.
+    """
+
+    def setUp(self):
+        """
+        Create an empty journal directory, removed once the journals in it are
+        closed, and keep budget notices off the console.
+        """
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self._deliver = NOTIFICATIONS.deliver
+        NOTIFICATIONS.deliver = ignore_notice
+
+    def tearDown(self):
+        """
+        Wait for the notices of the test before printing them again.
+        """
+        NOTIFICATIONS.flush()
+        NOTIFICATIONS.deliver = self._deliver
+
+    def _open(self, **settings):
+        """
+        Create a Journal in the test directory, closed when the test ends so its file
+        is released. Until then it is left open, as a crashed program would leave it.
+        :param settings: keyword arguments for the Journal
+        :return: a Journal
+        """
+        journal = Journal(self._directory.name, **settings)
+        self.addCleanup(journal.close)
+        return journal
+
+    def _record(self, journal):
+        """
+        Register users and record enough transactions to lock some of their budgets,
+        flushing the journal the way the menu does after each action.
+        :param journal: a Journal
+        :return: the list of Users
+        """
+        fam = FAM(journal)
+        for number, user_type in enumerate(("Rebel", "Troublemaker", "Angel")):
+            user = FAM.create_user(user_type, f"User {number}", 12, str(number), "TD", 1000, [50, 80, 60, 40])
+            fam.add_user(user)
+            records = [(index % 4, 7.35, f"Shop {index % 5}", START + timedelta(hours=index)) for index in range(40)]
+            user.bank.record_transactions(user, records)
+            fam.flush_storage()
+        return list(fam.user_list)
+
+    def test_recovers_after_a_run_without_close(self):
+        """
+        Recovering from the log alone gives the same balances and locks.
+        """
+        users = self._record(self._open())
+        self.assertTrue(any(budget.is_locked for user in users for budget in user.bank.budgets))
+
+        recovered = self._open().recover()
+        self.assertEqual(describe(users), describe(recovered))
+
+    def test_recovers_from_a_snapshot_and_the_log_after_it(self):
+        """
+        Recovering from a snapshot taken part way through and the events logged after
+        it gives the same balances and locks.
+        """
+        users = self._record(self._open(snapshot_every=25))
+        self.assertTrue(os.path.exists(os.path.join(self._directory.name, Journal.SNAPSHOT_FILE)))
+
+        recovered = self._open().recover()
+        self.assertEqual(describe(users), describe(recovered))
+
+    def test_ignores_a_partly_written_last_event(self):
+        """
+        An event cut off in the middle of being written is dropped, and everything
+        before it is recovered.
+        """
+        users = self._record(self._open())
+        with open(os.path.join(self._directory.name, Journal.LOG_FILE), "ab") as log:
+            log.write(b'{"event":"transaction","user":0,"bud')
+
+        recovered = self._open().recover()
+        self.assertEqual(describe(users), describe(recovered))
+
+
+if __name__ == '__main__':
+    unittest.main()
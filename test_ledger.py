@@ -0,0 +1,127 @@
+"""
+This module holds the checks that an account saved with save_ledger opens again with
+open_ledger with the same totals and merchant totals.
+Run it with:
+    python -m unittest test_ledger
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from bankaccount import BankAccount
+from fam import FAM
+from notificationqueue import NOTIFICATIONS
+from storage import SQLiteStorage
+from test_journal import ignore_notice
+
+START = datetime(2020, 1, 1)
+LIMITS = [50, 80, 60, 40]
+
+
+def describe(bank):
+    """
+    Return what a ledger has to keep of an account: the balance, the limit, amount
+    spent, lock and transactions of each budget, and the merchant totals.
+    :param bank: a BankAccount
+    :return: a tuple
+    """
+    budgets = [(budget.name, budget.limit_cents, budget.spent_cents, budget.is_locked,
+                [(transaction.timestamp, transaction.cents, transaction.purchase_location)
+                 for transaction in budget.transactions])
+               for budget in bank.budgets]
+    merchants = {location: (stats.count, stats.total_cents, stats.last_seen)
+                 for location, stats in bank.get_merchant_stats().items()}
+    return bank.number, bank.name, bank.balance_cents, budgets, merchants
+
+
+class LedgerRoundTripTest(unittest.TestCase):
+    """
+    Class that saves accounts to a ledger file and compares them with the account
+    opened from it.
+    """
+
+    def setUp(self):
+        """
+        Create a directory for the ledger files, removed once the ledgers in it are
+        closed.
+        """
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self._path = os.path.join(self._directory.name, "account.ledger")
+
+    def _open(self):
+        """
+        Open the test ledger, closed when the test ends.
+        :return: a BankAccount
+        """
+        bank = BankAccount.open_ledger(self._path)
+        self.addCleanup(bank.close)
+        return bank
+
+    @staticmethod
+    def _create_account():
+        """
+        Create an account with transactions at a few locations in every budget, in no
+        particular time order, with one budget locked.
+        :return: a BankAccount
+        """
+        bank = BankAccount("1", "TD", 1000, BankAccount.create_budget_list(LIMITS))
+        for index in range(60):
+            timestamp = START + timedelta(hours=(index * 7) % 60, microseconds=index)
+            bank.apply_transaction(index % 4, 1.05 + index % 3, timestamp, f"Shop {index % 5}")
+        bank.budgets[2].is_locked = True
+        return bank
+
+    def test_reopens_with_the_same_totals(self):
+        """
+        The reopened account has the same balance, budgets, transactions and merchant
+        totals.
+        """
+        bank = self._create_account()
+        bank.save_ledger(self._path)
+        self.assertEqual(describe(bank), describe(self._open()))
+
+    def test_reopens_with_the_same_totals_without_numpy(self):
+        """
+        The totals added up without numpy are the same as with it.
+        """
+        bank = self._create_account()
+        bank.save_ledger(self._path)
+        with mock.patch("ledger._import_numpy", return_value=None):
+            self.assertEqual(describe(bank), describe(self._open()))
+
+    def test_reopens_an_empty_account(self):
+        """
+        An account with no transactions reopens with no transactions or merchant totals.
+        """
+        bank = BankAccount("2", "RBC", 250, BankAccount.create_budget_list(LIMITS))
+        bank.save_ledger(self._path)
+        self.assertEqual(describe(bank), describe(self._open()))
+
+    def test_reopens_an_account_from_sqlite(self):
+        """
+        An account whose budgets read their transactions from SQLite is saved the same
+        way as one kept in memory.
+        """
+        deliver = NOTIFICATIONS.deliver
+        NOTIFICATIONS.deliver = ignore_notice
+        self.addCleanup(setattr, NOTIFICATIONS, "deliver", deliver)
+        storage = SQLiteStorage(os.path.join(self._directory.name, "fam.db"))
+        self.addCleanup(storage.close)
+
+        fam = FAM(storage)
+        user = FAM.create_user("Angel", "Jeff", 12, "1", "TD", 1000, LIMITS)
+        fam.add_user(user)
+        records = [(index % 4, 2.15, f"Shop {index % 3}", START + timedelta(hours=index)) for index in range(20)]
+        user.bank.record_transactions(user, records)
+        fam.flush_storage()
+
+        user.bank.save_ledger(self._path)
+        self.assertEqual(describe(user.bank), describe(self._open()))
+
+
+if __name__ == '__main__':
+    unittest.main()
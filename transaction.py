@@ -1,4 +1,7 @@
-from tabulate import tabulate
+from sys import intern
+
+from gridrenderer import render_transaction
+from money import to_dollars
 
 
 """
@@ -8,21 +11,26 @@ This module holds the Transaction class.
 
 class Transaction:
     """
-    Class representing a single Transaction for a User.
+    Class representing a single Transaction for a User. Transactions use slots
+    instead of an instance dict, and the category and location strings are
+    interned so that every transaction with the same values shares one copy.
     """
-    def __init__(self, category, timestamp, dollar_amount, purchase_location):
+
+    __slots__ = ("_category", "_timestamp", "_cents", "_purchase_location")
+
+    def __init__(self, category, timestamp, cents, purchase_location):
         """
         Initialize a new Transaction with a budget category, timestamp,
-        dollar amount spent, and purchase location.
+        amount spent in cents, and purchase location.
         :param category: a string
         :param timestamp: a datetime
-        :param dollar_amount: a float
+        :param cents: an int
         :param purchase_location: a string
         """
-        self._category = category
+        self._category = intern(category)
         self._timestamp = timestamp
-        self._dollar_amount = dollar_amount
-        self._purchase_location = purchase_location
+        self._cents = cents
+        self._purchase_location = intern(purchase_location)
 
     @property
     def category(self):
@@ -48,22 +56,25 @@ class Transaction:
         """
         return self._timestamp
 
+    @property
+    def cents(self):
+        """
+        Return the amount spent in the transaction, in cents.
+        :return: an int
+        """
+        return self._cents
+
     @property
     def dollar_amount(self):
         """
         Return the dollar amount spent in the transaction.
         :return: a float
         """
-        return self._dollar_amount
+        return to_dollars(self._cents)
 
     def __str__(self):
         """
         Return the transaction details as a string.
         :return: a string
         """
-        time = self.timestamp.strftime("%b %d %Y %H:%M:%S")
-        transaction_string = tabulate(
-            [["Category", f"{self.category}"], ["Time", f"{time}"], ["Amount", f"${self.dollar_amount:.2f}"],
-             ["Location", f"{self.purchase_location}"]], tablefmt="grid")
-
-        return transaction_string
+        return render_transaction(self.category, self.timestamp, self.cents, self.purchase_location)
@@ -0,0 +1,56 @@
+"""
+This module holds the TransactionReport class.
+"""
+
+
+class TransactionReport:
+    """
+    Class representing the outcome of recording a batch of transactions,
+    with the transactions that were accepted and the records that were rejected.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty TransactionReport.
+        """
+        self._accepted = []
+        self._rejected = []
+
+    @property
+    def accepted(self):
+        """
+        Return the transactions that were recorded.
+        :return: a list of Transactions
+        """
+        return self._accepted
+
+    @property
+    def rejected(self):
+        """
+        Return the records that were rejected, each paired with the exception
+        that explains why.
+        :return: a list of (record, Exception) tuples
+        """
+        return self._rejected
+
+    def add_accepted(self, transaction):
+        """
+        Add a recorded transaction to the report.
+        :param transaction: a Transaction
+        """
+        self._accepted.append(transaction)
+
+    def add_rejected(self, record, error):
+        """
+        Add a rejected record to the report.
+        :param record: the record that could not be recorded
+        :param error: an Exception
+        """
+        self._rejected.append((record, error))
+
+    def __str__(self):
+        """
+        Return a summary of the report as a string.
+        :return: a string
+        """
+        return f"{len(self.accepted)} transaction(s) recorded, {len(self.rejected)} rejected."
@@ -0,0 +1,297 @@
+"""
+This module holds the TransactionStore class, the columnar storage behind a Budget.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from sys import intern
+
+from money import to_cents
+from transaction import Transaction
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_naive_utc(timestamp):
+    """
+    Return a datetime as a naive datetime that can be compared with the stored ones.
+    Naive datetimes are returned as they are, aware datetimes are converted to UTC.
+    :param timestamp: a datetime
+    :return: a naive datetime
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def to_epoch_micros(timestamp):
+    """
+    Convert a datetime into microseconds since the epoch. Naive datetimes are
+    stored as they are, aware datetimes are converted to UTC first.
+    :param timestamp: a datetime
+    :return: an int
+    """
+    return (to_naive_utc(timestamp) - EPOCH) // MICROSECOND
+
+
+def from_epoch_micros(micros):
+    """
+    Convert microseconds since the epoch back into a naive datetime.
+    :param micros: an int
+    :return: a datetime
+    """
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class TransactionStore(Sequence):
+    """
+    Class that stores the transactions of a single budget column by column: amounts
+    in cents in an int64 array, timestamps as epoch microseconds in an int64 array, and
+    locations as codes into a list of distinct location names. Transaction objects
+    are only created when a transaction is read.
+
+    Transactions usually arrive in time order, in which case the timestamp column is
+    already sorted and is used directly for time range queries. The first time a
+    transaction arrives out of order, a sorted copy of the timestamps and the matching
+    transaction indexes are built and kept up to date from then on.
+    """
+
+    def __init__(self, category):
+        """
+        Initialize an empty TransactionStore for a budget category.
+        :param category: the budget name, as a string
+        """
+        self._category = intern(category)
+        self._amounts = array("q")
+        self._timestamps = array("q")
+        self._location_codes = array("I")
+        self._locations = []
+        self._codes_by_location = {}
+        self._sorted_timestamps = None
+        self._time_order = None
+
+    @classmethod
+    def from_columns(cls, category, amounts, timestamps, location_codes, locations):
+        """
+        Create a TransactionStore from columns taken from another store, such as
+        columns sent to another process as bytes.
+        :param category: the budget name, as a string
+        :param amounts: an array of amounts in cents
+        :param timestamps: an array of epoch microseconds
+        :param location_codes: an array of codes into locations
+        :param locations: a list of strings
+        :return: a TransactionStore
+        """
+        store = cls(category)
+        store._amounts = amounts
+        store._timestamps = timestamps
+        store._location_codes = location_codes
+        store._locations = [intern(location) for location in locations]
+        store._codes_by_location = {location: code for code, location in enumerate(store._locations)}
+        if any(earlier > later for earlier, later in zip(timestamps, timestamps[1:])):
+            store._time_order = array("I", sorted(range(len(timestamps)), key=timestamps.__getitem__))
+            store._sorted_timestamps = array("q", (timestamps[index] for index in store._time_order))
+        return store
+
+    @property
+    def category(self):
+        """
+        Return the budget category that the transactions belong to.
+        :return: a string
+        """
+        return self._category
+
+    @property
+    def amounts(self):
+        """
+        Return the amount column, in cents.
+        :return: an array of ints
+        """
+        return self._amounts
+
+    @property
+    def timestamps(self):
+        """
+        Return the timestamp column as microseconds since the epoch.
+        :return: an array of ints
+        """
+        return self._timestamps
+
+    @property
+    def location_codes(self):
+        """
+        Return the location column as codes into the locations list.
+        :return: an array of ints
+        """
+        return self._location_codes
+
+    @property
+    def locations(self):
+        """
+        Return the distinct locations, indexed by location code.
+        :return: a list of strings
+        """
+        return self._locations
+
+    def _encode_location(self, purchase_location):
+        """
+        Return the code for a location, adding it to the locations list if it is new.
+        :param purchase_location: a string
+        :return: an int
+        """
+        code = self._codes_by_location.get(purchase_location)
+        if code is None:
+            code = len(self._locations)
+            self._locations.append(intern(purchase_location))
+            self._codes_by_location[purchase_location] = code
+        return code
+
+    def append(self, timestamp, amount, purchase_location):
+        """
+        Add a transaction to the end of the store.
+        :param timestamp: a datetime
+        :param amount: the amount in cents, an int
+        :param purchase_location: a string
+        :return: the index of the new transaction, as an int
+        """
+        # everything that can fail is done before the other columns are changed
+        micros = to_epoch_micros(timestamp)
+        code = self._encode_location(purchase_location)
+        index = len(self._amounts)
+        self._timestamps.append(micros)
+        self._location_codes.append(code)
+        # the length of the amount column is the number of transactions readers see, so
+        # it grows last, once the rest of the row is in place
+        self._amounts.append(amount)
+        self._update_time_index(micros, index)
+        return index
+
+    def _update_time_index(self, micros, index):
+        """
+        Keep the time index sorted when a transaction has been added. The index is only
+        created once a transaction arrives earlier than the one before it.
+        :param micros: the timestamp of the new transaction, as epoch microseconds
+        :param index: the position of the new transaction, as an int
+        """
+        if self._sorted_timestamps is None:
+            if index == 0 or micros >= self._timestamps[index - 1]:
+                return
+            sorted_timestamps = array("q", self._timestamps[:index])
+            time_order = array("I", range(index))
+        else:
+            sorted_timestamps = self._sorted_timestamps
+            time_order = self._time_order
+
+        position = bisect_right(sorted_timestamps, micros)
+        time_order.insert(position, index)
+        sorted_timestamps.insert(position, micros)
+        self._time_order = time_order
+        self._sorted_timestamps = sorted_timestamps
+
+    def get_indexes_between(self, start=None, end=None):
+        """
+        Return the indexes of the transactions made from start up to, but not
+        including, end, in time order. Runs in O(log n + k) for k matches.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a sequence of ints
+        """
+        timestamps = self._timestamps if self._sorted_timestamps is None else self._sorted_timestamps
+        low = 0 if start is None else bisect_left(timestamps, to_epoch_micros(start))
+        # a transaction being added can be in the timestamps before it is counted
+        count = len(self)
+        high = count if end is None else min(count, bisect_left(timestamps, to_epoch_micros(end)))
+        high = max(low, high)
+        if self._time_order is None:
+            return range(low, high)
+        return self._time_order[low:high]
+
+    def get_between(self, start=None, end=None):
+        """
+        Return the transactions made from start up to, but not including, end, in
+        time order, along with the sum of their amounts in cents.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: a (list of Transactions, int) tuple
+        """
+        indexes = self.get_indexes_between(start, end)
+        return [self._materialize(index) for index in indexes], self._sum_amounts(indexes)
+
+    def total_between(self, start=None, end=None):
+        """
+        Return the sum in cents of the amounts of the transactions made from start
+        up to, but not including, end.
+        :param start: a datetime, or None for no lower bound
+        :param end: a datetime, or None for no upper bound
+        :return: an int
+        """
+        return self._sum_amounts(self.get_indexes_between(start, end))
+
+    def _sum_amounts(self, indexes):
+        """
+        Return the sum in cents of the amounts at the given indexes.
+        :param indexes: a range or an array of ints
+        :return: an int
+        """
+        if isinstance(indexes, range):
+            return sum(self._amounts[indexes.start:indexes.stop])
+        amounts = self._amounts
+        return sum(amounts[index] for index in indexes)
+
+    def total(self):
+        """
+        Return the sum in cents of all the amounts in the store.
+        :return: an int
+        """
+        return sum(self._amounts)
+
+    def _materialize(self, index):
+        """
+        Create the Transaction stored at an index.
+        :param index: a non-negative int
+        :return: a Transaction
+        """
+        return Transaction(self._category, from_epoch_micros(self._timestamps[index]),
+                           self._amounts[index], self._locations[self._location_codes[index]])
+
+    def __getitem__(self, index):
+        """
+        Return the Transaction at an index, or a list of Transactions for a slice.
+        :param index: an int or a slice
+        :return: a Transaction or a list of Transactions
+        """
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transaction index out of range")
+        return self._materialize(index)
+
+    def __iter__(self):
+        """
+        Iterate over the transactions in the order they were recorded.
+        :return: an iterator of Transactions
+        """
+        for index in range(len(self)):
+            yield self._materialize(index)
+
+    def __len__(self):
+        """
+        Return the number of transactions in the store.
+        :return: an int
+        """
+        return len(self._amounts)
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled TransactionStore, converting the amounts of a store pickled
+        before they were kept in cents.
+        :param state: a dict
+        """
+        self.__dict__.update(state)
+        if self._amounts.typecode == "d":
+            self._amounts = array("q", map(to_cents, self._amounts))
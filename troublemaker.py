@@ -9,13 +9,14 @@ class Troublemaker(User):
     """
     Class that represents a Troublemaker user type.
     """
-    def __init__(self, name, age):
+    def __init__(self, name, age, bank=None):
         """
         Initialize a User of Troublemaker type.
         :param name: the name of the user as a String
         :param age: the age of the Troublemaker User
+        :param bank: a BankAccount, or None to prompt for the bank details
         """
-        super().__init__(name, age, 75, True, 120)
+        super().__init__(name, age, 75, True, 120, bank)
 
     def can_lock_account(self):
         """
@@ -36,4 +37,4 @@ class Troublemaker(User):
         Return a polite notification.
         :return: polite notification as a string
         """
-        return Notifications.POLITE.value
+        return Notifications.POLITE.box
@@ -4,8 +4,9 @@ This module holds the User class.
 import abc
 
 from notifications import Notifications
-from bankaccount import BankAccount, BudgetIsLockedError
-from bankaccount import InvalidBalanceError
+from bankaccount import BankAccount, BudgetIsLockedError, BudgetIsReadOnlyError
+from bankaccount import InvalidBalanceError, TransactionAmountError
+from importer import StatementImporter
 from abc import ABC
 
 
@@ -13,11 +14,13 @@ class User(ABC):
     """
     The User class is the blueprint for creating a User object.
     """
-    def __init__(self, name, age, warning, is_lockable, lock_limit):
+    def __init__(self, name, age, warning, is_lockable, lock_limit, bank=None):
         """
-        Initialize the instance variables name, age and bank.
+        Initialize the instance variables name, age and bank. The user is
+        prompted for the bank details when no bank account is passed in.
         :param name: the name of the user as a String
         :param age: the age of the user as an int
+        :param bank: a BankAccount, or None
         """
         self._name = name
         self._age = age
@@ -27,7 +30,7 @@ class User(ABC):
         self._locked_budgets = 0
 
         # creating the user's bank account
-        self._bank = self._validate_bank_details()
+        self._bank = bank if bank is not None else self._validate_bank_details()
 
     @property
     def percentage_warning(self):
@@ -69,6 +72,14 @@ class User(ABC):
         """
         return self._name
 
+    @property
+    def age(self):
+        """
+        Get the age property.
+        :return: the user's age as an int
+        """
+        return self._age
+
     @property
     def bank(self):
         """
@@ -121,6 +132,25 @@ class User(ABC):
         """
         self.bank.view_transactions_by_budget()
 
+    def get_transaction_pages(self, page_size, newest_first=False):
+        """
+        Prompt for a budget and return its transactions one page at a time.
+        :param page_size: the number of transactions per page, as an int
+        :param newest_first: True to start from the most recent transaction
+        :return: a generator of strings
+        """
+        budget_index = BankAccount.get_budget_index()
+        return self.bank.iter_transactions_by_budget(budget_index, page_size, newest_first)
+
+    def get_bank_details_pages(self, page_size, newest_first=False):
+        """
+        Return the details of the user's bank account one page at a time.
+        :param page_size: the number of transactions per page, as an int
+        :param newest_first: True to list the most recent transactions first
+        :return: a generator of strings
+        """
+        return self.bank.iter_details(page_size, newest_first)
+
     def record_transaction(self):
         """
         Record a new transaction from the user's bank.
@@ -131,6 +161,23 @@ class User(ABC):
             print(e)
         except BudgetIsLockedError as e:
             print(e)
+        except TransactionAmountError as e:
+            print(e)
+        except BudgetIsReadOnlyError as e:
+            print(e)
+
+    def import_statement(self):
+        """
+        Prompt for the path of a CSV or JSON lines bank statement and import it into
+        the user's bank account.
+        """
+        path = input("Enter the path of the statement file: ")
+        quarantine_path = input("Enter a file for rejected rows (leave blank to print them): ")
+        importer = StatementImporter(self, quarantine_path=quarantine_path or None)
+        try:
+            importer.import_file(path)
+        except (OSError, ValueError) as e:
+            print(f"Could not import statement: {e}")
 
     def view_bank_details(self):
         """
@@ -150,7 +197,7 @@ class User(ABC):
         Get the warning string from the Notifications enum.
         :return: a warning as a string
         """
-        return Notifications.WARNING.value
+        return Notifications.WARNING.box
 
     @staticmethod
     def input_bank_details():
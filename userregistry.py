@@ -0,0 +1,240 @@
+"""
+This module holds the UserRegistry, which keeps the FAM users by id and indexes them
+by name, by user type and by whether their account is locked.
+"""
+
+from collections.abc import Sequence
+
+
+class UserRegistry:
+    """
+    Class that holds the FAM users. Every user gets a stable id when added, which is
+    the number of users added before them, so looking a user up by id or finding the id
+    of a user takes constant time. The registry listens to each user's bank account so
+    users whose account gets locked are indexed as they are locked.
+    """
+
+    def __init__(self, users=()):
+        """
+        Initialize a UserRegistry with users whose ids are their positions in users.
+        :param users: an iterable of Users
+        """
+        self._users = []
+        self._ids = {}
+        self._ids_by_name = {}
+        self._ids_by_type = {}
+        self._locked_ids = set()
+        self._view = UserListView(self)
+        for user in users:
+            self.add(user)
+
+    @property
+    def view(self):
+        """
+        Return a read-only list of the users in id order, which follows the users as
+        they are added without copying them.
+        :return: a UserListView
+        """
+        return self._view
+
+    def add(self, user):
+        """
+        Add a user and return their new id.
+        :param user: a User
+        :return: an int
+        """
+        user_id = len(self._users)
+        self._users.append(user)
+        self._ids[user] = user_id
+        self._ids_by_name.setdefault(user.name, []).append(user_id)
+        self._ids_by_type.setdefault(user.get_type(), []).append(user_id)
+        if user.can_lock_account():
+            self._locked_ids.add(user_id)
+        user.bank.add_listener(self)
+        return user_id
+
+    def get(self, user_id):
+        """
+        Return the user with an id.
+        :param user_id: an int
+        :return: a User
+        """
+        if not 0 <= user_id < len(self._users):
+            raise UserNotFoundError(f"There is no user with id {user_id}.")
+        return self._users[user_id]
+
+    def get_id(self, user):
+        """
+        Return the id of a user.
+        :param user: a User in the registry
+        :return: an int
+        """
+        try:
+            return self._ids[user]
+        except KeyError:
+            raise UserNotFoundError(f"{user.name} is not registered.") from None
+
+    def find_by_name(self, name):
+        """
+        Return the users with a name, in id order.
+        :param name: a string
+        :return: a list of Users
+        """
+        return [self._users[user_id] for user_id in self._ids_by_name.get(name, [])]
+
+    def filter(self, user_type=None, name=None, locked=None):
+        """
+        Return the ids of the users that match every filter given, in id order. Only
+        the ids in the smallest matching index are checked against the other filters.
+        :param user_type: "Angel", "Troublemaker" or "Rebel", or None for any type
+        :param name: a string, or None for any name
+        :param locked: True for users whose account is locked, False for users whose
+        account is not locked, or None for both
+        :return: a sequence of ints
+        """
+        candidates = []
+        if user_type is not None:
+            candidates.append(self._ids_by_type.get(user_type, []))
+        if name is not None:
+            candidates.append(self._ids_by_name.get(name, []))
+        if locked:
+            candidates.append(sorted(self._locked_ids))
+        if not candidates:
+            candidates.append(range(len(self._users)))
+
+        ids = min(candidates, key=len)
+        users = self._users
+        return [user_id for user_id in ids
+                if (user_type is None or users[user_id].get_type() == user_type)
+                and (name is None or users[user_id].name == name)
+                and (locked is None or (user_id in self._locked_ids) == locked)]
+
+    def get_page(self, page, page_size, user_type=None, name=None, locked=None):
+        """
+        Return one page of the users that match the filters, as (id, user) pairs.
+        Without filters only the users on the page are looked at.
+        :param page: the page number starting at 0, as an int
+        :param page_size: the number of users per page, as an int
+        :param user_type: a user type name, or None for any type
+        :param name: a string, or None for any name
+        :param locked: True, False, or None for both
+        :return: a list of (int, User) tuples
+        """
+        if user_type is None and name is None and locked is None:
+            ids = range(len(self._users))
+        else:
+            ids = self.filter(user_type, name, locked)
+        return [(user_id, self._users[user_id]) for user_id in ids[page * page_size:(page + 1) * page_size]]
+
+    def detach(self):
+        """
+        Stop listening to the bank accounts of the users, once the registry is no longer used.
+        """
+        for user in self._users:
+            user.bank.remove_listener(self)
+
+    def on_transaction(self, user, budget_index, transaction):
+        """
+        Ignore recorded transactions, which do not change any index.
+        """
+
+    def on_budget_locked(self, user, budget_index):
+        """
+        Index a user as locked once enough of their budgets are locked.
+        :param user: a User
+        :param budget_index: an int
+        """
+        if user.can_lock_account():
+            user_id = self._ids.get(user)
+            if user_id is not None:
+                self._locked_ids.add(user_id)
+
+    def __getitem__(self, user_id):
+        """
+        Return the user with an id.
+        :param user_id: an int
+        :return: a User
+        """
+        return self.get(user_id)
+
+    def __iter__(self):
+        """
+        Iterate over the users in id order.
+        :return: an iterator of Users
+        """
+        return iter(self._users)
+
+    def __len__(self):
+        """
+        Return the number of users.
+        :return: an int
+        """
+        return len(self._users)
+
+
+class UserListView(Sequence):
+    """
+    Class that gives read-only list access to the users of a UserRegistry, where a
+    user's position is their id.
+    """
+
+    def __init__(self, registry):
+        """
+        Initialize a UserListView over a registry.
+        :param registry: a UserRegistry
+        """
+        self._registry = registry
+
+    def __getitem__(self, index):
+        """
+        Return the user at a position, or a list of users for a slice.
+        :param index: an int or a slice
+        :return: a User or a list of Users
+        """
+        return self._registry._users[index]
+
+    def __len__(self):
+        """
+        Return the number of users.
+        :return: an int
+        """
+        return len(self._registry)
+
+    def __iter__(self):
+        """
+        Iterate over the users in id order.
+        :return: an iterator of Users
+        """
+        return iter(self._registry)
+
+    def __contains__(self, user):
+        """
+        Return whether a user is registered, in constant time.
+        :param user: a User
+        :return: a boolean
+        """
+        return user in self._registry._ids
+
+    def index(self, user, start=0, stop=None):
+        """
+        Return the position of a user, which is their id, in constant time.
+        :param user: a User
+        :return: an int
+        """
+        user_id = self._registry._ids.get(user)
+        if user_id is None or user_id < start or (stop is not None and user_id >= stop):
+            raise ValueError(f"{user!r} is not in the user list")
+        return user_id
+
+
+class UserNotFoundError(Exception):
+    """
+    Exception for looking up a user that is not in the registry.
+    """
+
+    def __init__(self, message):
+        """
+        Initialize a UserNotFoundError Exception and passes in a message to its parent class (Exception).
+        :param message: description of the exception as a string
+        """
+        super().__init__(message)